@@ -22,8 +22,9 @@ import dwave.embedding.exceptions
 from dwave.embedding.diagnostic import diagnose_embedding, is_valid_embedding, verify_embedding
 
 from dwave.embedding.chain_breaks import broken_chains
-from dwave.embedding.chain_breaks import discard, majority_vote, weighted_random, MinimizeEnergy
+from dwave.embedding.chain_breaks import discard, majority_vote, weighted_random, MinimizeEnergy, SteepestDescent
+from dwave.embedding.chain_breaks import unembed_samples, ChainIndex, PackedSamples
 
-from dwave.embedding.transforms import embed_bqm, embed_ising, embed_qubo, unembed_sampleset, EmbeddedStructure
+from dwave.embedding.transforms import embed_bqm, embed_ising, embed_qubo, unembed_sampleset, EmbeddedStructure, EmbeddingPlan, LazySampleSet
 
-from dwave.embedding.utils import target_to_source, chain_to_quadratic, chain_break_frequency
+from dwave.embedding.utils import target_to_source, chain_to_quadratic, chain_break_frequency, ChainBreakStats
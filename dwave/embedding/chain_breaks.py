@@ -14,10 +14,12 @@
 
 """Unembedding samples with broken chains."""
 
-from collections.abc import Callable
-from heapq import heapify, heappop
+import functools
+import itertools
+from collections.abc import Callable, Sequence
 
 import numpy as np
+import scipy.sparse
 
 import dimod
 
@@ -26,21 +28,421 @@ __all__ = ['broken_chains',
            'majority_vote',
            'weighted_random',
            'MinimizeEnergy',
+           'SteepestDescent',
+           'ChainIndex',
+           'PackedSamples',
+           'unembed_samples',
            ]
 
 
-def broken_chains(samples, chains):
+def _chain_columns(labels, chains):
+    """Return the column indices in the samples of all of the chains
+    concatenated, and the offsets of each chain in them."""
+    if isinstance(chains, ChainIndex):
+        if chains._matches(labels):
+            return chains.columns, chains.offsets
+        chains = chains.chains  # compiled for other samples
+
+    if labels != range(len(labels)):
+        relabel = {v: idx for idx, v in enumerate(labels)}
+        chains = [[relabel[v] for v in chain] for chain in chains]
+    else:
+        chains = list(map(list, chains))  # because we use them for indexing
+
+    ptr = np.zeros(len(chains) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, chains), count=len(chains), dtype=np.int64),
+              out=ptr[1:])
+    columns = np.fromiter(itertools.chain.from_iterable(chains),
+                          count=ptr[-1], dtype=np.int64)
+    return columns, ptr
+
+
+class ChainIndex(Sequence):
+    """Chains of an embedding compiled for samples with a given order of
+    target variables.
+
+    Finding the column of every target variable of the chains in the samples
+    takes a Python-level lookup per target variable. A chain index does it
+    once, so that chain break methods, :func:`.broken_chains` and
+    :func:`~dwave.embedding.chain_break_frequency`, which all accept it in
+    place of the chains, only do the array work for samples with the same
+    variables. For samples with other variables the chains are looked up
+    as usual.
+
+    A chain index is a sequence of the chains, as tuples of target variables,
+    so it can also be given to custom chain break methods.
+
+    Args:
+        embedding (dict):
+            Mapping from source graph to target graph as a dict of form
+            {s: {t, ...}, ...}, where s is a source-model variable and t is a
+            target-model variable.
+
+        variables (iterable):
+            The target variables, in the order of the columns of the samples.
+
+        source_variables (iterable, optional):
+            The source variables of the chains, in order. Defaults to those
+            of `embedding`.
+
+    Attributes:
+        columns (:obj:`numpy.ndarray`):
+            The columns of the target variables of all of the chains,
+            concatenated.
+
+        offsets (:obj:`numpy.ndarray`):
+            The offset of each chain in `columns`, and of the end of the last.
+            Chain k has columns ``columns[offsets[k]:offsets[k+1]]``.
+
+        lengths (:obj:`numpy.ndarray`):
+            The number of target variables of each chain.
+
+    Examples:
+
+        >>> import numpy as np
+        ...
+        >>> embedding = {'a': (0, 1), 'b': (2, 3)}
+        >>> chains = dwave.embedding.ChainIndex(embedding, range(4))
+        >>> samples = np.array([[-1, +1, -1, -1], [-1, -1, +1, +1]], dtype=np.int8)
+        >>> dwave.embedding.broken_chains(samples, chains)
+        array([[ True, False],
+               [False, False]])
+
+    """
+    def __init__(self, embedding, variables, source_variables=None):
+        if source_variables is None:
+            source_variables = embedding
+
+        self.source_variables = list(source_variables)
+        self.chains = [tuple(embedding[v]) for v in self.source_variables]
+        self.variables = dimod.variables.Variables(variables)
+        self._labels = list(self.variables)  # lists compare faster
+
+        columns, offsets = _chain_columns(self.variables, self.chains)
+        lengths = np.diff(offsets)
+
+        # shared by every call, possibly from several threads
+        for arr in (columns, offsets, lengths):
+            arr.flags.writeable = False
+
+        self.columns = columns
+        self.offsets = offsets
+        self.lengths = lengths
+
+    def __getitem__(self, index):
+        return self.chains[index]
+
+    def __len__(self):
+        return len(self.chains)
+
+    def matches(self, source_variables, variables):
+        """Return True if the chain index is for the given source and target
+        variables, in order."""
+        return (list(source_variables) == self.source_variables
+                and self._matches(variables))
+
+    def _matches(self, variables):
+        return variables is self.variables or list(variables) == self._labels
+
+
+# by default samples are processed in blocks of rows of about this many
+# bytes, so that the gathers from a block stay in cache
+_BLOCK_BYTES = 2**20
+
+
+def _block_size(samples, chunksize=None):
+    """Return the number of rows of samples to process at a time."""
+    if chunksize is None:
+        num_variables = samples.shape[1]
+        return max(_BLOCK_BYTES // max(num_variables * samples.itemsize, 1), 1)
+    if chunksize < 1:
+        raise ValueError("chunksize must be a positive integer")
+    return int(chunksize)
+
+
+def _chain_positions(columns, ptr):
+    """Return the chains ordered by decreasing length, and for each position
+    k the columns of the k-th variables of the chains with more than k
+    variables.
+
+    With the chains in that order, the chains with more than k variables are
+    a prefix, so every position can be processed with a single gather.
+    """
+    lengths = np.diff(ptr)
+    order = np.argsort(-lengths, kind='stable')
+    starts = ptr[:-1][order]
+    max_length = lengths.max(initial=0)
+    num_longer = np.searchsorted(-lengths[order], -np.arange(max_length), side='left')
+    return order, [columns[starts[:n] + k] for k, n in enumerate(num_longer)]
+
+
+def _chain_sums(samples, columns, ptr):
+    """Return the sum of the sample values over each chain, as an nS-by-nC
+    array."""
+    lengths = np.diff(ptr)
+    # the sums are within [-max_length, max_length] for integer samples, both
+    # bounds are needed as e.g. 128 does not fit in the int8 that holds -128
+    max_length = lengths.max(initial=0)
+    dtype = np.result_type(samples.dtype,
+                           np.min_scalar_type(max_length),
+                           np.min_scalar_type(-max_length),
+                           np.int8)
+
+    order, kth_columns = _chain_positions(columns, ptr)
+
+    num_samples = samples.shape[0]
+    sums = np.zeros((num_samples, len(lengths)), dtype=dtype)
+    block = _block_size(samples)
+    for row in range(0, num_samples, block):
+        block_samples = samples[row:row+block]
+        block_sums = sums[row:row+block]
+        for cols in kth_columns:
+            block_sums[:, :len(cols)] += block_samples[:, cols]
+
+    if (order == np.arange(len(order))).all():
+        return sums
+
+    # back to the chain order
+    inverse = np.empty_like(order)
+    inverse[order] = np.arange(len(order))
+    return sums[:, inverse]
+
+
+def _broken_chains(samples, columns, ptr, chunksize=None):
+    """Return the nS-by-nC boolean array of broken chains."""
+    num_samples = samples.shape[0]
+    num_chains = len(ptr) - 1
+
+    broken = np.zeros((num_samples, num_chains), dtype=bool, order='F')
+
+    # a chain is broken if its smallest and largest values differ. Chains of
+    # length 0 or 1 are never broken
+    order, kth_columns = _chain_positions(columns, ptr)
+    kth_columns = kth_columns[1:]
+    if not kth_columns:
+        return broken
+    num_breakable = len(kth_columns[0])
+    breakable = order[:num_breakable]
+    first_columns = columns[ptr[breakable]]
+
+    block = _block_size(samples, chunksize)
+    for row in range(0, num_samples, block):
+        block_samples = samples[row:row+block]
+        first = block_samples[:, first_columns]
+        low = first.copy()
+        high = first
+        for cols in kth_columns:
+            values = block_samples[:, cols]
+            np.minimum(low[:, :len(cols)], values, out=low[:, :len(cols)])
+            np.maximum(high[:, :len(cols)], values, out=high[:, :len(cols)])
+        broken[row:row+block, breakable] = low != high
+
+    return broken
+
+
+def _majority_vote(samples, columns, ptr):
+    """Return the majority vote of each chain as an nS-by-nC array, and the
+    nS-by-nC boolean array of broken chains, both from a single pass of chain
+    sums."""
+    num_samples = samples.shape[0]
+    num_chains = len(ptr) - 1
+    lengths = np.diff(ptr)
+
+    unembedded = np.empty((num_samples, num_chains), dtype='int8', order='F')
+
+    # all of the chains are summed at once
+    sums = _chain_sums(samples, columns, ptr)
+
+    # determine if spin or binary. If samples are all 1, then either method works, so we use spin
+    # because it is faster
+    if samples.all():  # spin-valued
+        # we just need the sign for spin. We don't use np.sign because in that can return 0
+        # and fixing the 0s is slow.
+        np.greater_equal(sums, 0, out=unembedded.view(bool))
+        unembedded *= 2
+        unembedded -= 1
+
+        # a chain is unbroken if all of its values agree
+        broken = np.abs(sums) != lengths
+    else:  # binary-valued
+        # compare against half the chain length
+        np.greater_equal(sums, lengths / 2, out=unembedded.view(bool))
+
+        broken = (sums != 0) & (sums != lengths)
+
+    return unembedded, broken
+
+
+# the number of set bits in each byte value
+_POPCOUNT = np.array([bin(b).count('1') for b in range(256)], dtype=np.uint8)
+
+
+class PackedSamples:
+    """Samples with their values packed into bits, eight to a byte.
+
+    Binary-valued samples take eight times less memory packed than as 'int8'
+    arrays. :func:`.broken_chains`, :func:`.majority_vote` and
+    :func:`~dwave.embedding.chain_break_frequency` accept packed samples
+    directly, counting the set bits of each chain with a lookup table rather
+    than unpacking them.
+
+    Args:
+        packed (array_like):
+            Samples as an nS x ceil(nV/8) array of dtype 'uint8', where nS is
+            the number of samples and nV the number of variables. Bit j of a
+            sample, counting from the most significant bit of its first byte
+            as in :func:`numpy.packbits`, is set if variable j has value 1.
+
+        variables (iterable):
+            The nV variable labels.
+
+        vartype (:class:`~dimod.Vartype`/str/set):
+            Variable type of the samples. Unset bits have value -1 for
+            :class:`~dimod.Vartype.SPIN` and 0 for :class:`~dimod.Vartype.BINARY`.
+
+    Examples:
+
+        >>> import numpy as np
+        ...
+        >>> samples = np.array([[-1, +1, -1, +1], [-1, -1, +1, +1]], dtype=np.int8)
+        >>> packed = dwave.embedding.PackedSamples.from_samples(samples)
+        >>> dwave.embedding.broken_chains(packed, [[0, 1], [2, 3]])
+        array([[ True,  True],
+               [False, False]])
+
+    """
+    def __init__(self, packed, variables, vartype):
+        self.packed = packed = np.asarray(packed, dtype=np.uint8)
+        self.variables = variables = dimod.variables.Variables(variables)
+        self.vartype = dimod.as_vartype(vartype)
+
+        if packed.ndim != 2:
+            raise ValueError("packed should be a 2D array")
+        if packed.shape[1] != -(-len(variables) // 8):
+            raise ValueError("packed does not match the number of variables")
+
+    def __len__(self):
+        return self.packed.shape[0]
+
+    @classmethod
+    def from_samples(cls, samples_like, vartype=None):
+        """Pack samples.
+
+        Args:
+            samples_like (samples_like/:obj:`dimod.SampleSet`):
+                A collection of samples. `samples_like` is an extension of
+                NumPy's array_like. See :func:`dimod.as_samples`.
+
+            vartype (:class:`~dimod.Vartype`/str/set, optional):
+                Variable type of the samples. Defaults to that of a
+                :obj:`dimod.SampleSet`, otherwise to :class:`~dimod.Vartype.SPIN`
+                if no value is 0 and :class:`~dimod.Vartype.BINARY` if not.
+
+        Returns:
+            :class:`.PackedSamples`
+
+        """
+        if vartype is None and isinstance(samples_like, dimod.SampleSet):
+            vartype = samples_like.vartype
+
+        samples, labels = dimod.as_samples(samples_like)
+
+        if vartype is None:
+            vartype = dimod.SPIN if samples.all() else dimod.BINARY
+
+        return cls(np.packbits(samples > 0, axis=1), labels, vartype)
+
+    def unpack(self):
+        """Unpack the samples.
+
+        Returns:
+            tuple: A 2-tuple of the samples as an nS x nV array of dtype
+            'int8', and the variable labels.
+
+        """
+        samples = np.unpackbits(self.packed, axis=1, count=len(self.variables))
+        samples = samples.view(np.int8)
+        if self.vartype is dimod.SPIN:
+            samples *= 2
+            samples -= 1
+        return samples, self.variables
+
+
+def _packed_chain_ones(samples, chains, chunksize=None):
+    """Return the number of variables with value 1 in each chain of the
+    packed samples, as an nS-by-nC array, and the chain lengths.
+
+    Where the variables of the chains share bytes, the variables of a chain
+    in a byte are counted together with a lookup table of the number of set
+    bits of the byte masked to them. Otherwise blocks of samples are unpacked
+    and the chains summed.
+    """
+    columns, ptr = _chain_columns(samples.variables, chains)
+    lengths = np.diff(ptr)
+    num_chains = len(lengths)
+    packed = samples.packed
+    num_samples, num_bytes = packed.shape
+    num_variables = len(samples.variables)
+
+    # merge the variables of each chain by byte
+    chain_of = np.repeat(np.arange(num_chains), lengths)
+    keys, inverse = np.unique(chain_of * num_bytes + (columns >> 3), return_inverse=True)
+
+    dtype = np.min_scalar_type(lengths.max(initial=0))
+    ones = np.zeros((num_samples, num_chains), dtype=dtype)
+
+    if 2 * len(keys) <= len(columns):
+        masks = np.zeros(len(keys), dtype=np.uint8)
+        np.bitwise_or.at(masks, inverse.ravel(), (0x80 >> (columns & 7)).astype(np.uint8))
+        byte_chains, bytes_ = np.divmod(keys, num_bytes)
+        byte_ptr = np.zeros(num_chains + 1, dtype=np.int64)
+        np.cumsum(np.bincount(byte_chains, minlength=num_chains), out=byte_ptr[1:])
+
+        order, kth_bytes = _chain_positions(np.arange(len(keys)), byte_ptr)
+        kth_bytes = [(bytes_[idx], masks[idx]) for idx in kth_bytes]
+
+        block = _block_size(packed, chunksize)
+        for row in range(0, num_samples, block):
+            block_packed = packed[row:row+block]
+            block_ones = ones[row:row+block]
+            for cols, masks in kth_bytes:
+                block_ones[:, :len(cols)] += _POPCOUNT[block_packed[:, cols] & masks]
+    else:
+        order, kth_columns = _chain_positions(columns, ptr)
+
+        block = max(_BLOCK_BYTES // max(num_variables, 1), 1)
+        if chunksize is not None:
+            block = min(block, _block_size(packed, chunksize))
+        for row in range(0, num_samples, block):
+            unpacked = np.unpackbits(packed[row:row+block], axis=1, count=num_variables)
+            block_ones = ones[row:row+block]
+            for cols in kth_columns:
+                block_ones[:, :len(cols)] += unpacked[:, cols]
+
+    # back to the chain order
+    inverse = np.empty_like(order)
+    inverse[order] = np.arange(num_chains)
+    return ones[:, inverse], lengths
+
+
+def broken_chains(samples, chains, *, chunksize=None):
     """Find the broken chains.
 
     Args:
-        samples (array_like):
+        samples (array_like/:class:`.PackedSamples`):
             Samples as a nS x nV array_like object where nS is the number of samples and nV is the
             number of variables. The values should all be 0/1 or -1/+1.
+            Samples can also be bit-packed.
 
-        chains (list[array_like]):
+        chains (list[array_like]/:class:`.ChainIndex`):
             List of chains of length nC where nC is the number of chains.
             Each chain should be an array_like collection of column indices in samples.
 
+        chunksize (int, optional):
+            Maximum number of samples processed at a time. Bounds the memory
+            used beyond the returned array to about nC x `chunksize` sample
+            values. By default, blocks of samples of about 1 MB are used.
+
     Returns:
         :obj:`numpy.ndarray`: A nS x nC boolean array. If i, j is True, then chain j in sample i is
         broken.
@@ -61,36 +463,14 @@ def broken_chains(samples, chains):
                [ True,  True]])
 
     """
-    samples, labels = dimod.as_samples(samples)
+    if isinstance(samples, PackedSamples):
+        # a chain is broken if some but not all of its variables are set
+        ones, lengths = _packed_chain_ones(samples, chains, chunksize)
+        return (ones > 0) & (ones < lengths)
 
-    if labels != range(len(labels)):
-        relabel = {v: idx for idx, v in enumerate(labels)}
-        chains = [[relabel[v] for v in chain] for chain in chains]
-    else:
-        chains = list(map(list, chains))  # because we use them for indexing
-
-    num_samples, num_variables = samples.shape
-    num_chains = len(chains)
-
-    broken = np.zeros((num_samples, num_chains), dtype=bool, order='F')
-
-    for cidx, chain in enumerate(chains):
-        if isinstance(chain, set):
-            chain = list(chain)
-        chain = np.asarray(chain)
-
-        if chain.ndim > 1:
-            raise ValueError("chains should be 1D array_like objects")
-
-        # chains of length 1, or 0 cannot be broken
-        if len(chain) <= 1:
-            continue
+    samples, labels = dimod.as_samples(samples)
 
-        all_ = (samples[:, chain] == 1).all(axis=1)
-        any_ = (samples[:, chain] == 1).any(axis=1)
-        broken[:, cidx] = np.bitwise_xor(all_, any_)
-
-    return broken
+    return _broken_chains(samples, *_chain_columns(labels, chains), chunksize)
 
 
 def discard(samples, chains):
@@ -101,7 +481,7 @@ def discard(samples, chains):
             A collection of samples. `samples_like` is an extension of NumPy's
             array_like. See :func:`dimod.as_samples`.
 
-        chains (list[array_like]):
+        chains (list[array_like]/:class:`.ChainIndex`):
             List of chains, where each chain is an array_like collection of
             the variables in the same order as their represention in the given
             samples.
@@ -133,35 +513,28 @@ def discard(samples, chains):
     """
     samples, labels = dimod.as_samples(samples)
 
-    if labels != range(len(labels)):
-        relabel = {v: idx for idx, v in enumerate(labels)}
-        chains = [[relabel[v] for v in chain] for chain in chains]
-    else:
-        chains = list(map(list, chains))  # because we use them for indexing
+    columns, ptr = _chain_columns(labels, chains)
 
-    num_samples, num_variables = samples.shape
-    num_chains = len(chains)
+    if not np.diff(ptr).all():
+        raise ValueError("chains must have at least one variable")
 
-    broken = broken_chains(samples, chains)
+    broken = _broken_chains(samples, columns, ptr)
 
     unbroken_idxs, = np.where(~broken.any(axis=1))
 
-    chain_variables = np.fromiter((np.asarray(tuple(chain))[0] if isinstance(chain, set) else np.asarray(chain)[0]
-                                   for chain in chains),
-                                  count=num_chains, dtype=int)
-
-    return samples[np.ix_(unbroken_idxs, chain_variables)], unbroken_idxs
+    return samples[np.ix_(unbroken_idxs, columns[ptr[:-1]])], unbroken_idxs
 
 
 def majority_vote(samples, chains):
     """Unembed samples using the most common value for broken chains.
 
     Args:
-        samples (samples_like):
+        samples (samples_like/:class:`.PackedSamples`):
             A collection of samples. `samples_like` is an extension of NumPy's
-            array_like. See :func:`dimod.as_samples`.
+            array_like. See :func:`dimod.as_samples`. Samples can also be
+            bit-packed.
 
-        chains (list[array_like]):
+        chains (list[array_like]/:class:`.ChainIndex`):
             List of chains, where each chain is an array_like collection of
             the variables in the same order as their represention in the given
             samples.
@@ -196,35 +569,22 @@ def majority_vote(samples, chains):
         [0 1]
 
     """
-    samples, labels = dimod.as_samples(samples)
-
-    if labels != range(len(labels)):
-        relabel = {v: idx for idx, v in enumerate(labels)}
-        chains = [[relabel[v] for v in chain] for chain in chains]
-    else:
-        chains = list(map(list, chains))  # because we use them for indexing
+    if isinstance(samples, PackedSamples):
+        # a chain takes value 1 if at least half of its variables are set
+        ones, lengths = _packed_chain_ones(samples, chains)
+        unembedded = np.greater_equal(ones, lengths / 2).view(np.int8)
+        if samples.vartype is dimod.SPIN:
+            unembedded *= 2
+            unembedded -= 1
+        return unembedded, np.arange(len(unembedded))
 
-    num_samples, num_variables = samples.shape
-    num_chains = len(chains)
-
-    unembedded = np.empty((num_samples, num_chains), dtype='int8', order='F')
-
-    # determine if spin or binary. If samples are all 1, then either method works, so we use spin
-    # because it is faster
-    if samples.all():  # spin-valued
-        for cidx, chain in enumerate(chains):
-            # we just need the sign for spin. We don't use np.sign because in that can return 0
-            # and fixing the 0s is slow.
-            unembedded[:, cidx] = 2*(samples[:, chain].sum(axis=1) >= 0) - 1
-    else:  # binary-valued
-        for cidx, chain in enumerate(chains):
-            mid = len(chain) / 2
-            unembedded[:, cidx] = (samples[:, chain].sum(axis=1) >= mid)
+    samples, labels = dimod.as_samples(samples)
 
-    return unembedded, np.arange(num_samples)  # we keep all of the samples in this case
+    unembedded, _ = _majority_vote(samples, *_chain_columns(labels, chains))
+    return unembedded, np.arange(len(unembedded))  # we keep all of the samples in this case
 
 
-def weighted_random(samples, chains):
+def weighted_random(samples, chains, *, seed=None):
     """Unembed samples using weighed random choice for broken chains.
 
     Args:
@@ -232,11 +592,19 @@ def weighted_random(samples, chains):
             A collection of samples. `samples_like` is an extension of NumPy's
             array_like. See :func:`dimod.as_samples`.
 
-        chains (list[array_like]):
+        chains (list[array_like]/:class:`.ChainIndex`):
             List of chains, where each chain is an array_like collection of
             the variables in the same order as their represention in the given
             samples.
 
+        seed (int/:class:`numpy.random.SeedSequence`/:class:`numpy.random.Generator`, optional):
+            Seed, or generator, for the random choices. Unembedding the same
+            samples with the same seed gives the same result, including when
+            :func:`~dwave.embedding.unembed_sampleset` unembeds them in chunks
+            or threads, for instance with
+            ``functools.partial(weighted_random, seed=42)``.
+            A generator is drawn from once per call.
+
     Returns:
         tuple: A 2-tuple containing:
 
@@ -244,6 +612,7 @@ def weighted_random(samples, chains):
             dtype 'int8', where nC is the number of chains and nS the number
             of samples. Broken chains are resolved by setting the sample value to
             a random value weighted by frequency of the value in the chain.
+            The value is chosen independently for each sample and chain.
 
             :obj:`numpy.ndarray`: Indicies of the samples. Equivalent to
             :code:`np.arange(nS)` because all samples are kept
@@ -268,22 +637,105 @@ def weighted_random(samples, chains):
     """
     samples, labels = dimod.as_samples(samples)
 
-    if labels != range(len(labels)):
-        relabel = {v: idx for idx, v in enumerate(labels)}
-        chains = [[relabel[v] for v in chain] for chain in chains]
+    columns, ptr = _chain_columns(labels, chains)
+
+    unembedded = _weighted_random(samples, columns, ptr, _seed_sequence(seed))
+    return unembedded, np.arange(len(unembedded))
+
+
+# weighted_random draws the choices of each block of this many rows from its
+# own stream
+_RANDOM_BLOCK = 1024
+
+
+def _seed_sequence(seed):
+    """Return the seed of weighted_random as a SeedSequence."""
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    if isinstance(seed, np.random.Generator):
+        return np.random.SeedSequence(seed.integers(2**63))
+    return np.random.SeedSequence(seed)
+
+
+def _weighted_random(samples, columns, ptr, seed_sequence, start=0):
+    """Return the weighted random choice of each chain in each sample, for
+    samples starting at row `start` of all of the samples unembedded.
+
+    The choices of the rows of block k are drawn from the k-th child of
+    `seed_sequence`, so they do not depend on how the rows are chunked.
+    """
+    lengths = np.diff(ptr)
+
+    if not lengths.all():
+        raise ValueError("chains must have at least one variable")
+
+    # it sufficies to choose a random variable from each chain in each sample,
+    # which takes each value with its frequency in the chain
+    num_samples = samples.shape[0]
+    uniform = np.empty((num_samples, len(lengths)))
+    stop = start + num_samples
+    for block_start in range(start - start % _RANDOM_BLOCK, stop, _RANDOM_BLOCK):
+        # the spawn_key of the block, without spawning from the sequence
+        rng = np.random.default_rng(np.random.SeedSequence(
+            seed_sequence.entropy,
+            spawn_key=seed_sequence.spawn_key + (block_start // _RANDOM_BLOCK,),
+            pool_size=seed_sequence.pool_size))
+
+        # every row takes the same draws wherever the chunk starts
+        block_stop = min(block_start + _RANDOM_BLOCK, stop)
+        draws = rng.random((block_stop - block_start, len(lengths)))
+        first = max(start, block_start)
+        uniform[first-start:block_stop-start] = draws[first-block_start:]
+
+    choices = ptr[:-1] + (uniform * lengths).astype(np.int64)
+
+    return np.take_along_axis(samples, columns[choices], axis=1)
+
+
+def _seeded(chain_break_method):
+    """Return `chain_break_method` with its seed resolved once if it is
+    weighted_random, so that chunks of samples share it, otherwise None."""
+    if chain_break_method is weighted_random:
+        seed = None
+    elif (isinstance(chain_break_method, functools.partial)
+            and chain_break_method.func is weighted_random
+            and not chain_break_method.args
+            and set(chain_break_method.keywords) <= {'seed'}):
+        seed = chain_break_method.keywords.get('seed')
     else:
-        chains = list(map(list, chains))  # because we use them for indexing
+        return None
+    return functools.partial(weighted_random, seed=_seed_sequence(seed))
+
 
-    # it sufficies to choose a random index from each chain and use that to construct the matrix
-    idx = [np.random.choice(chain) for chain in chains]
+def _bqm_arrays(bqm):
+    """Return the index of each variable of the bqm, and its linear biases
+    and its interactions as a symmetric CSR matrix by index."""
+    index = {v: idx for idx, v in enumerate(bqm.variables)}
+    linear, (irow, icol, quadratic), _ = bqm.to_numpy_vectors(
+        variable_order=list(bqm.variables))
+    quadratic = scipy.sparse.coo_matrix(
+        (np.concatenate((quadratic, quadratic)),
+         (np.concatenate((irow, icol)), np.concatenate((icol, irow)))),
+        shape=(len(linear), len(linear))).tocsr()
+    return index, linear, quadratic
 
-    num_samples, num_variables = samples.shape
-    return samples[:, idx], np.arange(num_samples)  # we keep all of the samples in this case
+
+def _chain_indices(chain_to_var, index, labels, columns, ptr):
+    """Return the index in the bqm of the source variable of each chain."""
+    num_chains = len(ptr) - 1
+    return np.fromiter(
+        (index[chain_to_var[frozenset(labels[c] for c in columns[start:end])]]
+         for start, end in zip(ptr[:-1], ptr[1:])),
+        count=num_chains, dtype=np.int64)
 
 
 class MinimizeEnergy(Callable):
     """Unembed samples by minimizing local energy for broken chains.
 
+    The biases of `bqm` are read once, on construction. Changes made to the
+    binary quadratic model afterwards are not seen by this method; construct
+    a new one for the changed model.
+
     Args:
         bqm (:class:`~dimod.BinaryQuadraticModel`).
             Binary quadratic model associated with the source graph.
@@ -328,6 +780,8 @@ class MinimizeEnergy(Callable):
 
         self.bqm = bqm
 
+        self._index, self._linear, self._quadratic = _bqm_arrays(bqm)
+
     def __call__(self, samples, chains):
         """
         Args:
@@ -335,7 +789,7 @@ class MinimizeEnergy(Callable):
                 A collection of samples. `samples_like` is an extension of NumPy's
                 array_like. See :func:`dimod.as_samples`.
 
-            chains (list[array_like]):
+            chains (list[array_like]/:class:`.ChainIndex`):
                 List of chains, where each chain is an array_like collection of
                 the variables in the same order as their represention in the given
                 samples.
@@ -353,59 +807,338 @@ class MinimizeEnergy(Callable):
         """
         samples, labels = dimod.as_samples(samples)
 
-        if labels != range(len(labels)):
-            relabel = {v: idx for idx, v in enumerate(labels)}
-            chains = [[relabel[v] for v in chain] for chain in chains]
-        else:
-            chains = list(map(list, chains))  # because we use them for indexing
-
-        chain_to_var = self.chain_to_var
-        variables = [chain_to_var[frozenset(labels[c] for c in chain)]
-                     for chain in chains]
+        columns, ptr = _chain_columns(labels, chains)
 
-        # we want the bqm by index
-        bqm = self.bqm.relabel_variables({v: idx for idx, v in enumerate(variables)}, inplace=False)
+        # we want the bqm by chain
+        vidxs = _chain_indices(self.chain_to_var, self._index, labels, columns, ptr)
+        linear = self._linear[vidxs]
+        quadratic = self._quadratic[vidxs][:, vidxs]
 
-        num_chains = len(chains)
+        num_samples = samples.shape[0]
+        lengths = np.diff(ptr)
 
-        if bqm.vartype is dimod.SPIN:
+        if self.bqm.vartype is dimod.SPIN:
             ZERO = -1
         else:
             ZERO = 0
 
-        def _minenergy(arr):
+        # empty chains are resolved along with the broken ones
+        broken = _broken_chains(samples, columns, ptr)
+        broken |= lengths == 0
+
+        unembedded = np.zeros((num_samples, len(lengths)), dtype=np.int8)
+        nonempty, = np.nonzero(lengths)
+        unembedded[:, nonempty] = samples[:, columns[ptr[nonempty]]]
+        unembedded[broken] = 0
+
+        # only the rows and chains with breaks take part in the descent
+        rows, = np.nonzero(broken.any(axis=1))
+        cidxs, = np.nonzero(broken.any(axis=0))
+        if not len(rows):
+            return unembedded, np.arange(num_samples)
+
+        remaining = broken[np.ix_(rows, cidxs)]
+
+        # the energy contribution of each broken chain given the unbroken ones
+        fields = (quadratic[cidxs] @ unembedded[rows].T.astype(linear.dtype)).T
+        fields += linear[cidxs]
+
+        interactions = quadratic[cidxs][:, cidxs].tocsr()
 
-            unbroken_arr = np.zeros((num_chains,), dtype=np.int8)
-            broken = []
+        # every sample fixes the broken chain with the largest magnitude field
+        # in turn, breaking ties by the smallest field then the smallest chain
+        # index, and updates the fields of its other broken chains
+        while len(rows):
+            magnitudes = np.where(remaining, np.abs(fields), -np.inf)
+            largest = magnitudes == magnitudes.max(axis=1, keepdims=True)
+            choice = np.where(largest, fields, np.inf).argmin(axis=1)
 
-            for cidx, chain in enumerate(chains):
-                eq1 = (arr[chain] == 1)
-                if not np.bitwise_xor(eq1.all(), eq1.any()):
-                    # not broken
-                    unbroken_arr[cidx] = arr[chain][0]
-                else:
-                    broken.append(cidx)
+            positions = np.arange(len(rows))
+            values = np.where(fields[positions, choice] > 0, ZERO, 1).astype(np.int8)
 
-            energies = []
-            for cidx in broken:
-                en = bqm.linear[cidx] + sum(unbroken_arr[idx] * bqm.adj[cidx][idx] for idx in bqm.adj[cidx])
-                energies.append([-abs(en), en, cidx])
-            heapify(energies)
+            unembedded[rows, cidxs[choice]] = values
+            remaining[positions, choice] = False
 
-            while energies:
-                _, e, i = heappop(energies)
+            neighbours = interactions[choice].tocoo()
+            fields[neighbours.row, neighbours.col] += values[neighbours.row] * neighbours.data
 
-                unbroken_arr[i] = val = ZERO if e > 0 else 1
+            unfinished = remaining.any(axis=1)
+            if not unfinished.all():
+                rows = rows[unfinished]
+                remaining = remaining[unfinished]
+                fields = fields[unfinished]
 
-                for energy_triple in energies:
-                    k = energy_triple[2]
-                    if k in bqm.adj[i]:
-                        energy_triple[1] += val * bqm.adj[i][k]
-                    energy_triple[0] = -abs(energy_triple[1])
+        return unembedded, np.arange(num_samples)
 
-                heapify(energies)
 
-            return unbroken_arr
+class SteepestDescent(Callable):
+    """Unembed samples by resolving broken chains, then polishing the samples
+    with steepest descent on the source binary quadratic model.
 
-        num_samples, num_variables = samples.shape
-        return np.apply_along_axis(_minenergy, 1, samples), np.arange(num_samples)
+    Every sample repeatedly flips the variable that lowers its energy the
+    most, until no single flip lowers it. All of the samples descend
+    together: the local fields of every variable in every sample are kept in
+    one array and updated, from a CSR matrix of the interactions, for the
+    variables flipped in each round.
+
+    The energies of the polished samples are tracked along the way, so
+    :func:`~dwave.embedding.unembed_sampleset` does not compute them again
+    when given the same binary quadratic model.
+
+    As for :class:`MinimizeEnergy`, the biases of `bqm` are read once, on
+    construction, and later changes to the model are not seen.
+
+    Args:
+        bqm (:class:`~dimod.BinaryQuadraticModel`).
+            Binary quadratic model associated with the source graph.
+
+        embedding (dict):
+            Mapping from source graph to target graph as a dict of form {s: [t, ...], ...},
+            where s is a source-model variable and t is a target-model variable.
+
+        chain_break_method (function, optional):
+            Method used to resolve chain breaks before the descent.
+            Defaults to :func:`.majority_vote`.
+
+    Examples:
+        This example unembeds with majority vote a sample of a triangular
+        graph embedded in a square graph, then polishes it. The majority vote
+        sample has energy 1, one flip lowers it to -1.
+
+        >>> import dimod
+        >>> import numpy as np
+        ...
+        >>> h = {'a': 0, 'b': 0, 'c': 0}
+        >>> J = {('a', 'b'): 1, ('b', 'c'): 1, ('a', 'c'): 1}
+        >>> bqm = dimod.BinaryQuadraticModel.from_ising(h, J)
+        >>> embedding = {'a': [0], 'b': [1], 'c': [2, 3]}
+        >>> cbm = dwave.embedding.SteepestDescent(bqm, embedding)
+        >>> samples = np.array([[+1, +1, +1, -1]], dtype=np.int8)
+        >>> chains = [embedding['a'], embedding['b'], embedding['c']]
+        >>> unembedded, idx = cbm(samples, chains)
+        >>> unembedded
+        array([[-1,  1,  1]], dtype=int8)
+        >>> bqm.energies((unembedded, 'abc'))
+        array([-1.])
+
+    """
+    def __init__(self, bqm, embedding, chain_break_method=None):
+        if chain_break_method is None:
+            chain_break_method = majority_vote
+
+        self.chain_to_var = {frozenset(chain): v for v, chain in embedding.items()}
+
+        self.bqm = bqm
+        self.chain_break_method = chain_break_method
+
+        self._index, self._linear, self._quadratic = _bqm_arrays(bqm)
+
+    def __call__(self, samples, chains):
+        """
+        Args:
+            samples (samples_like):
+                A collection of samples. `samples_like` is an extension of NumPy's
+                array_like. See :func:`dimod.as_samples`.
+
+            chains (list[array_like]/:class:`.ChainIndex`):
+                List of chains, where each chain is an array_like collection of
+                the variables in the same order as their represention in the given
+                samples.
+
+        Returns:
+            tuple: A 2-tuple containing:
+
+                :obj:`numpy.ndarray`: Unembedded samples as an nS-by-nC array of
+                dtype 'int8', where nC is the number of chains and nS the number
+                of samples kept by `chain_break_method`, each at a local
+                minimum of the energy.
+
+                :obj:`numpy.ndarray`: Indicies of the samples kept by
+                `chain_break_method`.
+
+        """
+        array, labels = dimod.as_samples(samples)
+        unembedded, idxs, _, _ = self._resolve(samples, chains, array, labels,
+                                               *_chain_columns(labels, chains))
+        return unembedded, idxs
+
+    def _resolve(self, samples, chains, array, labels, columns, ptr, broken=None):
+        """Resolve the chain breaks and polish the samples.
+
+        Returns the polished samples, the indices of the kept samples, the
+        broken chains as returned by :func:`_resolve_chain_breaks` and the
+        energies of the polished samples. The energies are only those of the
+        source bqm if the chains cover all of its variables.
+        """
+        unembedded, idxs, broken, _ = _resolve_chain_breaks(
+            samples, chains, self.chain_break_method, array, labels, columns, ptr, broken)
+
+        # we want the bqm by chain
+        vidxs = _chain_indices(self.chain_to_var, self._index, labels, columns, ptr)
+        linear = self._linear[vidxs]
+        quadratic = self._quadratic[vidxs][:, vidxs].tocsr()
+
+        unembedded = np.array(unembedded, dtype=np.int8)  # we modify it in place
+        values = unembedded.astype(linear.dtype)
+
+        # the local field of every variable in every sample
+        fields = (quadratic @ values.T).T
+        energies = values @ linear + (values * fields).sum(axis=1) / 2 + self.bqm.offset
+        fields += linear
+
+        # flipping a variable changes it by 1 - 2x for binary and -2x for spin
+        one = 1 if self.bqm.vartype is dimod.BINARY else 0
+
+        rows = np.arange(len(unembedded) if len(linear) else 0)
+        while len(rows):
+            changes = one - 2 * unembedded[rows]
+            deltas = changes * fields[rows]
+
+            choice = deltas.argmin(axis=1)
+            positions = np.arange(len(rows))
+            best = deltas[positions, choice]
+
+            # samples at a local minimum are done
+            improving = best < 0
+            rows = rows[improving]
+            choice = choice[improving]
+            best = best[improving]
+            change = changes[positions[improving], choice]
+
+            unembedded[rows, choice] += change
+            energies[rows] += best
+
+            neighbours = quadratic[choice].tocoo()
+            fields[rows[neighbours.row], neighbours.col] += change[neighbours.row] * neighbours.data
+
+        return unembedded, idxs, broken, energies
+
+
+def unembed_samples(samples, chains, chain_break_method=None, *,
+                    return_broken=False):
+    """Unembed samples and find their broken chains together.
+
+    The samples are converted and the chains indexed once, and shared between
+    resolving the chain breaks and finding the broken chains. For
+    :func:`.majority_vote` both are derived from the same chain sums, so the
+    chain columns are gathered only once.
+
+    Args:
+        samples (samples_like):
+            A collection of samples. `samples_like` is an extension of NumPy's
+            array_like. See :func:`dimod.as_samples`.
+
+        chains (list[array_like]/:class:`.ChainIndex`):
+            List of chains, where each chain is an array_like collection of
+            the variables in the same order as their represention in the given
+            samples.
+
+        chain_break_method (function, optional):
+            Method used to resolve chain breaks.
+            Defaults to :func:`.majority_vote`.
+
+        return_broken (bool, optional, default=False):
+            If True, also return the broken chains of the kept samples.
+
+    Returns:
+        tuple: A 4-tuple, or a 5-tuple if `return_broken` is True, containing:
+
+            :obj:`numpy.ndarray`: Unembedded samples as returned by
+            `chain_break_method`.
+
+            :obj:`numpy.ndarray`: Indices of the samples kept by
+            `chain_break_method`.
+
+            :obj:`numpy.ndarray`: Number of broken chains in each of the kept
+            samples.
+
+            :obj:`numpy.ndarray`: Fraction of broken chains in each of the
+            kept samples.
+
+            :obj:`numpy.ndarray`: Boolean array of the broken chains in each of
+            the kept samples, as returned by :func:`.broken_chains`.
+
+    Examples:
+        This example unembeds two samples with :func:`.majority_vote`. Chain
+        (0, 1) is broken in the second sample.
+
+        >>> import numpy as np
+        ...
+        >>> chains = [(0, 1), (2,)]
+        >>> samples = np.array([[1, 1, 0], [1, 0, 0]], dtype=np.int8)
+        >>> unembedded, idx, num_broken, fraction = dwave.embedding.unembed_samples(
+        ...     samples, chains)
+        >>> print(unembedded)
+        [[1 0]
+         [1 0]]
+        >>> print(num_broken)
+        [0 1]
+        >>> print(fraction)
+        [0.  0.5]
+
+    """
+    if chain_break_method is None:
+        chain_break_method = majority_vote
+
+    array, labels = dimod.as_samples(samples)
+    columns, ptr = _chain_columns(labels, chains)
+    num_chains = len(ptr) - 1
+
+    unembedded, idxs, broken, _ = _resolve_chain_breaks(
+        samples, chains, chain_break_method, array, labels, columns, ptr)
+    if broken is None:
+        broken = _broken_chains(array, columns, ptr)
+    broken = broken[idxs]
+
+    num_broken = np.count_nonzero(broken, axis=1)
+    if num_chains:
+        fraction = num_broken / num_chains
+    else:
+        fraction = np.zeros(len(num_broken))
+
+    if return_broken:
+        return unembedded, idxs, num_broken, fraction, broken
+    return unembedded, idxs, num_broken, fraction
+
+
+def _resolve_chain_breaks(samples, chains, chain_break_method,
+                          array, labels, columns, ptr, broken=None,
+                          source_bqm=None, start=0):
+    """Apply `chain_break_method` to samples already converted to `array`
+    with variables `labels`, with the chains indexed as `columns` and `ptr`.
+
+    Returns the unembedded samples, the indices of the kept samples, the
+    broken chains of all of the samples if they were given as `broken` or
+    found along the way, otherwise None, and the energies of the unembedded
+    samples if `chain_break_method` computed them for `source_bqm`, otherwise
+    None. The samples are the rows of all of the samples unembedded from
+    `start`, for :func:`weighted_random` to draw the same choices for them
+    however they are chunked.
+    """
+    if chain_break_method is majority_vote:
+        unembedded, voted = _majority_vote(array, columns, ptr)
+        return unembedded, np.arange(len(unembedded)), voted if broken is None else broken, None
+
+    if chain_break_method is discard:
+        if not np.diff(ptr).all():
+            raise ValueError("chains must have at least one variable")
+        if broken is None:
+            broken = _broken_chains(array, columns, ptr)
+        idxs, = np.where(~broken.any(axis=1))
+        return array[np.ix_(idxs, columns[ptr[:-1]])], idxs, broken, None
+
+    seeded = _seeded(chain_break_method)
+    if seeded is not None:
+        unembedded = _weighted_random(array, columns, ptr,
+                                      seeded.keywords['seed'], start)
+        return unembedded, np.arange(len(unembedded)), broken, None
+
+    if isinstance(chain_break_method, SteepestDescent):
+        unembedded, idxs, broken, energies = chain_break_method._resolve(
+            samples, chains, array, labels, columns, ptr, broken)
+        if chain_break_method.bqm is not source_bqm:
+            energies = None
+        return unembedded, idxs, broken, energies
+
+    unembedded, idxs = chain_break_method(samples, chains)
+    return unembedded, idxs, broken, None
@@ -92,16 +92,22 @@ def uniform_torque_compensation(bqm, embedding=None, prefactor=1.414):
         float: The chain strength, or 1 if chain strength is not applicable.
 
     """
-    num_interactions = bqm.num_interactions
-
     # NumPy arrays improves performance through vectorization
-    quadratic_array = np.fromiter(bqm.quadratic.values(), dtype=float, count=num_interactions)
+    quadratic_array = bqm.to_numpy_vectors(sort_labels=False).quadratic.biases
+
+    return _uniform_torque_compensation(quadratic_array, bqm.num_variables, prefactor)
+
+def _uniform_torque_compensation(quadratic, num_variables, prefactor=1.414):
+    """Uniform torque compensation from an array of the quadratic biases of a
+    binary quadratic model with `num_variables` variables."""
+    num_interactions = len(quadratic)
 
     if num_interactions:
-        squared_j = quadratic_array**2
+        squared_j = np.asarray(quadratic, dtype=float)**2
 
         rms = math.sqrt(squared_j.sum() / num_interactions)
-        avg_degree = bqm.degrees(array=True).mean()
+        # the sum of the degrees is twice the number of interactions
+        avg_degree = 2 * num_interactions / num_variables
 
         return prefactor * rms * math.sqrt(avg_degree)
 
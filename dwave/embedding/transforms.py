@@ -13,19 +13,29 @@
 #    limitations under the License.
 
 import collections.abc as abc
-import itertools
+import concurrent.futures
+import copy
+import hashlib
+import json
+import numbers
+import os
+import struct
 import typing
 import warnings
-from collections import defaultdict
-from functools import cached_property
+from functools import cached_property, partial
 
 import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
 import dimod
+from dimod.variables import iter_serialize_variables, iter_deserialize_variables
 
-from dwave.embedding.chain_breaks import majority_vote, broken_chains
-from dwave.embedding.exceptions import MissingEdgeError, MissingChainError, InvalidNodeError, DisconnectedChainError
-from dwave.embedding.utils import adjacency_to_edges, intlabel_disjointsets
-from dwave.embedding.chain_strength import uniform_torque_compensation
+from dwave.embedding.chain_breaks import discard, majority_vote, ChainIndex
+from dwave.embedding.chain_breaks import _broken_chains, _chain_columns, _resolve_chain_breaks, _seeded
+from dwave.embedding.exceptions import (MissingEdgeError, MissingChainError, InvalidNodeError,
+                                        DisconnectedChainError, ChainOverlapError)
+from dwave.embedding.utils import adjacency_to_edges
+from dwave.embedding.chain_strength import _uniform_torque_compensation
 
 
 __all__ = ['embed_bqm',
@@ -33,8 +43,244 @@ __all__ = ['embed_bqm',
            'embed_qubo',
            'unembed_sampleset',
            'EmbeddedStructure',
+           'EmbeddingPlan',
+           'LazySampleSet',
            ]
 
+def _as_label_array(labels):
+    """Return a 1D array of the given variable labels, using an integer dtype
+    when all of the labels are integers."""
+    labels = list(labels)
+    if all(isinstance(v, numbers.Integral) for v in labels):
+        return np.array(labels, dtype=np.int64)
+    arr = np.empty(len(labels), dtype=object)
+    arr[:] = labels
+    return arr
+
+
+def _ranges(starts, lengths):
+    """Concatenate :code:`range(s, s + n)` for each ``s, n`` in
+    ``zip(starts, lengths)`` as an array."""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    total = int(lengths.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64)
+    ends = np.cumsum(lengths)
+    shifts = np.repeat(np.asarray(starts, dtype=np.int64) - (ends - lengths), lengths)
+    return shifts + np.arange(total, dtype=np.int64)
+
+
+def _change_vartype_vectors(linear, quadratic, offset, row_indices, col_indices,
+                            vartype):
+    """Convert stacked (num_problems, n) bias vectors to the given vartype,
+    as :meth:`dimod.BinaryQuadraticModel.change_vartype` would, without
+    building a binary quadratic model.
+    """
+    neighbourhood = np.zeros_like(linear)
+    np.add.at(neighbourhood, (slice(None), row_indices), quadratic)
+    np.add.at(neighbourhood, (slice(None), col_indices), quadratic)
+
+    if vartype is dimod.SPIN:  # from BINARY
+        return (linear / 2 + neighbourhood / 4,
+                quadratic / 4,
+                offset + linear.sum(axis=1) / 2 + quadratic.sum(axis=1) / 4)
+    else:  # to BINARY from SPIN
+        return (2 * linear - 2 * neighbourhood,
+                4 * quadratic,
+                offset - linear.sum(axis=1) + quadratic.sum(axis=1))
+
+
+def _target_fingerprint(target_edges):
+    """Return a hex digest identifying the target graph given by its edges,
+    independent of the order of the edges and of the nodes within each edge.
+    """
+    try:
+        edges = np.asarray(target_edges) if len(target_edges) else np.empty((0, 2), dtype=np.int64)
+    except ValueError:
+        # labels of different shapes
+        edges = np.empty(0, dtype=object)
+
+    if edges.ndim == 2 and edges.shape[1] == 2 and edges.dtype.kind in 'iu':
+        # integer-labelled graphs are hashed as sorted unique edge arrays
+        edges = np.sort(edges.astype(np.int64), axis=1)
+        edges = edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+        unique = np.ones(len(edges), dtype=bool)
+        unique[1:] = (edges[1:] != edges[:-1]).any(axis=1)
+        canonical = b'int64:' + edges[unique].tobytes()
+    else:
+        # otherwise as sorted lines of serialized labels
+        lines = set()
+        for u, v in target_edges:
+            u, v = sorted(json.dumps(label) for label in iter_serialize_variables((u, v)))
+            lines.add(u + ' ' + v)
+        canonical = b'json:' + '\n'.join(sorted(lines)).encode()
+
+    return hashlib.blake2b(canonical, digest_size=16).hexdigest()
+
+
+class _LabelIndex:
+    """Positions of labels in a 1D label array. If a label appears more than
+    once, its last position is used.
+    """
+    def __init__(self, labels):
+        self.labels = labels
+        self._dict = None
+
+        if labels.dtype != object:
+            # integer labels are looked up by binary search
+            order = np.argsort(labels, kind='stable')
+            sorted_labels = labels[order]
+            last = np.ones(len(sorted_labels), dtype=bool)
+            last[:-1] = sorted_labels[1:] != sorted_labels[:-1]
+            self._sorted = sorted_labels[last]
+            self._order = order[last]
+
+    def find(self, query):
+        """Return the positions of the labels in `query`, an integer array of
+        any shape or a flat sequence of labels, with -1 for missing labels.
+        """
+        if (self.labels.dtype != object and isinstance(query, np.ndarray)
+                and query.dtype.kind in 'iu'):
+            if not len(self._sorted):
+                return np.full(query.shape, -1, dtype=np.int64)
+            idx = np.searchsorted(self._sorted, query)
+            idx[idx == len(self._sorted)] = 0
+            return np.where(self._sorted[idx] == query, self._order[idx], -1)
+
+        positions = self.positions()
+        if isinstance(query, np.ndarray):
+            query = query.ravel().tolist()
+        return np.fromiter((positions.get(q, -1) for q in query),
+                           count=len(query), dtype=np.int64)
+
+    def positions(self):
+        """Return a dict mapping each label to its position."""
+        if self._dict is None:
+            self._dict = {q: i for i, q in enumerate(self.labels.tolist())}
+        return self._dict
+
+
+def _edge_array(target_edges):
+    """Return the target edges as an integer array of shape (E, 2), or None
+    if the labels are not integers."""
+    try:
+        edges = np.asarray(target_edges)
+    except ValueError:
+        return None  # labels of different shapes
+    if not edges.size:
+        return np.empty((0, 2), dtype=np.int64)
+    if edges.ndim != 2 or edges.shape[1] != 2 or edges.dtype.kind not in 'iu':
+        return None
+    return edges
+
+
+def _edge_positions(index, target_edges):
+    """Return an (E, 2) array of the positions of the endpoints of the target
+    edges in a :class:`_LabelIndex`, for the edges with both endpoints in it.
+    """
+    if not isinstance(target_edges, np.ndarray):
+        # for a sequence of edges, a dict lookup per edge is much cheaper
+        # than converting the whole target graph to an array, which would
+        # dominate for small embeddings of large target graphs
+        positions = index.positions()
+        edges = [(positions[u], positions[v]) for u, v in target_edges
+                 if u in positions and v in positions]
+        return np.array(edges, dtype=np.int64).reshape(-1, 2)
+
+    edges = _edge_array(target_edges) if index.labels.dtype != object else None
+    if edges is None:
+        # general hashable labels
+        edges = index.find(target_edges.ravel().tolist()).reshape(-1, 2)
+    else:
+        edges = index.find(edges)
+    return edges[(edges >= 0).all(axis=1)]
+
+
+class _TargetAdjacency:
+    """Compressed sparse row adjacency of a target graph, for finding the
+    target edges incident to a set of target nodes without scanning the
+    whole graph.
+    """
+    def __init__(self, target_edges):
+        edges = _edge_array(target_edges)
+        if edges is None:
+            nodes = _as_label_array(dict.fromkeys(q for edge in target_edges for q in edge))
+            self.index = index = _LabelIndex(nodes)
+            edges = _edge_positions(index, target_edges)
+        else:
+            nodes, edges = np.unique(edges, return_inverse=True)
+            self.index = _LabelIndex(nodes)
+            edges = edges.reshape(-1, 2)
+
+        heads = np.concatenate((edges[:, 0], edges[:, 1]))
+        tails = np.concatenate((edges[:, 1], edges[:, 0]))
+        order = np.argsort(heads, kind='stable')
+        self.neighbours = tails[order]
+        self.ptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(heads, minlength=len(nodes)), out=self.ptr[1:])
+
+    def incident_edges(self, labels):
+        """Return the position in `labels` and the label of the other
+        endpoint of every target edge incident to the given target nodes.
+        """
+        ids = self.index.find(labels)
+        present = ids >= 0
+        counts = np.zeros(len(ids), dtype=np.int64)
+        counts[present] = self.ptr[ids[present] + 1] - self.ptr[ids[present]]
+        heads = np.repeat(np.arange(len(ids)), counts)
+        tails = self.neighbours[_ranges(self.ptr[np.maximum(ids, 0)], counts)]
+        return heads, self.index.labels[tails]
+
+
+def _group_chain_edges(chain_edges, chain_of_edge, num_chains):
+    """Group chain edges by chain, keeping their order within each chain.
+    Returns the edges and the CSR offsets."""
+    order = np.argsort(chain_of_edge, kind='stable')
+    ptr = np.zeros(num_chains + 1, dtype=np.int64)
+    np.cumsum(np.bincount(chain_of_edge, minlength=num_chains), out=ptr[1:])
+    return chain_edges[order].reshape(-1, 2), ptr
+
+
+def _group_interaction_edges(edges, chains, num_chains):
+    """Group interaction edges by interacting pair of chains. Pairs are
+    oriented, and ordered, as they are first seen in the edges, and each
+    edge is oriented as its pair. Returns the pairs, the edges and the CSR
+    offsets."""
+    keys = chains.min(axis=1) * num_chains + chains.max(axis=1)
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    pair_of_edge = rank[inverse.ravel()]
+    pairs = chains[first[order]].reshape(-1, 2)
+
+    flipped = chains[:, 0] != pairs[pair_of_edge, 0]
+    edges = edges.copy()
+    edges[flipped] = edges[flipped, ::-1]
+
+    order = np.argsort(pair_of_edge, kind='stable')
+    ptr = np.zeros(len(pairs) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pair_of_edge, minlength=len(pairs)), out=ptr[1:])
+    return pairs, edges[order].reshape(-1, 2), ptr
+
+
+def _check_connected(chain_edges, chain_ptr, variables):
+    """Raise a DisconnectedChainError for the first chain that is not a single
+    connected component of its chain edges. Positions are relative to
+    ``chain_ptr[0]``."""
+    num_qubits = int(chain_ptr[-1] - chain_ptr[0])
+    graph = scipy.sparse.coo_matrix(
+        (np.ones(len(chain_edges)), (chain_edges[:, 0], chain_edges[:, 1])),
+        shape=(num_qubits, num_qubits))
+    num_components, component = scipy.sparse.csgraph.connected_components(
+        graph, directed=False)
+    if num_components != len(variables):
+        starts = chain_ptr[:-1] - chain_ptr[0]
+        disconnected = (np.minimum.reduceat(component, starts)
+                        != np.maximum.reduceat(component, starts))
+        raise DisconnectedChainError(variables[np.argmax(disconnected)])
+
+
 class EmbeddedStructure(dict):
     """Processes an embedding and a target graph to collect target edges
     into those within individual chains, and those that connect chains.  This
@@ -42,9 +288,11 @@ class EmbeddedStructure(dict):
 
     Args:
 
-        target_edges (iterable[edge]):
+        target_edges (iterable[edge]/:class:`numpy.ndarray`):
             An iterable of edges in the target graph.  Each edge should be an
-            iterable of 2 hashable objects.
+            iterable of 2 hashable objects. Integer-labelled target graphs can
+            also be given as an array of shape (num_edges, 2), which is
+            processed without iterating over the edges in Python.
 
         embedding (dict):
             Mapping from source graph to target graph as a dict of form
@@ -53,49 +301,319 @@ class EmbeddedStructure(dict):
 
 
     This class is a dict, and acts as an immutable duplicate of embedding.
+
+    Internally, the structure is stored in flat arrays. The target variables
+    of every chain are concatenated into a single array with an array of chain
+    offsets, and the chain edges and interaction edges are stored in
+    compressed sparse row (CSR) form, indexed by chain and by interacting pair
+    of chains respectively. :meth:`chain_edges`, :meth:`interaction_edges`
+    and :attr:`max_chain_length` are views over these arrays.
+
+    The arrays can be saved to a file with :meth:`save` and loaded, without
+    the target graph, with :meth:`load`.
     """
 
     def __init__(self, target_edges, embedding):
+        self._chain_strength = None
+
         if isinstance(embedding, EmbeddedStructure):
             super().__init__(embedding)
             if target_edges is None:
-                # this condition is used by self.copy
-                self._interaction_edges = embedding._interaction_edges.copy()
-                self._chain_edges = embedding._chain_edges.copy()
+                # this condition is used by self.copy; the arrays are
+                # read-only so they can be shared
+                self._set_arrays(*embedding._arrays())
+                self._target_edges = embedding._target_edges
+                self._target_fingerprint = embedding._target_fingerprint
+                self._target_adjacency = embedding._target_adjacency
                 return
         else:
             super().__init__((u, tuple(c)) for u, c in embedding.items())
 
-        target_label = {}
-        self._chain_edges = chain_edges = {}
-        self._interaction_edges = interaction_edges = defaultdict(list)
-        self._chain_strength = None
+        # keep the target edges to fingerprint the target graph on demand
+        if not isinstance(target_edges, (list, tuple, np.ndarray)):
+            target_edges = list(target_edges)
+        self._target_edges = target_edges
+        self._target_fingerprint = None
+        self._target_adjacency = None  # built on demand, see with_chains()
+
+        variables = list(self)
 
-        disjoint_sets = {}
-        # prepare the data structures and compute the labeling of target nodes
-        for u, emb_u in self.items():
-            chain_edges[u] = []
-            if not emb_u:
-                raise MissingChainError(u)
-            disjoint_sets[u] = intlabel_disjointsets(len(emb_u))
-            for i, q in enumerate(emb_u):
-                target_label[q] = u, i
+        # each target node gets a position in the flat array of chains
+        lengths = np.fromiter(map(len, self.values()), count=len(variables), dtype=np.int64)
+        if not lengths.all():
+            raise MissingChainError(variables[np.argmin(lengths)])
+        chain_ptr = np.zeros(len(variables) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=chain_ptr[1:])
+        qubits = _as_label_array(q for chain in self.values() for q in chain)
+
+        # the positions of the endpoints of the target edges within chains
+        positions = _edge_positions(_LabelIndex(qubits), target_edges)
+        chain_idx = np.repeat(np.arange(len(variables)), lengths)[positions]
 
         # filter the target edges into / between chain components
-        for p, q in target_edges:
-            if p in target_label and q in target_label:
-                u, i = target_label[p]
-                v, j = target_label[q]
-                if u == v:
-                    chain_edges[u].append((i, j))
-                    disjoint_sets[u].union(i, j)
-                else:
-                    interaction_edges[u, v].append(i)
-                    interaction_edges[v, u].append(j)
-
-        for u, emb_u in self.items():
-            if len(emb_u) != disjoint_sets[u].size(0):
-                raise DisconnectedChainError(u)
+        within = chain_idx[:, 0] == chain_idx[:, 1]
+
+        chain_edge_idx, chain_edge_ptr = _group_chain_edges(
+            positions[within], chain_idx[within, 0], len(variables))
+
+        _check_connected(chain_edge_idx, chain_ptr, variables)
+
+        pairs, pair_edge_idx, pair_ptr = _group_interaction_edges(
+            positions[~within], chain_idx[~within], len(variables))
+
+        self._set_arrays(qubits, chain_ptr, chain_edge_idx, chain_edge_ptr,
+                         pairs, pair_edge_idx, pair_ptr)
+
+    def _set_arrays(self, qubits, chain_ptr, chain_edge_idx, chain_edge_ptr,
+                    pairs, pair_edge_idx, pair_ptr):
+        for arr in (qubits, chain_ptr, chain_edge_idx, chain_edge_ptr,
+                    pairs, pair_edge_idx, pair_ptr):
+            arr.flags.writeable = False
+
+        # the target variables of the chains, concatenated in the order of
+        # the source variables. Chain k is qubits[chain_ptr[k]:chain_ptr[k+1]]
+        self._qubits = qubits
+        self._chain_ptr = chain_ptr
+
+        # chain edges of chain k, as positions in qubits, are
+        # chain_edge_idx[chain_edge_ptr[k]:chain_edge_ptr[k+1]]
+        self._chain_edge_idx = chain_edge_idx
+        self._chain_edge_ptr = chain_edge_ptr
+
+        # interacting pairs of chains (by source index), each stored once.
+        # The interaction edges for pair p, as positions in qubits, are
+        # pair_edge_idx[pair_ptr[p]:pair_ptr[p+1]], with the first column in
+        # the chain pairs[p, 0]
+        self._pairs = pairs
+        self._pair_edge_idx = pair_edge_idx
+        self._pair_ptr = pair_ptr
+
+        # sorted keys u*n + v for both orientations of each pair, so that
+        # pairs can be looked up by searchsorted
+        n = len(chain_ptr) - 1
+        keys = np.concatenate((pairs[:, 0] * n + pairs[:, 1],
+                               pairs[:, 1] * n + pairs[:, 0]))
+        order = np.argsort(keys, kind='stable')
+        self._pair_keys = keys[order]
+        self._pair_lookup = order  # pair index is order % num_pairs
+
+        self._index = {v: k for k, v in enumerate(self)}
+
+        # the most recently used EmbeddingPlan, see embedding_plan()
+        self._plan = None
+
+        # the most recently used ChainIndex, see chain_index()
+        self._chain_index = None
+
+    def _arrays(self):
+        return (self._qubits, self._chain_ptr,
+                self._chain_edge_idx, self._chain_edge_ptr,
+                self._pairs, self._pair_edge_idx, self._pair_ptr)
+
+    @classmethod
+    def _from_arrays(cls, variables, arrays, target_fingerprint=None, labels=None):
+        """Construct an EmbeddedStructure directly from its array representation."""
+        new = cls.__new__(cls)
+        qubits, chain_ptr = arrays[:2]
+        if labels is None:
+            labels = qubits.tolist()
+        chain_ptr = chain_ptr.tolist()
+        dict.__init__(new, ((v, tuple(labels[chain_ptr[k]:chain_ptr[k+1]]))
+                            for k, v in enumerate(variables)))
+        new._chain_strength = None
+        new._target_edges = None
+        new._target_fingerprint = target_fingerprint
+        new._target_adjacency = None
+        new._set_arrays(*arrays)
+        return new
+
+    def __reduce__(self):
+        return (type(self)._from_arrays,
+                (list(self), self._arrays(), self._target_fingerprint))
+
+    @property
+    def target_fingerprint(self):
+        """str: Digest of the target graph the structure was built from, or
+        None if it is unknown.
+
+        The digest depends only on the set of target edges, so it can be
+        compared against :meth:`fingerprint` of a solver's edgelist.
+        """
+        if self._target_fingerprint is None and self._target_edges is not None:
+            self._target_fingerprint = _target_fingerprint(self._target_edges)
+        return self._target_fingerprint
+
+    @staticmethod
+    def fingerprint(target_edges):
+        """Return the digest of a target graph, as used by
+        :attr:`target_fingerprint` and :meth:`load`.
+
+        Args:
+            target_edges (iterable[edge]):
+                An iterable of edges in the target graph.
+
+        Returns:
+            str: A hex digest that does not depend on the order of the edges.
+
+        """
+        if not isinstance(target_edges, (list, tuple, np.ndarray)):
+            target_edges = list(target_edges)
+        return _target_fingerprint(target_edges)
+
+    # names and order of the arrays in the file format, see save()
+    _FILE_ARRAYS = ('qubits', 'chain_ptr', 'chain_edge_idx', 'chain_edge_ptr',
+                    'pairs', 'pair_edge_idx', 'pair_ptr')
+    _FILE_MAGIC = b'DWEMBSTR'
+    _FILE_VERSION = (1, 0)
+    _FILE_ALIGNMENT = 64
+
+    def save(self, file):
+        """Save the structure to a file.
+
+        The file is a short header followed by the raw structure arrays, so
+        it can be loaded with :meth:`load` without the target graph.
+
+        Args:
+            file (str/path-like/file-like):
+                Path, or binary file object opened for writing.
+
+        Examples:
+            >>> import os, tempfile
+            >>> embedding = dwave.embedding.EmbeddedStructure([(0, 1), (1, 2)], {'a': (0, 1), 'b': (2,)})
+            >>> with tempfile.TemporaryDirectory() as tmpdir:
+            ...     path = os.path.join(tmpdir, 'embedding.bin')
+            ...     embedding.save(path)
+            ...     loaded = dwave.embedding.EmbeddedStructure.load(path, target_edges=[(1, 2), (0, 1)])
+            ...     print(loaded == embedding)
+            True
+
+        """
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'wb') as f:
+                return self.save(f)
+
+        arrays = dict(zip(self._FILE_ARRAYS, self._arrays()))
+
+        header = dict(variables=list(iter_serialize_variables(self)),
+                      target_fingerprint=self.target_fingerprint,
+                      arrays={})
+
+        if arrays['qubits'].dtype == object:
+            # labels that are not integers are stored in the header
+            header['qubits'] = list(iter_serialize_variables(arrays.pop('qubits')))
+
+        align = self._FILE_ALIGNMENT
+        offset = 0
+        for name, arr in arrays.items():
+            arr = np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder('<'))
+            arrays[name] = arr
+            header['arrays'][name] = dict(dtype=arr.dtype.str, shape=arr.shape, offset=offset)
+            offset += -(-arr.nbytes // align) * align
+
+        # the data starts at an aligned position after the magic string, the
+        # version, the header length and the header
+        prefix = len(self._FILE_MAGIC) + 2 + 4
+        header = json.dumps(header, separators=(',', ':')).encode()
+        header += b' ' * (-(prefix + len(header)) % align)
+
+        file.write(self._FILE_MAGIC)
+        file.write(bytes(self._FILE_VERSION))
+        file.write(struct.pack('<I', len(header)))
+        file.write(header)
+        for arr in arrays.values():
+            file.write(arr.tobytes())
+            file.write(b'\0' * (-arr.nbytes % align))
+
+    @classmethod
+    def load(cls, file, target_edges=None, *, target_fingerprint=None, mmap=True):
+        """Load a structure saved by :meth:`save`.
+
+        The cost of loading depends on the size of the embedding but not on
+        the size of the target graph.
+
+        Args:
+            file (str/path-like/file-like):
+                Path, or binary file object opened for reading.
+
+            target_edges (iterable[edge], optional):
+                Edges of the target graph the structure is used with. If
+                given, it is checked against the target graph the structure
+                was saved for.
+
+            target_fingerprint (str, optional):
+                Precomputed :meth:`fingerprint` of the target graph, which
+                avoids hashing `target_edges` on every load.
+
+            mmap (bool, optional, default=True):
+                If True, the structure arrays are memory-mapped read-only
+                rather than read into memory. Requires a path or a file
+                object with a file descriptor.
+
+        Returns:
+            :class:`EmbeddedStructure`
+
+        Raises:
+            ValueError: If the file is not a saved structure, has an
+                unsupported format version, or was saved for a different
+                target graph.
+
+        """
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'rb') as f:
+                return cls.load(f, target_edges, target_fingerprint=target_fingerprint,
+                                mmap=mmap)
+
+        magic = file.read(len(cls._FILE_MAGIC))
+        if magic != cls._FILE_MAGIC:
+            raise ValueError("file is not a saved EmbeddedStructure")
+
+        version = tuple(file.read(2))
+        if version[0] != cls._FILE_VERSION[0]:
+            raise ValueError("unsupported EmbeddedStructure file format version "
+                             "{}.{}".format(*version))
+
+        header_len, = struct.unpack('<I', file.read(4))
+        header = json.loads(file.read(header_len).decode())
+
+        if target_fingerprint is None and target_edges is not None:
+            target_fingerprint = cls.fingerprint(target_edges)
+        if target_fingerprint is not None and target_fingerprint != header['target_fingerprint']:
+            raise ValueError("the saved EmbeddedStructure is for a different target graph")
+
+        start = len(cls._FILE_MAGIC) + 2 + 4 + header_len
+        data = None if mmap else file.read()
+
+        arrays = {}
+        for name, spec in header['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            shape = tuple(spec['shape'])
+            count = int(np.prod(shape, dtype=np.int64))
+            if not count:
+                arr = np.empty(shape, dtype=dtype)
+            elif mmap:
+                arr = np.memmap(file, dtype=dtype, mode='r', shape=shape,
+                                offset=start + spec['offset'])
+            else:
+                arr = np.frombuffer(data, dtype=dtype, count=count,
+                                    offset=spec['offset']).reshape(shape)
+            arrays[name] = arr
+
+        labels = None
+        if 'qubits' in header:
+            labels = list(iter_deserialize_variables(header['qubits']))
+            arrays['qubits'] = _as_label_array(labels)
+
+        new = cls._from_arrays(list(iter_deserialize_variables(header['variables'])),
+                               tuple(arrays[name] for name in cls._FILE_ARRAYS),
+                               target_fingerprint=header['target_fingerprint'],
+                               labels=labels)
+
+        if target_edges is not None:
+            if not isinstance(target_edges, (list, tuple, np.ndarray)):
+                target_edges = list(target_edges)
+            new._target_edges = target_edges
+
+        return new
 
     def __copy__(self):
         return EmbeddedStructure(None, self)
@@ -124,7 +642,72 @@ class EmbeddedStructure(dict):
     def max_chain_length(self):
         """Maximum chain length in the embedding."""
         # we can cache the max chain length since we're immutable
-        return len(max(self.values(), default=[], key=len))
+        return int(np.diff(self._chain_ptr).max(initial=0))
+
+    @cached_property
+    def chain_couplers(self):
+        """tuple[tuple]: Target edges within chains, i.e. the couplers that
+        form the chains, in chain order.
+
+        Useful, for instance, as the ``ignored_interactions`` parameter of
+        scale-aware samplers. The edges are cached, so they are immutable.
+        """
+        return tuple(map(tuple, self._qubits[self._chain_edge_idx].tolist()))
+
+    @cached_property
+    def source_edges(self):
+        """list[tuple]: Edges of the source graph supported by the embedding,
+        that is the pairs of source variables whose chains are connected by
+        at least one target edge.
+
+        Each edge is oriented as the variables are ordered in the structure.
+        """
+        variables = list(self)
+        return [(variables[u], variables[v])
+                for u, v in np.sort(self._pairs, axis=1).tolist()]
+
+    @property
+    def source_adjacency(self):
+        """dict[variable, set]: Adjacency of the source graph supported by the
+        embedding, as derived by :func:`~dwave.embedding.target_to_source`
+        but without scanning the target graph.
+
+        The neighbours are cached, and every access returns a new copy of
+        them that can be modified freely.
+        """
+        return {v: set(neighbours) for v, neighbours in self._source_adjacency.items()}
+
+    @cached_property
+    def _source_adjacency(self):
+        adj = {v: set() for v in self}
+        for u, v in self.source_edges:
+            adj[u].add(v)
+            adj[v].add(u)
+        return {v: frozenset(neighbours) for v, neighbours in adj.items()}
+
+    def _pair(self, u, v):
+        """Return the index of the pair of chains for u and v, and whether
+        the stored orientation is (v, u), or None if the chains don't
+        interact."""
+        n = len(self._index)
+        key = self._index[u] * n + self._index[v]
+        pos = np.searchsorted(self._pair_keys, key)
+        if pos == len(self._pair_keys) or self._pair_keys[pos] != key:
+            return None
+        num_pairs = len(self._pairs)
+        idx = int(self._pair_lookup[pos])
+        return idx % num_pairs, idx >= num_pairs
+
+    def _num_chain_edges(self, u):
+        k = self._index[u]
+        return int(self._chain_edge_ptr[k + 1] - self._chain_edge_ptr[k])
+
+    def _num_interaction_edges(self, u, v):
+        pair = self._pair(u, v)
+        if pair is None:
+            return 0
+        p, _ = pair
+        return int(self._pair_ptr[p + 1] - self._pair_ptr[p])
 
     def chain_edges(self, u):
         """Iterate over edges contained in the chain for u.
@@ -137,9 +720,11 @@ class EmbeddedStructure(dict):
             tuple: A 2-tuple, corresponding to an edge in the target graph.
 
         """
-        emb_u = self[u]
-        for i, j in self._chain_edges[u]:
-            yield emb_u[i], emb_u[j]
+        k = self._index[u]
+        edges = self._chain_edge_idx[self._chain_edge_ptr[k]:self._chain_edge_ptr[k+1]]
+        labels = self._qubits[edges].tolist()
+        for p, q in labels:
+            yield p, q
 
     def interaction_edges(self, u, *args):
         """Iterate over edges between in the chains for u and v.
@@ -160,12 +745,19 @@ class EmbeddedStructure(dict):
             v, = args
         else:
             u, v = u
-        emb_u = self[u]
-        emb_v = self[v]
-        int_u = self._interaction_edges[u, v]
-        int_v = self._interaction_edges[v, u]
-        for i, j in zip(int_u, int_v):
-            yield emb_u[i], emb_v[j]
+
+        # raise a KeyError for unknown variables, consistent with chain_edges
+        self[u], self[v]
+
+        pair = self._pair(u, v)
+        if pair is None:
+            return
+        p, flipped = pair
+        edges = self._pair_edge_idx[self._pair_ptr[p]:self._pair_ptr[p+1]]
+        if flipped:
+            edges = edges[:, ::-1]
+        for p, q in self._qubits[edges].tolist():
+            yield p, q
 
     def _mutate_dict(self, *a, **k):
         """Raise a TypeError -- this method is not supported because
@@ -181,6 +773,187 @@ class EmbeddedStructure(dict):
         raise NotImplementedError("EmbeddedStructure does not support the"
                                   " fromkeys method")
 
+    def without(self, variables):
+        """Return a new structure without the chains of the given variables.
+
+        The chain edges and interaction edges of the remaining chains are
+        carried over, so the target graph is not scanned again.
+
+        Args:
+            variables (iterable):
+                Source variables to remove.
+
+        Returns:
+            :class:`EmbeddedStructure`
+
+        Raises:
+            KeyError: If a variable is not in the structure.
+
+        Examples:
+            >>> embedding = dwave.embedding.EmbeddedStructure([(0, 1), (1, 2), (2, 3)],
+            ...                                               {'a': (0,), 'b': (1, 2), 'c': (3,)})
+            >>> embedding.without(['c'])
+            {'a': (0,), 'b': (1, 2)}
+
+        """
+        return self._derive(variables, {})
+
+    def with_chains(self, chains):
+        """Return a new structure with chains added or replaced.
+
+        Only the target edges incident to the new chains are looked up, in
+        an index of the target graph that is built on first use and shared
+        by derived structures. Chains of new and replaced variables come
+        after the other chains in iteration order.
+
+        Args:
+            chains (dict):
+                Mapping from source variables to their new chains, as an
+                iterable of target nodes.
+
+        Returns:
+            :class:`EmbeddedStructure`
+
+        Raises:
+            :exc:`~dwave.embedding.exceptions.MissingChainError`:
+                If a chain is empty.
+
+            :exc:`~dwave.embedding.exceptions.ChainOverlapError`:
+                If a new chain shares a target node with another chain.
+
+            :exc:`~dwave.embedding.exceptions.DisconnectedChainError`:
+                If a new chain is not connected in the target graph.
+
+            ValueError: If the target graph of the structure is unknown, for
+                instance after :meth:`load` without `target_edges`.
+
+        Examples:
+            >>> embedding = dwave.embedding.EmbeddedStructure([(0, 1), (1, 2), (2, 3)],
+            ...                                               {'a': (0,), 'b': (1, 2)})
+            >>> new = embedding.with_chains({'c': (3,)})
+            >>> list(new.interaction_edges('b', 'c'))
+            [(2, 3)]
+
+        """
+        if self._target_adjacency is None:
+            if self._target_edges is None:
+                raise ValueError("the target graph of the structure is unknown")
+            self._target_adjacency = _TargetAdjacency(self._target_edges)
+        return self._derive([v for v in chains if v in self._index], chains)
+
+    def _derive(self, removed, chains):
+        """Return a new structure without the chains of the `removed`
+        variables and with the given `chains` appended."""
+        keep = np.ones(len(self), dtype=bool)
+        for v in removed:
+            keep[self._index[v]] = False
+        keep_idx = np.flatnonzero(keep)
+
+        # carry over the kept chains, chain edges and interaction edges,
+        # renumbering the positions and chains
+        lengths = np.diff(self._chain_ptr)
+        kept_qubit = np.repeat(keep, lengths)
+        qubit_map = np.cumsum(kept_qubit) - 1
+        chain_map = np.cumsum(keep) - 1
+
+        chain_lengths = [lengths[keep_idx]]
+
+        kept_edge = np.repeat(keep, np.diff(self._chain_edge_ptr))
+        chain_edges = [qubit_map[self._chain_edge_idx[kept_edge]]]
+        chain_edge_counts = [np.diff(self._chain_edge_ptr)[keep_idx]]
+
+        kept_pair = keep[self._pairs].all(axis=1)
+        kept_pair_edge = np.repeat(kept_pair, np.diff(self._pair_ptr))
+        pairs = [chain_map[self._pairs[kept_pair]]]
+        pair_edges = [qubit_map[self._pair_edge_idx[kept_pair_edge]]]
+        pair_counts = [np.diff(self._pair_ptr)[kept_pair]]
+
+        variables = [v for v, k in zip(self, keep) if k]
+        items = [(v, self[v]) for v in variables]
+
+        qubits = self._qubits[kept_qubit]
+        num_kept_chains = len(variables)
+        num_kept = len(qubits)
+
+        if chains:
+            new_variables = list(chains)
+            new_chains = [tuple(chains[v]) for v in new_variables]
+            new_lengths = np.fromiter(map(len, new_chains), count=len(new_chains),
+                                      dtype=np.int64)
+            if not new_lengths.all():
+                raise MissingChainError(new_variables[np.argmin(new_lengths)])
+
+            variables.extend(new_variables)
+            items.extend(zip(new_variables, new_chains))
+            chain_lengths.append(new_lengths)
+
+            new_qubits = _as_label_array(q for chain in new_chains for q in chain)
+            if qubits.dtype == new_qubits.dtype:
+                qubits = np.concatenate((qubits, new_qubits))
+            else:
+                qubits = _as_label_array(qubits.tolist() + new_qubits.tolist())
+
+            chain_of_qubit = np.repeat(np.arange(len(variables)),
+                                       np.concatenate(chain_lengths))
+
+            # a target node that is in a new chain and another chain is
+            # found at a different position than its own
+            index = _LabelIndex(qubits)
+            positions = np.arange(len(qubits))
+            pos = index.find(qubits)
+            overlap = (pos != positions) & ((pos >= num_kept) | (positions >= num_kept))
+            if overlap.any():
+                i = np.argmax(overlap)
+                raise ChainOverlapError(qubits[i],
+                                        variables[chain_of_qubit[pos[i]]],
+                                        variables[chain_of_qubit[i]])
+
+            # the target edges incident to the new chains, each edge between
+            # two new chains once
+            heads, tails = self._target_adjacency.incident_edges(qubits[num_kept:])
+            heads = heads + num_kept
+            tails = index.find(tails)
+            found = (tails >= 0) & ((tails < num_kept) | (heads < tails))
+            edges = np.stack((heads[found], tails[found]), axis=1)
+            edge_chains = chain_of_qubit[edges]
+
+            within = edge_chains[:, 0] == edge_chains[:, 1]
+            new_chain_edges, new_chain_edge_ptr = _group_chain_edges(
+                edges[within], edge_chains[within, 0] - num_kept_chains, len(new_chains))
+
+            new_chain_ptr = np.zeros(len(new_chains) + 1, dtype=np.int64)
+            np.cumsum(new_lengths, out=new_chain_ptr[1:])
+            _check_connected(new_chain_edges - num_kept, new_chain_ptr, new_variables)
+
+            chain_edges.append(new_chain_edges)
+            chain_edge_counts.append(np.diff(new_chain_edge_ptr))
+
+            new_pairs, new_pair_edges, new_pair_ptr = _group_interaction_edges(
+                edges[~within], edge_chains[~within], len(variables))
+            pairs.append(new_pairs)
+            pair_edges.append(new_pair_edges)
+            pair_counts.append(np.diff(new_pair_ptr))
+
+        def offsets(counts):
+            ptr = np.zeros(sum(map(len, counts)) + 1, dtype=np.int64)
+            np.cumsum(np.concatenate(counts), out=ptr[1:])
+            return ptr
+
+        new = type(self).__new__(type(self))
+        dict.__init__(new, items)
+        new._chain_strength = None
+        new._target_edges = self._target_edges
+        new._target_fingerprint = self._target_fingerprint
+        new._target_adjacency = self._target_adjacency
+        new._set_arrays(qubits,
+                        offsets(chain_lengths),
+                        np.concatenate(chain_edges).reshape(-1, 2),
+                        offsets(chain_edge_counts),
+                        np.concatenate(pairs).reshape(-1, 2),
+                        np.concatenate(pair_edges).reshape(-1, 2),
+                        offsets(pair_counts))
+        return new
+
     def _relabel_bqm(self, source_bqm: dimod.BQM) -> dimod.BQM:
         if self.max_chain_length != 1:
             raise TypeError("Embedding without chains required for relabeling")
@@ -191,6 +964,56 @@ class EmbeddedStructure(dict):
 
         return target_bqm
 
+    def embedding_plan(self, source_bqm):
+        """Return an :class:`EmbeddingPlan` for the structure of a binary
+        quadratic model.
+
+        The most recently used plan is cached, so repeated calls (and
+        :meth:`embed_bqm`) for binary quadratic models with the same variables
+        and interactions reuse it.
+
+        Args:
+            source_bqm (:class:`~dimod.BinaryQuadraticModel`):
+                Binary quadratic model.
+
+        Returns:
+            :class:`EmbeddingPlan`
+
+        """
+        _, (irow, icol, _), _, labels = source_bqm.to_numpy_vectors(
+            sort_labels=False, return_labels=True)
+        return self._embedding_plan(labels, irow, icol)
+
+    def _embedding_plan(self, variables, row_indices, col_indices):
+        plan = self._plan
+        if plan is None or not plan._matches(variables, row_indices, col_indices):
+            self._plan = plan = EmbeddingPlan(self, variables, row_indices, col_indices)
+        return plan
+
+    def chain_index(self, variables, target_variables):
+        """Return a :class:`~dwave.embedding.chain_breaks.ChainIndex` of the
+        chains of source variables for samples of target variables.
+
+        The most recently used chain index is cached, so unembedding repeated
+        sample sets with the same variables (as in
+        :func:`unembed_sampleset`) reuses it.
+
+        Args:
+            variables (iterable):
+                Source variables, in the order of the chains.
+
+            target_variables (iterable):
+                Target variables, in the order of the columns of the samples.
+
+        Returns:
+            :class:`~dwave.embedding.chain_breaks.ChainIndex`
+
+        """
+        index = self._chain_index
+        if index is None or not index.matches(variables, target_variables):
+            self._chain_index = index = ChainIndex(self, target_variables, variables)
+        return index
+
     def embed_bqm(self, source_bqm, chain_strength=None, smear_vartype=None):
         """Embed a binary quadratic model onto a target graph.
 
@@ -245,79 +1068,396 @@ class EmbeddedStructure(dict):
         if self.max_chain_length == 1:
             return self._relabel_bqm(source_bqm)
 
-        return_vartype = source_bqm.vartype
+        vartype = source_bqm.vartype
         if smear_vartype is None:
-            smear_vartype = return_vartype
-        elif smear_vartype is dimod.SPIN:
-            source_bqm = source_bqm.spin
-        else:
-            source_bqm = source_bqm.binary
+            smear_vartype = vartype
+
+        ldata, (irow, icol, qdata), offset, labels = source_bqm.to_numpy_vectors(
+            sort_labels=False, return_labels=True)
+
+        plan = self._embedding_plan(labels, irow, icol)
+
+        self._chain_strength, strength = self._resolve_chain_strength(
+            source_bqm, chain_strength, smear_vartype, labels, qdata)
+
+        # the biases are smeared in smear_vartype but given and returned in
+        # the vartype of source_bqm, so neither it nor the target need to be
+        # converted
+        target_linear, target_quadratic, target_offset = plan.embed_vectors(
+            ldata, qdata, offset, strength, smear_vartype, vartype=vartype)
+
+        return type(source_bqm).from_numpy_vectors(
+            target_linear,
+            (plan.target_row_indices, plan.target_col_indices, target_quadratic),
+            target_offset,
+            vartype,
+            variable_order=plan.target_variables,
+            )
+
+    def embed_bqms(self, source_bqms, chain_strength=None, smear_vartype=None):
+        """Embed several binary quadratic models onto a target graph.
+
+        Binary quadratic models that share the variables, interactions and
+        vartype of the first one are embedded together, by stacking their
+        biases and applying a single :class:`EmbeddingPlan` to all of them.
+        Any others are embedded individually.
+
+        Args:
+            source_bqms (iterable[:class:`~dimod.BinaryQuadraticModel`]):
+                Binary quadratic models to embed.
+
+            chain_strength (float/mapping/callable, optional):
+                Sets the coupling strength between qubits representing variables
+                that form a :term:`chain`, as for :meth:`embed_bqm`. Callables
+                are called once for each binary quadratic model.
+
+            smear_vartype (:class:`.Vartype`, optional, default=None):
+                Determines whether the linear bias of embedded variables is
+                smeared in SPIN or BINARY space, as for :meth:`embed_bqm`.
+
+        Returns:
+            list[:obj:`.BinaryQuadraticModel`]: Target binary quadratic
+            models, in the order of `source_bqms`. After embedding,
+            :attr:`chain_strength` is the list of the chain strengths used for
+            each.
 
-        target_bqm = source_bqm.empty(smear_vartype)
-        target_bqm.offset = source_bqm.offset
+        Examples:
+            This example embeds a parameter sweep over the coupling of a
+            triangular binary quadratic model into a square target graph.
+
+            >>> import networkx as nx
+            ...
+            >>> embedding = dwave.embedding.EmbeddedStructure(
+            ...     nx.cycle_graph(4).edges, {'a': {0}, 'b': {1}, 'c': {2, 3}})
+            >>> bqms = [dimod.BinaryQuadraticModel.from_ising(
+            ...             {}, {('a', 'b'): j, ('b', 'c'): 1, ('a', 'c'): 1})
+            ...         for j in (-1, 0, 1)]
+            >>> target_bqms = embedding.embed_bqms(bqms, chain_strength=2)
+            >>> print(*(target_bqm.quadratic[(0, 1)] for target_bqm in target_bqms))
+            -1.0 0.0 1.0
 
-        linear = source_bqm.linear
-        quadratic = source_bqm.quadratic
+        """
+        source_bqms = list(source_bqms)
 
-        # extract chain strength to iterator; if function, first get value (float or mapping)
+        # short-circuit the expensive embedding in case of a simple 1-1 mapping
+        if self.max_chain_length == 1:
+            return [self._relabel_bqm(bqm) for bqm in source_bqms]
+
+        if not source_bqms:
+            return []
+
+        first = source_bqms[0]
+        vartype = first.vartype
+        batch_smear_vartype = vartype if smear_vartype is None else smear_vartype
+
+        plan = self.embedding_plan(first)
+
+        target_bqms = [None] * len(source_bqms)
+        chain_strengths = [None] * len(source_bqms)
+
+        batch = []
+        for i, bqm in enumerate(source_bqms):
+            if bqm.vartype is vartype and type(bqm) is type(first):
+                ldata, (irow, icol, qdata), offset, labels = bqm.to_numpy_vectors(
+                    sort_labels=False, return_labels=True)
+                if plan._matches(labels, irow, icol):
+                    batch.append((i, ldata, qdata, offset))
+                    continue
+
+            target_bqms[i] = self.embed_bqm(bqm, chain_strength=chain_strength,
+                                            smear_vartype=smear_vartype)
+            chain_strengths[i] = self._chain_strength
+
+        if batch:
+            linear = np.empty((len(batch), len(plan.variables)), dtype=float)
+            quadratic = np.empty((len(batch), len(plan.row_indices)), dtype=float)
+            offset = np.empty(len(batch), dtype=float)
+            strength = np.empty((len(batch), len(plan.variables)), dtype=float)
+
+            for row, (i, ldata, qdata, off) in enumerate(batch):
+                linear[row], quadratic[row], offset[row] = ldata, qdata, off
+                chain_strengths[i], strength[row] = self._resolve_chain_strength(
+                    source_bqms[i], chain_strength, batch_smear_vartype,
+                    plan.variables, qdata)
+
+            target_linear, target_quadratic, target_offset = plan.embed_vectors(
+                linear, quadratic, offset, strength, batch_smear_vartype,
+                vartype=vartype)
+
+            for row, (i, *_) in enumerate(batch):
+                target_bqms[i] = type(first).from_numpy_vectors(
+                    target_linear[row],
+                    (plan.target_row_indices, plan.target_col_indices, target_quadratic[row]),
+                    target_offset[row],
+                    vartype,
+                    variable_order=plan.target_variables,
+                    )
+
+        self._chain_strength = chain_strengths
+
+        return target_bqms
+
+    def _resolve_chain_strength(self, source_bqm, chain_strength, smear_vartype,
+                                variables, quadratic):
+        """Return the chain strength for source_bqm as given to the user, and
+        as a value or list of values for the variables.
+
+        Chain strength callables are called with source_bqm in smear_vartype.
+        The default is computed from the quadratic biases directly, to avoid
+        copying the BQM when changing vartype.
+        """
+        # extract chain strength; if function, first get value (float or mapping)
         if chain_strength is None:
-            chain_strength = uniform_torque_compensation(source_bqm, self)
+            if source_bqm.vartype is not smear_vartype:
+                # quadratic biases scale by 4 between BINARY and SPIN
+                quadratic = (quadratic / 4 if smear_vartype is dimod.SPIN
+                             else quadratic * 4)
+            chain_strength = _uniform_torque_compensation(quadratic, len(variables))
         elif callable(chain_strength):
+            if source_bqm.vartype is not smear_vartype:
+                source_bqm = (source_bqm.spin if smear_vartype is dimod.SPIN
+                              else source_bqm.binary)
             chain_strength = chain_strength(source_bqm, self)
 
-        self._chain_strength = chain_strength
-
         if isinstance(chain_strength, (int, float)):
-            strength_iter = itertools.repeat(chain_strength)
-        else:
-            strength_iter = (chain_strength[v] for v in linear)
+            return chain_strength, chain_strength
+        return chain_strength, [chain_strength[v] for v in variables]
 
-        offset = 0
-        # spread the linear source bias equally over the target variables in the
-        # chain and add chain edges as necessary
-        for (v, bias), strength in zip(linear.items(), strength_iter):
-            try:
-                chain = self[v]
-            except KeyError:
-                raise MissingChainError(v)
-
-            # we check that len(chain) is nonzero in __init__
-            if len(chain) == 1:
-                # in the case where the chain has length 1, there are no chain quadratic biases,
-                # but we none-the-less want the chain variables to appear in the target_bqm
-                target_bqm.add_variable(chain[0], 0.0)
-            else:
-                bias /= len(chain)
+class EmbeddingPlan:
+    """Precomputed mapping of the biases of a binary quadratic model onto the
+    target graph of an embedding.
 
-                if smear_vartype is dimod.SPIN:
-                    target_bqm.add_quadratic_from((p, q, -strength) for p, q in self.chain_edges(v))
-                    offset += strength * len(self._chain_edges[v])
-                else:  # if smear_vartype is dimod.BINARY
-                    target_bqm.add_variables_from((p, 2 * strength) for p in itertools.chain(*self.chain_edges(v)))
-                    target_bqm.add_quadratic_from((p, q, -4 * strength) for p, q in self.chain_edges(v))
+    An embedding plan is compiled from an :class:`EmbeddedStructure` for a
+    fixed set of source variables and interactions. Embedding a binary
+    quadratic model with that structure then reduces to scattering its bias
+    vectors into the target bias vectors, which is useful when the same
+    problem structure is resubmitted with different biases.
 
-            target_bqm.add_linear_from((u, bias) for u in chain)
+    Args:
+        embedding (:class:`EmbeddedStructure`):
+            The embedding to compile.
+
+        variables (sequence):
+            The source variables, in the order of the linear biases.
+
+        row_indices (array_like):
+            Indices of the first variable of each source interaction, in the
+            order of the quadratic biases.
+
+        col_indices (array_like):
+            Indices of the second variable of each source interaction, in the
+            order of the quadratic biases.
+
+    Raises:
+        :exc:`~dwave.embedding.exceptions.MissingChainError`:
+            If a source variable has no chain in the embedding.
+
+        :exc:`~dwave.embedding.exceptions.MissingEdgeError`:
+            If a source interaction is not represented by any target edge.
+
+    Examples:
+        >>> import networkx as nx
+        ...
+        >>> bqm = dimod.BinaryQuadraticModel.from_ising({}, {('a', 'b'): 1, ('b', 'c'): 1, ('a', 'c'): 1})
+        >>> embedding = dwave.embedding.EmbeddedStructure(nx.cycle_graph(4).edges,
+        ...                                               {'a': (0,), 'b': (1,), 'c': (2, 3)})
+        >>> plan = embedding.embedding_plan(bqm)
+        >>> plan.target_variables
+        [0, 1, 2, 3]
+        >>> bqm.set_quadratic('a', 'b', -1)   # only the biases change
+        >>> plan.matches(bqm)
+        True
+        >>> ldata, (irow, icol, qdata), offset = bqm.to_numpy_vectors(sort_labels=False)
+        >>> linear, quadratic, offset = plan.embed_vectors(ldata, qdata, offset, 2., dimod.SPIN)
+        >>> print(quadratic)   # the chain edge, then the interaction edges
+        [-2. -1.  1.  1.]
+
+    """
+    def __init__(self, embedding, variables, row_indices, col_indices):
+        self.variables = variables = list(variables)
+        self.row_indices = row_indices = np.array(row_indices, dtype=np.int64)
+        self.col_indices = col_indices = np.array(col_indices, dtype=np.int64)
+
+        # the chain index of each source variable
+        index = embedding._index
+        try:
+            chain_idx = np.fromiter((index[v] for v in variables),
+                                    count=len(variables), dtype=np.int64)
+        except KeyError:
+            raise MissingChainError(next(v for v in variables if v not in index))
+
+        # the interacting pair of chains for each source interaction
+        num_chains = len(index)
+        keys = chain_idx[row_indices] * num_chains + chain_idx[col_indices]
+        pos = np.searchsorted(embedding._pair_keys, keys)
+        found = pos < len(embedding._pair_keys)
+        found[found] = embedding._pair_keys[pos[found]] == keys[found]
+        if not found.all():
+            i = np.argmin(found)
+            raise MissingEdgeError(variables[row_indices[i]], variables[col_indices[i]])
+        pair_idx = embedding._pair_lookup[pos] % max(len(embedding._pairs), 1)
+
+        # the target variables are the chains of the source variables, in
+        # order
+        chain_start = embedding._chain_ptr[chain_idx]
+        self.chain_lengths = chain_len = embedding._chain_ptr[chain_idx + 1] - chain_start
+        qubit_pos = _ranges(chain_start, chain_len)
+
+        # the chain edges of each source variable, in order. Chains of length
+        # 1 have no chain edges
+        edge_start = embedding._chain_edge_ptr[chain_idx]
+        self.num_chain_edges = edge_len = embedding._chain_edge_ptr[chain_idx + 1] - edge_start
+        chain_edges = embedding._chain_edge_idx[_ranges(edge_start, edge_len)]
+
+        # within each chain, target variables are ordered as they first
+        # appear in the chain edges, so that the target BQM has the same
+        # variable order as it would if built up edge by edge
+        first_seen = np.full(len(embedding._qubits), len(chain_edges) * 2, dtype=np.int64)
+        endpoints = chain_edges.ravel()
+        np.minimum.at(first_seen, endpoints, np.arange(len(endpoints)))
+        qubit_pos = qubit_pos[np.lexsort((first_seen[qubit_pos],
+                                          np.repeat(np.arange(len(variables)), chain_len)))]
+
+        target_index = np.empty(len(embedding._qubits), dtype=np.int64)
+        target_index[qubit_pos] = np.arange(len(qubit_pos))
+        self.chain_edges = target_index[chain_edges]
+
+        # the interaction edges of each source interaction, in order
+        inter_start = embedding._pair_ptr[pair_idx]
+        self.num_interaction_edges = inter_len = embedding._pair_ptr[pair_idx + 1] - inter_start
+        self.interaction_edges = target_index[
+            embedding._pair_edge_idx[_ranges(inter_start, inter_len)]]
+
+        self.target_variables = embedding._qubits[qubit_pos].tolist()
+
+        # the target quadratic indices are fixed: chain edges, then
+        # interaction edges
+        self.target_row_indices = np.concatenate((self.chain_edges[:, 0],
+                                                  self.interaction_edges[:, 0]))
+        self.target_col_indices = np.concatenate((self.chain_edges[:, 1],
+                                                  self.interaction_edges[:, 1]))
+
+    def matches(self, bqm):
+        """Return True if the plan applies to the given binary quadratic model.
+
+        Args:
+            bqm (:class:`~dimod.BinaryQuadraticModel`):
+                A binary quadratic model.
+
+        Returns:
+            bool: True if the variables and interactions of `bqm`, in order,
+            are those the plan was compiled for.
 
-        target_bqm.offset += offset
+        """
+        _, (irow, icol, _), _, labels = bqm.to_numpy_vectors(
+            sort_labels=False, return_labels=True)
+        return self._matches(labels, irow, icol)
+
+    def _matches(self, variables, row_indices, col_indices):
+        return (np.array_equal(row_indices, self.row_indices)
+                and np.array_equal(col_indices, self.col_indices)
+                and self.variables == list(variables))
+
+    def embed_vectors(self, linear, quadratic, offset, chain_strength, smear_vartype,
+                      vartype=None):
+        """Embed the bias vectors of a binary quadratic model.
+
+        Several problems with the same structure can be embedded at once by
+        stacking their biases, in which case all arguments are broadcast
+        against a shared leading dimension.
 
-        for (u, v), bias in quadratic.items():
-            # get the number of interactions for (u, v); quicker than
-            # converting the generator self.interaction_edges to a list
-            num_interactions = len(self._interaction_edges[u, v])
+        Args:
+            linear (array_like):
+                Linear biases, in the order of :attr:`variables`, as an array
+                of shape (num_variables,) or (num_problems, num_variables).
+
+            quadratic (array_like):
+                Quadratic biases, in the order of :attr:`row_indices` and
+                :attr:`col_indices`, as an array of shape (num_interactions,)
+                or (num_problems, num_interactions).
 
-            if num_interactions == 0:
-                raise MissingEdgeError(u, v)
+            offset (float/array_like):
+                Offset, or one offset per problem.
 
-            b = bias / num_interactions
+            chain_strength (float/array_like):
+                Chain strength, either a single value, one value per source
+                variable, or an array of shape (num_problems, num_variables).
 
-            interaction_edges = self.interaction_edges(u, v)
-            target_bqm.add_quadratic_from((p, q, b) for p, q in interaction_edges)
+            smear_vartype (:class:`.Vartype`):
+                The vartype in which the linear biases are smeared over the
+                chains.
 
-        if return_vartype is smear_vartype:
-            return target_bqm
+            vartype (:class:`.Vartype`, optional):
+                The vartype of the given and returned biases. Defaults to
+                `smear_vartype`. If different, the biases are converted to
+                `smear_vartype` for smearing and back again afterwards.
+
+        Returns:
+            tuple: A 3-tuple of the target linear biases, in the order of
+            :attr:`target_variables`, the target quadratic biases, in the order
+            of :attr:`target_row_indices` and :attr:`target_col_indices`, and
+            the target offset. For stacked input, each has a leading
+            dimension of size num_problems.
 
-        # we made the target BQM so we can safely mutate it in-place
-        return target_bqm.change_vartype(return_vartype, inplace=True)
+        """
+        linear = np.asarray(linear, dtype=float)
+        quadratic = np.asarray(quadratic, dtype=float)
+        offset = np.asarray(offset, dtype=float)
+        chain_strength = np.asarray(chain_strength, dtype=float)
+
+        shape = np.broadcast_shapes(linear.shape[:-1], quadratic.shape[:-1],
+                                    offset.shape, chain_strength.shape[:-1])
+
+        # work on 2D (num_problems, n) arrays
+        num_problems = int(np.prod(shape, dtype=np.int64))
+        linear = np.broadcast_to(linear, shape + linear.shape[-1:]).reshape(
+            num_problems, len(self.variables))
+        quadratic = np.broadcast_to(quadratic, shape + quadratic.shape[-1:]).reshape(
+            num_problems, len(self.row_indices))
+        offset = np.broadcast_to(offset, shape).reshape(num_problems)
+        strength = np.broadcast_to(chain_strength, shape + (len(self.variables),)).reshape(
+            num_problems, len(self.variables))
+
+        if vartype is None:
+            vartype = smear_vartype
+        elif vartype is not smear_vartype:
+            linear, quadratic, offset = _change_vartype_vectors(
+                linear, quadratic, offset, self.row_indices, self.col_indices,
+                smear_vartype)
+
+        edge_strength = np.repeat(strength, self.num_chain_edges, axis=1)
+
+        # spread the linear source bias equally over the target variables in
+        # the chain
+        target_linear = np.zeros((num_problems, len(self.target_variables)), dtype=float)
+        if smear_vartype is dimod.SPIN:
+            chain_biases = -edge_strength
+            if len(self.variables):
+                # accumulate in variable order, as adding the offsets one at
+                # a time
+                offset = offset + np.cumsum(strength * self.num_chain_edges, axis=1)[:, -1]
+        else:  # if smear_vartype is dimod.BINARY
+            # accumulate in edge order, as adding the biases one at a time
+            np.add.at(target_linear, (slice(None), self.chain_edges.ravel()),
+                      np.repeat(2 * edge_strength, 2, axis=1))
+            chain_biases = -4 * edge_strength
+        target_linear += np.repeat(linear / self.chain_lengths, self.chain_lengths, axis=1)
+
+        # spread the quadratic source biases equally over the interaction
+        # edges
+        inter_biases = np.repeat(quadratic / self.num_interaction_edges,
+                                 self.num_interaction_edges, axis=1)
+
+        target_quadratic = np.concatenate((chain_biases, inter_biases), axis=1)
+
+        if vartype is not smear_vartype:
+            target_linear, target_quadratic, offset = _change_vartype_vectors(
+                target_linear, target_quadratic, offset,
+                self.target_row_indices, self.target_col_indices, vartype)
+
+        return (target_linear.reshape(shape + target_linear.shape[1:]),
+                target_quadratic.reshape(shape + target_quadratic.shape[1:]),
+                offset.reshape(shape)[()])
 
 
 def embed_bqm(source_bqm, embedding=None, target_adjacency=None,
@@ -558,9 +1698,164 @@ def _relabel_sampleset(target_sampleset: dimod.SampleSet,
     return source_sampleset
 
 
+class LazySampleSet(dimod.SampleSet):
+    """Sample set whose samples are unembedded as they are accessed.
+
+    Returned by :func:`unembed_sampleset` with ``lazy=True``. The variables,
+    vartype and info are known without unembedding any samples, and the
+    views in record order unembed only the target samples they need:
+
+    * :meth:`~dimod.SampleSet.slice` and :meth:`~dimod.SampleSet.truncate`
+      with ``sorted_by=None``, for nonnegative bounds,
+    * :meth:`~dimod.SampleSet.samples` with `n` given and ``sorted_by=None``,
+    * :meth:`~dimod.SampleSet.data` with ``sorted_by=None``, unembedding
+      samples as it is iterated.
+
+    The samples are unembedded in the order of the target samples. Every
+    other access, such as :attr:`~dimod.SampleSet.record`,
+    :attr:`~dimod.SampleSet.first`, :func:`len`, or any view sorted by
+    energy, unembeds all of the remaining target samples, after which the
+    sample set is the same as that returned by :func:`unembed_sampleset`
+    without `lazy`.
+
+    Examples:
+        >>> J = {('a', 'b'): -1, ('b', 'c'): -1, ('a', 'c'): -1}
+        >>> bqm = dimod.BinaryQuadraticModel.from_ising({}, J)
+        >>> embedding = {'a': [0, 1], 'b': [2], 'c': [3]}
+        >>> samples = [{0: -1, 1: -1, 2: -1, 3: -1}, {0: +1, 1: +1, 2: +1, 3: +1}]
+        >>> embedded = dimod.SampleSet.from_samples(samples, dimod.SPIN, energy=[-3, -3])
+        >>> sampleset = dwave.embedding.unembed_sampleset(embedded, embedding, bqm, lazy=True)
+        >>> print(sampleset.truncate(1, sorted_by=None))  # unembeds one sample
+           a  b  c energy num_oc.
+        0 -1 -1 -1   -3.0       1
+        ['SPIN', 1 rows, 1 samples, 3 variables]
+
+    """
+    # unset once all of the target samples are unembedded
+    _unembed_rows = None
+
+    @classmethod
+    def _from_rows(cls, unembed_rows, num_rows):
+        """Construct a lazy sample set from a function that returns the
+        sample set unembedded from the target samples ``start:stop``, of
+        which there are `num_rows`."""
+        empty = unembed_rows(0, 0)
+
+        obj = cls.__new__(cls)
+        obj._variables = empty.variables
+        obj._vartype = empty.vartype
+        obj._info = empty.info
+        obj._unembed_rows = unembed_rows
+        obj._num_target_rows = num_rows
+        obj._num_unembedded = 0  # target samples
+        obj._records = [empty.record]
+        return obj
+
+    def _wait(self):
+        """Resolve the future of a sample set constructed with
+        :meth:`~dimod.SampleSet.from_future`, whose result may be lazy."""
+        if hasattr(self, '_future'):
+            sampleset = self._result_hook(self._future)
+            del self._future, self._result_hook
+            if isinstance(sampleset, LazySampleSet):
+                sampleset._wait()
+                self.__dict__.update(sampleset.__dict__)
+            else:
+                self.__init__(sampleset.record, sampleset.variables,
+                              sampleset.info, sampleset.vartype)
+
+    def _unembed(self, num_rows):
+        """Unembed target samples until there are at least `num_rows`
+        unembedded samples, or none are left."""
+        def unembedded():
+            return sum(map(len, self._records))
+
+        while unembedded() < num_rows and self._num_unembedded < self._num_target_rows:
+            # at least as many as already unembedded, so that iterating over
+            # the samples unembeds them in a logarithmic number of blocks
+            start = self._num_unembedded
+            stop = min(start + max(num_rows - unembedded(), start, 1),
+                       self._num_target_rows)
+            self._records.append(self._unembed_rows(start, stop).record)
+            self._num_unembedded = stop
+
+    def _lazy_record(self):
+        return np.concatenate(self._records).view(np.recarray)
+
+    def resolve(self):
+        """Unembed all of the remaining target samples."""
+        self._wait()
+        if self._unembed_rows is not None:
+            self._unembed(self._num_target_rows + 1)
+            record = self._lazy_record()
+            del self._unembed_rows, self._num_target_rows, self._num_unembedded, self._records
+            self.__init__(record, self._variables, self._info, self._vartype)
+
+    @property
+    def info(self):
+        self._wait()
+        return self._info
+
+    @property
+    def variables(self):
+        self._wait()
+        return self._variables
+
+    @property
+    def vartype(self):
+        self._wait()
+        return self._vartype
+
+    def samples(self, n=None, sorted_by='energy'):
+        self._wait()
+        if n is not None and sorted_by is None and self._unembed_rows is not None:
+            return self.slice(n, sorted_by=None).samples(sorted_by=None)
+        return super().samples(n, sorted_by=sorted_by)
+
+    def data(self, fields=None, sorted_by='energy', name='Sample', reverse=False,
+             sample_dict_cast=True, index=False):
+        self._wait()
+        if sorted_by is not None or reverse or index or self._unembed_rows is None:
+            yield from super().data(fields, sorted_by=sorted_by, name=name, reverse=reverse,
+                                    sample_dict_cast=sample_dict_cast, index=index)
+            return
+
+        # the samples are yielded in blocks, unembedding the next block when
+        # the previous one is exhausted
+        num_yielded = 0
+        while True:
+            if self._unembed_rows is None:
+                # resolved while iterating
+                record = self.record
+            else:
+                self._unembed(num_yielded + 1)
+                record = self._lazy_record()
+            if num_yielded == len(record):
+                return
+            block = dimod.SampleSet(record[num_yielded:], self._variables,
+                                    self._info, self._vartype)
+            yield from block.data(fields, sorted_by=None, name=name,
+                                  sample_dict_cast=sample_dict_cast)
+            num_yielded = len(record)
+
+    def slice(self, *slice_args, **kwargs):
+        self._wait()
+        sorted_by = kwargs.get('sorted_by', 'energy')
+        selector = slice(*slice_args) if slice_args else slice(None)
+        if (sorted_by is None and self._unembed_rows is not None
+                and selector.stop is not None and selector.stop >= 0
+                and (selector.start or 0) >= 0 and (selector.step or 1) > 0):
+            self._unembed(selector.stop)
+            return dimod.SampleSet(self._lazy_record()[selector], self._variables,
+                                   copy.deepcopy(self._info), self._vartype)
+        return super().slice(*slice_args, **kwargs)
+
+
 def unembed_sampleset(target_sampleset, embedding, source_bqm,
                       chain_break_method=None, chain_break_fraction=False,
-                      return_embedding=False):
+                      return_embedding=False, *, chunksize=None,
+                      target_bqm=None, aggregate=False, num_threads=None,
+                      truncate=None, lazy=False):
     """Unembed a sample set.
 
     Given samples from a target binary quadratic model (BQM), construct a sample
@@ -595,6 +1890,63 @@ def unembed_sampleset(target_sampleset, embedding, source_bqm,
             of the returned sample set. Note that if an `embedding` key
             already exists in the sample set then it is overwritten.
 
+        chunksize (int, optional):
+            If given, the target samples are unembedded this many at a time
+            into a preallocated record, so that the intermediate arrays are
+            bounded by `chunksize` rather than by the size of
+            `target_sampleset`. Chain break methods must then resolve each
+            sample independently of the others, as all of those in
+            :mod:`dwave.embedding.chain_breaks` do.
+
+        target_bqm (:obj:`~dimod.BinaryQuadraticModel`, optional):
+            The target BQM that `target_sampleset` was sampled from, as
+            returned by :func:`embed_bqm` for `source_bqm` and `embedding`.
+            If given, the energies of samples without broken chains are derived
+            from their energies in `target_sampleset`, which differ by a
+            constant from the chains, and only samples with broken chains are
+            evaluated on `source_bqm`.
+
+        aggregate (bool, optional, default=False):
+            If True, identical unembedded samples are merged, in the order of
+            their first occurrence, summing their `num_occurrences`. The
+            `chain_break_fraction` of merged samples is averaged over their
+            occurrences, other fields are taken from the first occurrence, as
+            in :meth:`dimod.SampleSet.aggregate`. With multiple chain break
+            methods, only samples from the same method are merged.
+
+        num_threads (int, optional):
+            If greater than 1, the target samples are split into chunks, of
+            `chunksize` samples if given, that are unembedded concurrently by
+            this many threads into a preallocated record. The array operations
+            of the chain break methods in :mod:`dwave.embedding.chain_breaks`
+            release the GIL.
+
+        truncate (int, optional):
+            If given, at most `truncate` samples are returned, sorted by
+            energy as by :meth:`dimod.SampleSet.truncate`. The target samples
+            are ranked by their energy, then by their number of broken chains,
+            and only the best ``2*truncate`` of them are unembedded, so the
+            unembedding scales with `truncate` rather than with the size of
+            `target_sampleset`. With
+            :func:`~dwave.embedding.chain_breaks.discard`, only samples
+            without broken chains are candidates.
+
+            This is a heuristic: the returned samples are the lowest-energy
+            samples among the candidates, which are not necessarily the
+            lowest-energy samples of the whole unembedded sample set. Target
+            samples with broken chains can unembed to source samples of lower
+            energy than their target energy suggests, for example with a weak
+            chain strength. Cannot be combined with `aggregate`, as the
+            occurrences of the samples that are not unembedded would not be
+            counted.
+
+        lazy (bool, optional, default=False):
+            If True, a :class:`LazySampleSet` is returned, whose samples are
+            unembedded, in the order of the target samples, as they are
+            accessed. Requires a single chain break method, and cannot be
+            combined with `aggregate` or `truncate`, which need all of the
+            samples.
+
     Returns:
         :obj:`~dimod.SampleSet`: Sample set in the source BQM.
 
@@ -619,8 +1971,38 @@ def unembed_sampleset(target_sampleset, embedding, source_bqm,
 
     """
 
+    if lazy and (aggregate or truncate is not None):
+        raise ValueError("lazy cannot be combined with aggregate or truncate")
+
+    if truncate is not None:
+        if aggregate:
+            raise ValueError("truncate cannot be combined with aggregate")
+        candidates = _candidate_sampleset(target_sampleset, embedding, source_bqm,
+                                          chain_break_method, 2 * truncate)
+        return unembed_sampleset(candidates, embedding, source_bqm,
+                                 chain_break_method=chain_break_method,
+                                 chain_break_fraction=chain_break_fraction,
+                                 return_embedding=return_embedding,
+                                 chunksize=chunksize,
+                                 target_bqm=target_bqm,
+                                 num_threads=num_threads).truncate(truncate)
+
+    if aggregate:
+        return _aggregate_sampleset(
+            unembed_sampleset(target_sampleset, embedding, source_bqm,
+                              chain_break_method=chain_break_method,
+                              chain_break_fraction=chain_break_fraction,
+                              return_embedding=return_embedding,
+                              chunksize=chunksize,
+                              target_bqm=target_bqm,
+                              num_threads=num_threads))
+
     # short-circuit the expensive unembedding in case of a simple 1-1 mapping
-    if hasattr(embedding, 'max_chain_length') and embedding.max_chain_length == 1:
+    # that covers every variable of the sample set. Lazy sample sets take the
+    # general path, that can unembed some of the samples
+    if (not lazy and hasattr(embedding, 'max_chain_length')
+            and embedding.max_chain_length == 1
+            and len(target_sampleset.variables) == len(embedding) == source_bqm.num_variables):
         return _relabel_sampleset(target_sampleset=target_sampleset,
                                   embedding=embedding,
                                   source_bqm=source_bqm,
@@ -630,59 +2012,356 @@ def unembed_sampleset(target_sampleset, embedding, source_bqm,
 
     if chain_break_method is None:
         chain_break_method = majority_vote
-    elif isinstance(chain_break_method, abc.Sequence):
-        # we want to apply multiple CBM and then combine
-        samplesets = [unembed_sampleset(target_sampleset, embedding,
-                                        source_bqm, chain_break_method=cbm,
-                                        chain_break_fraction=chain_break_fraction)
-                      for cbm in chain_break_method]
-        sampleset = dimod.sampleset.concatenate(samplesets)
-
-        # Add a new data field tracking which came from
-        # todo: add this functionality to dimod
-        cbm_idxs = np.empty(len(sampleset), dtype=int)
-
-        start = 0
-        for i, ss in enumerate(samplesets):
-            cbm_idxs[start:start+len(ss)] = i
-            start += len(ss)
-
-        new = np.lib.recfunctions.append_fields(sampleset.record,
-                                                'chain_break_method', cbm_idxs,
-                                                asrecarray=True, usemask=False)
-
-        return type(sampleset)(new, sampleset.variables, sampleset.info,
-                               sampleset.vartype)
+
+    # multiple chain break methods are applied to the samples in turn and the
+    # results combined, with a new field tracking which method each came from
+    multiple = isinstance(chain_break_method, abc.Sequence)
+    if lazy and multiple:
+        raise ValueError("lazy requires a single chain break method")
 
     variables = list(source_bqm.variables)  # need this ordered
-    try:
-        chains = [embedding[v] for v in variables]
-    except KeyError:
-        raise ValueError("given bqm does not match the embedding")
+    chains = _source_chains(embedding, variables, target_sampleset.variables)
 
     record = target_sampleset.record
 
-    unembedded, idxs = chain_break_method(target_sampleset, chains)
+    info = target_sampleset.info.copy()
+
+    if target_bqm is not None:
+        energy_offset = _unbroken_energy_offset(target_bqm, source_bqm, chains)
+    else:
+        energy_offset = None
+
+    if multiple:
+        return _unembed_sampleset_record(target_sampleset, chains, variables,
+                                         source_bqm, chain_break_method,
+                                         chain_break_fraction, chunksize,
+                                         info, method_field=True,
+                                         energy_offset=energy_offset,
+                                         num_threads=num_threads)
+
+    if return_embedding:
+        embedding_context = dict(embedding=embedding,
+                                 chain_break_method=_method_name(chain_break_method))
+        info.update(embedding_context=embedding_context)
+
+    if lazy:
+        def unembed_rows(start, stop):
+            return _unembed_sampleset_record(target_sampleset, chains, variables,
+                                             source_bqm, [chain_break_method],
+                                             chain_break_fraction, chunksize, info,
+                                             energy_offset=energy_offset,
+                                             num_threads=num_threads,
+                                             start=start, stop=stop)
+        return LazySampleSet._from_rows(unembed_rows, len(record))
+
+    if chunksize is not None or (num_threads is not None and num_threads > 1):
+        return _unembed_sampleset_record(target_sampleset, chains, variables,
+                                         source_bqm, [chain_break_method],
+                                         chain_break_fraction, chunksize,
+                                         info, energy_offset=energy_offset,
+                                         num_threads=num_threads)
+
+    # find the broken chains while unembedding, sharing the chain columns
+    labels = target_sampleset.variables
+    columns, ptr = _chain_columns(labels, chains)
+    unembedded, idxs, broken, energy = _resolve_chain_breaks(
+        target_sampleset, chains, chain_break_method, record.sample, labels,
+        columns, ptr, source_bqm=source_bqm)
+
+    if broken is None and (chain_break_fraction
+                           or (energy is None and energy_offset is not None)):
+        broken = _broken_chains(record.sample, columns, ptr)
 
     reserved = {'sample', 'energy'}
     vectors = {name: record[name][idxs]
                for name in record.dtype.names if name not in reserved}
 
     if chain_break_fraction:
-        broken = broken_chains(target_sampleset, chains)
-        if broken.size:
-            vectors['chain_break_fraction'] = broken.mean(axis=1)[idxs]
-        else:
-            vectors['chain_break_fraction'] = 0
+        vectors['chain_break_fraction'] = broken[idxs].mean(axis=1) if chains else 0
 
-    info = target_sampleset.info.copy()
+    if energy is None and energy_offset is not None:
+        energy = _source_energies(unembedded, variables, source_bqm,
+                                  record.energy[idxs], ~broken[idxs].any(axis=1),
+                                  energy_offset)
 
-    if return_embedding:
-        embedding_context = dict(embedding=embedding,
-                                 chain_break_method=chain_break_method.__name__)
-        info.update(embedding_context=embedding_context)
+    if energy is not None:
+        return dimod.SampleSet.from_samples((unembedded, variables),
+                                            source_bqm.vartype,
+                                            energy,
+                                            info=info,
+                                            **vectors)
 
     return dimod.SampleSet.from_samples_bqm((unembedded, variables),
                                             source_bqm,
                                             info=info,
                                             **vectors)
+
+
+def _source_chains(embedding, variables, target_variables):
+    """Return the chains of the source variables, in order."""
+    try:
+        if hasattr(embedding, 'chain_index'):
+            # the chains are compiled for the target variables once, and
+            # cached by the embedding across sample sets
+            return embedding.chain_index(variables, target_variables)
+        return [embedding[v] for v in variables]
+    except KeyError:
+        raise ValueError("given bqm does not match the embedding")
+
+
+def _candidate_sampleset(target_sampleset, embedding, source_bqm,
+                         chain_break_method, num_candidates):
+    """Return the `num_candidates` target samples with the lowest energy,
+    breaking ties by the number of broken chains, in their original order.
+
+    Finding the broken chains of all of the target samples is a few array
+    operations, much cheaper than unembedding them and computing their
+    energies.
+    """
+    if num_candidates < 0:
+        raise ValueError("truncate must be a non-negative integer")
+
+    record = target_sampleset.record
+    if num_candidates >= len(record) and chain_break_method is not discard:
+        return target_sampleset
+
+    chains = _source_chains(embedding, list(source_bqm.variables),
+                            target_sampleset.variables)
+
+    columns, ptr = _chain_columns(target_sampleset.variables, chains)
+    num_broken = np.count_nonzero(_broken_chains(record.sample, columns, ptr), axis=1)
+
+    rows = np.lexsort((num_broken, record.energy))
+    if chain_break_method is discard:
+        # the other samples would be discarded anyway
+        rows = rows[num_broken[rows] == 0]
+    rows = np.sort(rows[:num_candidates])
+
+    return type(target_sampleset)(record[rows], target_sampleset.variables,
+                                  target_sampleset.info, target_sampleset.vartype)
+
+
+def _aggregate_sampleset(sampleset):
+    """Merge the identical samples of a sample set.
+
+    Rows are compared by their samples packed into bits, so the comparison
+    sorts a single fixed-width byte string per row rather than the rows of
+    the sample array.
+    """
+    record = sampleset.record
+    num_rows, num_variables = record.sample.shape
+
+    if num_variables:
+        packed = np.packbits(record.sample > 0, axis=1)
+        keys = packed.view(np.dtype((np.void, packed.shape[1]))).ravel()
+        _, indices, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    else:
+        indices = np.zeros(min(num_rows, 1), dtype=np.int64)
+        inverse = np.zeros(num_rows, dtype=np.int64)
+    inverse = inverse.ravel()
+
+    if 'chain_break_method' in record.dtype.names:
+        # keep the samples of different methods apart
+        methods = record.chain_break_method
+        _, indices, inverse = np.unique(inverse * (methods.max(initial=0) + 1) + methods,
+                                        return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+
+    # unique sorts the samples, which we undo to keep the first occurrences in order
+    order = np.argsort(indices)
+    indices = indices[order]
+    revorder = np.empty(len(order), dtype=order.dtype)
+    revorder[order] = np.arange(len(order))
+    inverse = revorder[inverse]
+
+    aggregated = record[indices]
+
+    num_occurrences = record.num_occurrences
+    aggregated.num_occurrences = np.bincount(inverse, weights=num_occurrences,
+                                             minlength=len(indices))
+
+    if 'chain_break_fraction' in record.dtype.names:
+        fraction = record.chain_break_fraction * num_occurrences
+        aggregated.chain_break_fraction = (
+            np.bincount(inverse, weights=fraction, minlength=len(indices))
+            / aggregated.num_occurrences)
+
+    return type(sampleset)(aggregated, sampleset.variables, sampleset.info,
+                           sampleset.vartype)
+
+
+def _unbroken_energy_offset(target_bqm, source_bqm, chains):
+    """Return the difference between the target energy and the source energy
+    of samples without broken chains.
+
+    Every linear and quadratic bias of the source BQM is split over the
+    chains, so for unbroken chains the target energy differs from the source
+    energy by the energy of the chain couplers and any offsets, regardless
+    of the sample. We find it from the sample with every variable set to 1.
+    """
+    num_chain_variables = sum(map(len, chains))
+    if (target_bqm.num_variables != num_chain_variables
+            or not all(u in target_bqm.variables for chain in chains for u in chain)):
+        raise ValueError("target_bqm does not match the embedding")
+
+    target_energy = target_bqm.energy({u: 1 for u in target_bqm.variables})
+    source_energy = source_bqm.energy({v: 1 for v in source_bqm.variables})
+    return target_energy - source_energy
+
+
+def _source_energies(unembedded, variables, source_bqm, target_energies,
+                     unbroken, energy_offset):
+    """Return the source energies of the unembedded samples, derived from
+    the target energies for the `unbroken` ones."""
+    energies = np.empty(len(unembedded), dtype=source_bqm.dtype)
+    energies[unbroken] = target_energies[unbroken] - energy_offset
+
+    broken = ~unbroken
+    if broken.any():
+        energies[broken] = source_bqm.energies((unembedded[broken], variables))
+    return energies
+
+
+def _unembed_sampleset_record(target_sampleset, chains, variables, source_bqm,
+                              chain_break_methods, chain_break_fraction,
+                              chunksize, info, method_field=False,
+                              energy_offset=None, num_threads=None,
+                              start=0, stop=None):
+    """Unembed the target samples with each of the chain break methods in
+    turn, directly into one preallocated record.
+
+    The chains are indexed once, and the broken chains found at most once per
+    chunk of `chunksize` target samples, for all of the methods. The record
+    has the same fields as that built by :func:`unembed_sampleset`, with a
+    `chain_break_method` field if `method_field` is True. If `energy_offset`
+    is given, the energies of unbroken samples are derived from the target
+    energies. Chunks are unembedded concurrently by `num_threads` threads.
+    Only the target samples ``start:stop`` are unembedded, as they would be
+    if all of them were.
+    """
+    record = target_sampleset.record[start:stop]
+    labels = target_sampleset.variables
+    num_rows = len(record)
+
+    if chunksize is None:
+        # one chunk per thread
+        chunksize = max(-(-num_rows // (num_threads or 1)), 1)
+    elif chunksize < 1:
+        raise ValueError("chunksize must be a positive integer")
+    chunksize = int(chunksize)
+
+    reserved = {'sample', 'energy'}
+    names = [name for name in record.dtype.names if name not in reserved]
+
+    columns, ptr = _chain_columns(labels, chains)
+
+    # seeds are resolved once for all of the chunks, that each draw from
+    # their own streams
+    chain_break_methods = [_seeded(method) or method for method in chain_break_methods]
+
+    # the columns in the same order as dimod.SampleSet.from_samples_bqm
+    reindex, sample_variables = _sorted_variables(variables)
+
+    def unembed(chunk, method, broken, row):
+        """Return the unembedded samples, their indices in the chunk, the
+        broken chains of the chunk if found, and the source energies."""
+        samples = (chunk.sample, labels)
+        unembedded, idxs, broken, energy = _resolve_chain_breaks(
+            samples, chains, method, chunk.sample, labels, columns, ptr,
+            broken, source_bqm, row)
+
+        if broken is None and (chain_break_fraction
+                               or (energy is None and energy_offset is not None)):
+            broken = _broken_chains(chunk.sample, columns, ptr)
+
+        if energy is None and energy_offset is not None:
+            energy = _source_energies(
+                unembedded, variables, source_bqm, chunk.energy[idxs],
+                ~broken[idxs].any(axis=1), energy_offset)
+        elif energy is None:
+            energy = source_bqm.energies((unembedded, variables))
+
+        return unembedded, idxs, broken, np.asarray(energy)
+
+    # the samples and energies have the dtypes that the unchunked
+    # unembedding would give them, found by unembedding no samples
+    empty = [unembed(record[:0], method, None, 0) for method in chain_break_methods]
+    datatypes = [('sample', np.result_type(*(u.dtype for u, _, _, _ in empty)),
+                  (len(variables),)),
+                 ('energy', np.result_type(*(e.dtype for _, _, _, e in empty)))]
+    datatypes.extend((name, record.dtype[name]) for name in names)
+    if chain_break_fraction and 'chain_break_fraction' not in names:
+        datatypes.append(('chain_break_fraction', np.float64))
+    if method_field:
+        datatypes.append(('chain_break_method', int))
+
+    # chain break methods can only discard samples, so each method has a
+    # region of the record as large as the target samples, and each chunk a
+    # region within it as large as the chunk
+    unembedded_record = np.empty(num_rows * len(chain_break_methods), dtype=datatypes)
+
+    def unembed_chunk(row):
+        chunk = record[row:row+chunksize]
+
+        counts = []
+        broken = None  # shared by the methods
+        for midx, method in enumerate(chain_break_methods):
+            unembedded, idxs, broken, energy = unembed(chunk, method, broken, start + row)
+
+            region = midx * num_rows + row
+            out = unembedded_record[region:region+len(idxs)]
+            out['sample'] = unembedded if reindex is None else unembedded[:, reindex]
+            out['energy'] = energy
+            for name in names:
+                out[name] = chunk[name][idxs]
+            if chain_break_fraction:
+                out['chain_break_fraction'] = broken[idxs].mean(axis=1) if chains else 0
+            if method_field:
+                out['chain_break_method'] = midx
+
+            counts.append(len(idxs))
+        return counts
+
+    rows = range(0, num_rows, chunksize)
+    if num_threads is not None and num_threads > 1 and len(rows) > 1:
+        # the kernels release the GIL, and each chunk writes its own region
+        with concurrent.futures.ThreadPoolExecutor(num_threads) as executor:
+            counts = list(executor.map(unembed_chunk, rows))
+    else:
+        counts = list(map(unembed_chunk, rows))
+
+    # close the gaps left by discarded samples
+    num_unembedded = 0
+    for midx in range(len(chain_break_methods)):
+        for row, chunk_counts in zip(rows, counts):
+            region = midx * num_rows + row
+            count = chunk_counts[midx]
+            if region != num_unembedded:
+                unembedded_record[num_unembedded:num_unembedded+count] = \
+                    unembedded_record[region:region+count]
+            num_unembedded += count
+
+    return dimod.SampleSet(np.rec.array(unembedded_record[:num_unembedded]),
+                           sample_variables, info, source_bqm.vartype)
+
+
+def _method_name(chain_break_method):
+    """Return the name of a chain break method: of the function for functions
+    and partial functions, otherwise of the class of the callable."""
+    while isinstance(chain_break_method, partial):
+        chain_break_method = chain_break_method.func
+    return getattr(chain_break_method, '__name__', type(chain_break_method).__name__)
+
+
+def _sorted_variables(variables):
+    """Return the permutation that sorts the variables, or None if they are
+    already sorted or not sortable, and the variables in that order, as
+    :meth:`dimod.SampleSet.from_samples` does."""
+    try:
+        reindex, sorted_variables = zip(*sorted(enumerate(variables), key=lambda tup: tup[1]))
+    except (TypeError, ValueError):
+        # unlike types are not sortable, and there may be no variables
+        return None, variables
+    if list(sorted_variables) == list(variables):
+        return None, variables
+    return np.asarray(reindex), list(sorted_variables)
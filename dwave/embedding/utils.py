@@ -14,13 +14,15 @@
 
 import dimod
 import numpy as np
+import scipy.stats
 
-from dwave.embedding.chain_breaks import broken_chains
+from dwave.embedding.chain_breaks import broken_chains, ChainIndex, PackedSamples
 
 
 __all__ = ['target_to_source',
            'chain_to_quadratic',
            'chain_break_frequency',
+           'ChainBreakStats',
            'adjacency_to_edges']
 
 
@@ -154,18 +156,19 @@ def chain_break_frequency(samples_like, embedding):
     """Determine the frequency of chain breaks in the given samples.
 
     Args:
-        samples_like (samples_like/:obj:`dimod.SampleSet`):
+        samples_like (samples_like/:obj:`dimod.SampleSet`/:class:`.PackedSamples`):
             A collection of raw samples. 'samples_like' is an extension of NumPy's array_like.
-            See :func:`dimod.as_samples`.
+            See :func:`dimod.as_samples`. Samples can also be bit-packed.
 
-        embedding (dict):
+        embedding (dict/:class:`.ChainIndex`):
             Mapping from source graph to target graph as a dict of form {s: {t, ...}, ...},
             where s is a source-model variable and t is a target-model variable.
+            Alternatively, the chains of an embedding compiled for the samples.
 
     Returns:
         dict: Frequency of chain breaks as a dict in the form {s: f, ...},  where s
         is a variable in the source graph and float f the fraction
-        of broken chains.
+        of broken chains. The fractions are 0 if there are no samples.
 
     Examples:
         This example embeds a single source node, 'a', as a chain of two target nodes (0, 1)
@@ -181,27 +184,166 @@ def chain_break_frequency(samples_like, embedding):
 
 
     """
-    if isinstance(samples_like, dimod.SampleSet):
-        labels = samples_like.variables
-        samples = samples_like.record.sample
-        num_occurrences = samples_like.record.num_occurrences
-    else:
-        samples, labels = dimod.as_samples(samples_like)
-        num_occurrences = np.ones(samples.shape[0])
-
-    if not all(v == idx for idx, v in enumerate(labels)):
-        labels_to_idx = {v: idx for idx, v in enumerate(labels)}
-        embedding = {v: {labels_to_idx[u] for u in chain} for v, chain in embedding.items()}
-
     if not embedding:
         return {}
 
-    variables, chains = zip(*embedding.items())
+    stats = ChainBreakStats(embedding)
+    stats.update(samples_like)
+    return stats.rates()
+
+
+class ChainBreakStats:
+    """Accumulate the frequency of chain breaks over many sample sets.
+
+    Only the number of times each chain was broken and the total number of
+    samples are kept, so the memory used does not grow with the number of
+    samples. Statistics accumulated separately, for instance in different
+    processes, can be combined with :meth:`merge`.
+
+    Args:
+        embedding (dict/:class:`.ChainIndex`):
+            Mapping from source graph to target graph as a dict of form {s: {t, ...}, ...},
+            where s is a source-model variable and t is a target-model variable.
+            Alternatively, the chains of an embedding compiled for the samples.
+
+    Attributes:
+        variables (list):
+            The source variables, in the order of `num_broken`.
+
+        num_broken (:obj:`numpy.ndarray`):
+            The number of samples, counting their occurrences, in which each
+            chain was broken.
+
+        num_samples (int):
+            The number of samples, counting their occurrences.
+
+    Examples:
+        This example accumulates the chain breaks of two batches of samples.
+
+        >>> import numpy as np
+        ...
+        >>> stats = dwave.embedding.ChainBreakStats({'a': (0, 1), 'b': (2,)})
+        >>> stats.update(np.array([[-1, +1, +1], [+1, +1, +1]]))
+        >>> stats.update(np.array([[-1, -1, +1]]))
+        >>> print(stats.rates()['a'])  # doctest: +ELLIPSIS
+        0.333...
+
+    """
+    def __init__(self, embedding):
+        if isinstance(embedding, ChainIndex):
+            self.variables = list(embedding.source_variables)
+            self._embedding = None
+            self._chain_index = embedding
+        else:
+            self.variables = list(embedding)
+            self._embedding = embedding
+            self._chain_index = None
+
+        self.num_broken = np.zeros(len(self.variables), dtype=np.int64)
+        self.num_samples = 0
+
+    def _chains(self, labels):
+        # compile the chains for the target variables once, for as long as
+        # they stay the same
+        index = self._chain_index
+        if self._embedding is not None and (index is None or not index._matches(labels)):
+            self._chain_index = index = ChainIndex(self._embedding, labels, self.variables)
+        return index
+
+    def update(self, samples_like):
+        """Add the chain breaks of samples.
+
+        Args:
+            samples_like (samples_like/:obj:`dimod.SampleSet`/:class:`.PackedSamples`):
+                A collection of raw samples. 'samples_like' is an extension of NumPy's array_like.
+                See :func:`dimod.as_samples`. Samples can also be bit-packed.
+                The samples of a :obj:`dimod.SampleSet` are weighted by their
+                number of occurrences.
+
+        """
+        if isinstance(samples_like, dimod.SampleSet):
+            samples = (samples_like.record.sample, samples_like.variables)
+            num_occurrences = samples_like.record.num_occurrences
+        elif isinstance(samples_like, PackedSamples):
+            samples = samples_like
+            num_occurrences = np.ones(len(samples_like), dtype=np.int64)
+        else:
+            samples = dimod.as_samples(samples_like)
+            num_occurrences = np.ones(samples[0].shape[0], dtype=np.int64)
+
+        labels = samples.variables if isinstance(samples, PackedSamples) else samples[1]
+
+        broken = broken_chains(samples, self._chains(labels))
+
+        # a weighted count of the broken chains, as a single product
+        self.num_broken += num_occurrences @ broken
+        self.num_samples += int(num_occurrences.sum())
+
+    def merge(self, other):
+        """Add the chain breaks accumulated by another instance.
+
+        Args:
+            other (:class:`.ChainBreakStats`):
+                Statistics of chain breaks for the same source variables.
+
+        Returns:
+            :class:`.ChainBreakStats`: This instance.
+
+        """
+        if other.variables != self.variables:
+            raise ValueError("cannot merge the statistics of different source variables")
+
+        self.num_broken += other.num_broken
+        self.num_samples += other.num_samples
+        return self
+
+    def rates(self):
+        """Return the frequency of chain breaks.
+
+        Returns:
+            dict: Frequency of chain breaks as a dict in the form {s: f, ...},
+            where s is a variable in the source graph and float f the fraction
+            of broken chains, or 0 if no samples were added.
+
+        """
+        rates = self.num_broken / max(self.num_samples, 1)
+        return dict(zip(self.variables, rates.tolist()))
 
-    broken = broken_chains(samples, chains)
+    def confidence(self, level=.95):
+        """Return confidence intervals of the frequency of chain breaks.
 
-    return {v: float(np.average(broken[:, cidx], weights=num_occurrences))
-            for cidx, v in enumerate(variables)}
+        The intervals are Wilson score intervals, which stay within [0, 1]
+        and are not degenerate for chains that were never or always broken.
+
+        Args:
+            level (float, optional, default=.95):
+                Confidence level of the intervals.
+
+        Returns:
+            dict: Confidence intervals as a dict in the form
+            {s: (low, high), ...}, where s is a variable in the source graph.
+
+        """
+        if not 0 < level < 1:
+            raise ValueError("level must be between 0 and 1")
+
+        z = scipy.stats.norm.ppf((1 + level) / 2)
+        n = self.num_samples
+        if not n:
+            return {v: (0., 1.) for v in self.variables}
+
+        p = self.num_broken / n
+        center = (p + z*z / (2*n)) / (1 + z*z / n)
+        margin = z / (1 + z*z / n) * np.sqrt(p * (1 - p) / n + z*z / (4*n*n))
+        low = np.clip(center - margin, 0, 1)
+        high = np.clip(center + margin, 0, 1)
+
+        # exactly, rather than up to rounding
+        low[self.num_broken == 0] = 0
+        high[self.num_broken == n] = 1
+
+        low, high = low.tolist(), high.tolist()
+        return {v: (lo, hi) for v, lo, hi in zip(self.variables, low, high)}
 
 
 def edgelist_to_adjacency(edgelist):
@@ -32,8 +32,7 @@ from warnings import warn
 import dimod
 import minorminer
 
-from dwave.embedding import (target_to_source, unembed_sampleset,
-                             chain_to_quadratic, EmbeddedStructure)
+from dwave.embedding import unembed_sampleset, EmbeddedStructure, LazySampleSet
 from dwave.system.warnings import WarningHandler, WarningAction
 
 __all__ = ('EmbeddingComposite',
@@ -119,6 +118,10 @@ class EmbeddingComposite(dimod.ComposedSampler):
         parameters.update(chain_strength=[],
                           chain_break_method=[],
                           chain_break_fraction=[],
+                          aggregate=[],
+                          num_threads=[],
+                          truncate=[],
+                          lazy=[],
                           embedding_parameters=[],
                           return_embedding=[],
                           warnings=[],
@@ -171,6 +174,10 @@ class EmbeddingComposite(dimod.ComposedSampler):
                embedding_parameters=None,
                return_embedding=None,
                warnings=None,
+               aggregate=False,
+               num_threads=None,
+               truncate=None,
+               lazy=False,
                **parameters):
         """Sample from the provided binary quadratic model.
 
@@ -216,6 +223,32 @@ class EmbeddingComposite(dimod.ComposedSampler):
                 by the :attr:`warnings_default` attribute, which by default is
                 :class:`~dwave.system.warnings.IGNORE`
 
+            aggregate (bool, optional, default=False):
+                If True, identical samples are merged after unembedding.
+                See :func:`~dwave.embedding.unembed_sampleset`.
+
+            num_threads (int, optional):
+                Number of threads used to unembed the returned samples.
+                See :func:`~dwave.embedding.unembed_sampleset`.
+
+            truncate (int, optional):
+                If given, only twice this many of the best target samples are
+                unembedded, and at most this many of them returned, sorted by
+                energy. This is a heuristic that can miss low-energy samples
+                with broken chains, and it cannot be combined with
+                `aggregate`. See :func:`~dwave.embedding.unembed_sampleset`.
+
+            lazy (bool, optional, default=False):
+                If True, a :class:`~dwave.embedding.LazySampleSet` is
+                returned, whose samples are unembedded as they are accessed,
+                for example only the first ten by
+                ``sampleset.truncate(10, sorted_by=None)``. The warning that
+                all samples have broken chains is then not issued, and the
+                unembedding time returned with the embedding excludes the
+                samples unembedded later. Cannot be combined with `aggregate`
+                or `truncate`.
+                See :func:`~dwave.embedding.unembed_sampleset`.
+
             **parameters:
                 Parameters for the sampling method, specified by the child
                 sampler.
@@ -239,11 +272,17 @@ class EmbeddingComposite(dimod.ComposedSampler):
         if return_embedding is None:
             return_embedding = self.return_embedding_default
 
+        # raise before sampling rather than when unembedding
+        if truncate is not None and aggregate:
+            raise ValueError("truncate cannot be combined with aggregate")
+        if lazy and (aggregate or truncate is not None):
+            raise ValueError("lazy cannot be combined with aggregate or truncate")
+
         # solve the problem on the child system
         child = self.child
 
         # apply the embedding to the given problem to map it to the child sampler
-        __, target_edgelist, target_adjacency = self.target_structure
+        __, target_edgelist, __ = self.target_structure
 
         # add self-loops to edgelist to handle singleton variables
         source_edgelist = list(bqm.quadratic) + [(v, v) for v in bqm.linear]
@@ -295,14 +334,9 @@ class EmbeddingComposite(dimod.ComposedSampler):
                                            for u in chain}
 
         if self.scale_aware and 'ignored_interactions' in child.parameters:
-
-            ignored = []
-            for chain in embedding.values():
-                # just use 0 as a null value because we don't actually need
-                # the biases, just the interactions
-                ignored.extend(chain_to_quadratic(chain, target_adjacency, 0))
-
-            parameters['ignored_interactions'] = ignored
+            # the chain couplers are cached by the embedding, so fixed
+            # embeddings only compute them once. The child gets its own list
+            parameters['ignored_interactions'] = list(embedding.chain_couplers)
 
         response = child.sample(bqm_embedded, **parameters)
 
@@ -317,7 +351,11 @@ class EmbeddingComposite(dimod.ComposedSampler):
             sampleset = unembed_sampleset(response, embedding, source_bqm=bqm,
                                           chain_break_method=chain_break_method,
                                           chain_break_fraction=chain_break_fraction,
-                                          return_embedding=return_embedding)
+                                          return_embedding=return_embedding,
+                                          aggregate=aggregate,
+                                          num_threads=num_threads,
+                                          truncate=truncate,
+                                          lazy=lazy)
             unembedding_time = perf_counter() - t0
 
             if return_embedding:
@@ -327,7 +365,8 @@ class EmbeddingComposite(dimod.ComposedSampler):
                     chain_strength=embedding.chain_strength,
                     timing=timing)
 
-            if chain_break_fraction and len(sampleset):
+            # a lazy sample set would have to unembed all of its samples
+            if chain_break_fraction and not lazy and len(sampleset):
                 warninghandler.issue("All samples have broken chains",
                                      func=lambda: (sampleset.record.chain_break_fraction.all(), None))
 
@@ -339,6 +378,8 @@ class EmbeddingComposite(dimod.ComposedSampler):
 
             return sampleset
 
+        if lazy:
+            return LazySampleSet.from_future(response, async_unembed)
         return dimod.SampleSet.from_future(response, async_unembed)
 
 
@@ -453,8 +494,7 @@ class LazyFixedEmbeddingComposite(EmbeddingComposite, dimod.Structured):
         if self.embedding is None:
             return None
 
-        self._adjacency = adj = target_to_source(self.target_structure.adjacency,
-                                                 self.embedding)
+        self._adjacency = adj = self.embedding.source_adjacency
 
         return adj
 
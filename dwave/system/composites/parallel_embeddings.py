@@ -25,12 +25,14 @@ See the :ref:`index_concepts` section
 for explanations of technical terms in descriptions of Ocean tools.
 """
 
+import concurrent.futures
+
 import networkx as nx
 
 import dimod
 import dwave.embedding
 
-from dwave.embedding.utils import adjacency_to_edges, target_to_source
+from dwave.embedding import EmbeddedStructure
 from minorminer.utils.parallel_embeddings import find_multiple_embeddings
 
 __all__ = ["ParallelEmbeddingComposite"]
@@ -70,7 +72,9 @@ class ParallelEmbeddingComposite(dimod.Composite, dimod.Structured, dimod.Sample
 
        source (nx.Graph, optional): A source graph must be provided if embeddings
            are not specified. The source graph nodes should be supported by
-           every embedding.
+           every embedding. If not provided, the source graph is inferred
+           from the embeddings at construction, which raises for invalid
+           embeddings.
 
        embedder (Callable, optional): A function that returns
            embeddings when it is not provided. The first two arguments are
@@ -99,6 +103,12 @@ class ParallelEmbeddingComposite(dimod.Composite, dimod.Structured, dimod.Sample
            If embeddings and source graph nodes are inconsistent.
            If embeddings and target graph nodes are inconsistent.
 
+        :exc:`~dwave.embedding.exceptions.EmbeddingError`: If embeddings are
+           provided without a source graph and any of them is invalid (for
+           example with a disconnected chain), as the source graph is then
+           inferred from the embeddings. Otherwise invalid embeddings raise
+           when :meth:`sample` is called.
+
     Examples:
 
         This example submits a simple Ising problem of just two variables on a
@@ -178,6 +188,7 @@ class ParallelEmbeddingComposite(dimod.Composite, dimod.Structured, dimod.Sample
         child_structure_search=dimod.child_structure_dfs
     ):
         self.parameters = child_sampler.parameters.copy()
+        self.parameters.update(num_threads=[])
         self.properties = properties = {"child_properties": child_sampler.properties}
         self.target_structure = child_structure_search(child_sampler)
 
@@ -190,7 +201,7 @@ class ParallelEmbeddingComposite(dimod.Composite, dimod.Structured, dimod.Sample
             raise ValueError("Either the source or embeddings must be provided")
 
         self.children = [child_sampler]
-        target_nodelist, __, target_adjacency = self.target_structure
+        target_nodelist, target_edgelist, target_adjacency = self.target_structure
         if embeddings is not None:
             _embeddings = embeddings.copy()
             # Computationally cheap consistency checks, and inference of structure
@@ -220,19 +231,6 @@ class ParallelEmbeddingComposite(dimod.Composite, dimod.Structured, dimod.Sample
                     raise ValueError(
                         "source graph is inconsistent with the embeddings specified"
                     )
-            if self.edgelist is None:
-                # Find the intersection graph (slow but thorough):
-                edgeset = set(
-                    adjacency_to_edges(
-                        target_to_source(target_adjacency, embeddings[0])
-                    )
-                )
-                for emb in embeddings[1:]:
-                    edgeset0 = set(
-                        adjacency_to_edges(target_to_source(target_adjacency, emb))
-                    )
-                    edgeset = edgeset.intersection(edgeset0)
-                self.edgelist = list(edgeset)
             # could check viability of edgelist (valid embeddings), but this is slow and not the job of the composite.
         else:
             if source is None:
@@ -264,8 +262,46 @@ class ParallelEmbeddingComposite(dimod.Composite, dimod.Structured, dimod.Sample
 
         self.embeddings = properties["embeddings"] = _embeddings
 
+        # the embedded structures are built on demand, see _embedded()
+        self._structures = None
+
+        if self.edgelist is None:
+            # Find the intersection graph of the embedded structures
+            structures = self._embedded()
+            edgeset = set(map(frozenset, structures[0].source_edges))
+            for emb in structures[1:]:
+                edgeset.intersection_update(map(frozenset, emb.source_edges))
+            self.edgelist = [
+                uv for uv in structures[0].source_edges if frozenset(uv) in edgeset]
+
+    def _embedded(self):
+        """Return an :class:`~dwave.embedding.EmbeddedStructure` per
+        embedding in :attr:`embeddings`.
+
+        The structures are kept while the chains of :attr:`embeddings` are
+        unchanged, and rebuilt if :attr:`embeddings` is reassigned or modified
+        in place.
+        """
+        # comparing the chains is much cheaper than rebuilding the structures
+        embeddings = [{v: tuple(chain) for v, chain in embedding.items()}
+                      for embedding in self.embeddings]
+        if self._structures != embeddings:
+            _, target_edgelist, _ = self.target_structure
+            self._structures = self._embedded_structures(target_edgelist, embeddings)
+        return self._structures
+
+    @staticmethod
+    def _embedded_structures(target_edgelist, embeddings):
+        """Return an :class:`~dwave.embedding.EmbeddedStructure` per embedding.
+
+        The target graph is indexed once, then only the target edges incident
+        to each embedding's chains are looked up.
+        """
+        target = EmbeddedStructure(target_edgelist, {})
+        return [target.with_chains(embedding) for embedding in embeddings]
+
     @dimod.bqm_structured
-    def sample(self, bqm, **kwargs):
+    def sample(self, bqm, num_threads=None, **kwargs):
         """Sample from the specified binary quadratic model. Samplesets are
         concatenated together in the the same order as the embeddings class variable,
         the info field is returned from the child sampler unmodified.
@@ -274,6 +310,10 @@ class ParallelEmbeddingComposite(dimod.Composite, dimod.Structured, dimod.Sample
             bqm (:class:`~dimod.BinaryQuadraticModel`):
                 Binary quadratic model to be sampled from.
 
+            num_threads (int, optional):
+                Number of threads used to unembed the samples of the
+                embeddings concurrently.
+
             **kwargs:
                 Optional keyword arguments for the sampling method, specified per solver.
 
@@ -287,20 +327,22 @@ class ParallelEmbeddingComposite(dimod.Composite, dimod.Structured, dimod.Sample
         # apply the embeddings to the given problem to tile it across the child sampler
         embedded_bqm = dimod.BinaryQuadraticModel.empty(bqm.vartype)
 
-        __, __, target_adjacency = self.target_structure
-        for embedding in self.embeddings:
-            embedded_bqm.update(
-                dwave.embedding.embed_bqm(bqm, embedding, target_adjacency)
-            )
+        structures = self._embedded()
+        for embedding in structures:
+            embedded_bqm.update(embedding.embed_bqm(bqm))
 
         # solve the problem on the child system
         tiled_response = self.child.sample(embedded_bqm, **kwargs)
 
-        responses = []
-        for embedding in self.embeddings:
-            responses.append(
-                dwave.embedding.unembed_sampleset(tiled_response, embedding, bqm)
-            )
+        def unembed(embedding):
+            return dwave.embedding.unembed_sampleset(tiled_response, embedding, bqm)
+
+        if num_threads is not None and num_threads > 1 and self.num_embeddings > 1:
+            # the embeddings are unembedded independently
+            with concurrent.futures.ThreadPoolExecutor(num_threads) as executor:
+                responses = list(executor.map(unembed, structures))
+        else:
+            responses = list(map(unembed, structures))
 
         if self.num_embeddings == 1:
             return responses[0]
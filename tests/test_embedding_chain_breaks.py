@@ -12,6 +12,7 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import functools
 import unittest
 
 from contextlib import contextmanager
@@ -61,6 +62,24 @@ class TestBrokenChains(unittest.TestCase):
         broken = dwave.embedding.broken_chains(samples_matrix, chain_list)
 
 
+    def test_chunksize(self):
+        rng = np.random.default_rng(42)
+        samples = rng.choice([-1, 1], size=(25, 12)).astype(np.int8)
+        chains = [[0, 5, 3], [], [1], [2, 4], [11, 6, 7, 8, 9, 10]]
+
+        expected = [[len(set(row[chain])) > 1 for chain in chains] for row in samples]
+
+        np.testing.assert_array_equal(
+            dwave.embedding.broken_chains(samples, chains), expected)
+        for chunksize in [1, 4, 25, 100]:
+            with self.subTest(chunksize=chunksize):
+                broken = dwave.embedding.broken_chains(samples, chains, chunksize=chunksize)
+                np.testing.assert_array_equal(broken, expected)
+
+        with self.assertRaises(ValueError):
+            dwave.embedding.broken_chains(samples, chains, chunksize=0)
+
+
 class ChainBreakResolutionAPI():
     chains = [[0, 1], [2, 4], [3]]  # needs to be available to MinimizeEnergy
 
@@ -196,6 +215,44 @@ class TestMajorityVote(ChainBreakResolutionAPI, unittest.TestCase):
         self.assertEqual(samples.shape, (16, 3))
         self.assertEqual(set().union(*samples), {-1, 1})  # should be spin-valued
 
+    def test_chain_length_128(self):
+        # the sums of chains of length 128 do not fit in int8
+        chains = [range(128), [128]]
+        for value in [-1, +1]:
+            samples = np.full((1, 129), value, dtype=np.int8)
+
+            unembedded, idx = dwave.embedding.majority_vote(samples, chains)
+            np.testing.assert_array_equal(unembedded, [[value, value]])
+
+            bqm = dimod.BQM({0: 0, 1: 0}, {}, 0, dimod.SPIN)
+            embedding = {0: range(128), 1: [128]}
+            target = dimod.SampleSet.from_samples(samples, dimod.SPIN, energy=0)
+            sampleset = dwave.embedding.unembed_sampleset(target, embedding, bqm,
+                                                          chain_break_fraction=True)
+            np.testing.assert_array_equal(sampleset.record.chain_break_fraction, [0])
+
+    def test_mixed_chain_lengths(self):
+        rng = np.random.default_rng(42)
+        variables = rng.permutation(40)
+        chains = [variables[:1], variables[1:5], variables[5:7],
+                  variables[7:17], variables[17:20], variables[20:40]]
+
+        for vartype in [dimod.SPIN, dimod.BINARY]:
+            samples = rng.choice(list(vartype.value), size=(150, 40)).astype(np.int8)
+            labels = [f'v{v}' for v in range(40)]
+            labelled_chains = [[labels[v] for v in chain] for chain in chains]
+
+            unembedded, idx = dwave.embedding.majority_vote((samples, labels), labelled_chains)
+
+            np.testing.assert_array_equal(idx, np.arange(150))
+            for cidx, chain in enumerate(chains):
+                votes = samples[:, chain].sum(axis=1)
+                if vartype is dimod.SPIN:
+                    expected = np.where(votes >= 0, 1, -1)
+                else:
+                    expected = votes >= len(chain) / 2
+                np.testing.assert_array_equal(unembedded[:, cidx], expected)
+
 
 class TestMinimizeEnergy(ChainBreakResolutionAPI, unittest.TestCase):
     # for the API tests
@@ -328,8 +385,325 @@ class TestMinimizeEnergy(ChainBreakResolutionAPI, unittest.TestCase):
 
         unembedded, idx = cbm(sampleset, [[55], [48], [50, 53], [52, 51]])
 
+    def test_greedy_descent(self):
+        # compare against a direct implementation of the greedy descent,
+        # resolving one sample and one broken chain at a time
+        def reference(bqm, sample, chains):
+            zero = -1 if bqm.vartype is dimod.SPIN else 0
+            values = [sample[chain[0]] if len(set(sample[chain])) == 1 else None
+                      for chain in chains]
+            while any(val is None for val in values):
+                fields = {u: bqm.linear[u] + sum(values[v] * bias
+                                                 for v, bias in bqm.adj[u].items()
+                                                 if values[v] is not None)
+                          for u, val in enumerate(values) if val is None}
+                u = min(fields, key=lambda u: (-abs(fields[u]), fields[u], u))
+                values[u] = zero if fields[u] > 0 else 1
+            return values
+
+        rng = np.random.default_rng(42)
+        for vartype in [dimod.SPIN, dimod.BINARY]:
+            with self.subTest(vartype=vartype.name):
+                bqm = dimod.generators.gnp_random_bqm(12, .4, vartype, random_state=42)
+                for v in bqm.variables:
+                    bqm.set_linear(v, rng.integers(-2, 3))
+                for u, v in bqm.quadratic:
+                    bqm.set_quadratic(u, v, rng.integers(-2, 3))
+
+                embedding = {v: [3*v, 3*v+1, 3*v+2] for v in bqm.variables}
+                chains = [embedding[v] for v in range(12)]
+                samples = rng.choice(list(vartype.value), size=(50, 36))
+
+                cbm = dwave.embedding.MinimizeEnergy(bqm, embedding)
+                unembedded, idx = cbm(samples, chains)
+
+                np.testing.assert_array_equal(
+                    unembedded, [reference(bqm, sample, chains) for sample in samples])
+                np.testing.assert_array_equal(idx, np.arange(50))
+
+
+class TestSteepestDescent(ChainBreakResolutionAPI, unittest.TestCase):
+    # for the API tests
+    def setUp(self):
+        embedding = dict(zip('abcdefghijk', self.chains))
+        bqm = dimod.BinaryQuadraticModel.from_ising({v: 0 for v in embedding}, {})
+        self.chain_break_method = dwave.embedding.SteepestDescent(bqm, embedding)
+
+    def assertLocalMinima(self, bqm, samples):
+        energies = bqm.energies(samples)
+        for v in range(samples[0].shape[1]):
+            flipped = samples[0].copy()
+            flipped[:, v] = -flipped[:, v] if bqm.vartype is dimod.SPIN else 1 - flipped[:, v]
+            np.testing.assert_array_less(energies - 1e-9, bqm.energies((flipped, samples[1])))
+
+    def test_local_minima(self):
+        rng = np.random.default_rng(8)
+        for vartype in [dimod.SPIN, dimod.BINARY]:
+            bqm = dimod.generators.gnp_random_bqm(20, .3, vartype, random_state=8)
+            bqm.offset = 1.5
+            variables = list(bqm.variables)
+            # the chains in another order than the bqm
+            embedding = {v: (3*v, 3*v+1, 3*v+2) for v in reversed(variables)}
+            chains = list(embedding.values())
+
+            samples = rng.choice(list(vartype.value), size=(30, 60)).astype(np.int8)
+
+            for method in [dwave.embedding.majority_vote, dwave.embedding.discard]:
+                with self.subTest(vartype=vartype.name, method=method.__name__):
+                    cbm = dwave.embedding.SteepestDescent(bqm, embedding, method)
+                    unembedded, idxs = cbm(samples, chains)
+
+                    np.testing.assert_array_equal(idxs, method(samples, chains)[1])
+                    self.assertLocalMinima(bqm, (unembedded, list(embedding)))
+
+                    # descending never increases the energy
+                    polished = bqm.energies((unembedded, list(embedding)))
+                    resolved = bqm.energies((method(samples, chains)[0], list(embedding)))
+                    self.assertTrue((polished <= resolved + 1e-9).all())
+
+    def test_unembed_sampleset(self):
+        bqm = dimod.generators.gnp_random_bqm(10, .5, dimod.SPIN, random_state=2)
+        embedding = {v: (2*v, 2*v+1) for v in bqm.variables}
+
+        rng = np.random.default_rng(2)
+        target = dimod.SampleSet.from_samples(
+            rng.choice([-1, 1], size=(25, 20)).astype(np.int8), dimod.SPIN, 0)
+
+        cbm = dwave.embedding.SteepestDescent(bqm, embedding)
+        expected, _ = cbm(target, [embedding[v] for v in bqm.variables])
+
+        for kwargs in [dict(), dict(chunksize=7), dict(chain_break_fraction=True)]:
+            with self.subTest(**kwargs):
+                sampleset = dwave.embedding.unembed_sampleset(
+                    target, embedding, bqm, chain_break_method=cbm, **kwargs)
+                np.testing.assert_array_equal(sampleset.record.sample, expected)
+                dimod.testing.assert_sampleset_energies(sampleset, bqm)
+
+        # the energies are recomputed for other bqms
+        scaled = bqm.copy()
+        scaled.scale(2)
+        sampleset = dwave.embedding.unembed_sampleset(
+            target, embedding, scaled, chain_break_method=cbm)
+        dimod.testing.assert_sampleset_energies(sampleset, scaled)
+
 
 class TestWeightedRandom(ChainBreakResolutionAPI, unittest.TestCase):
     # for the API tests
     def setUp(self):
         self.chain_break_method = dwave.embedding.weighted_random
+
+    def test_seed(self):
+        samples = np.tile([[-1, +1, +1, +1, -1]], (1000, 1))
+        chains = [[0, 1, 2, 3], [4]]
+
+        unembedded, idx = dwave.embedding.weighted_random(samples, chains, seed=42)
+
+        np.testing.assert_array_equal(idx, np.arange(1000))
+        np.testing.assert_array_equal(unembedded[:, 1], -1)
+
+        # each sample is resolved independently, with the frequency in the chain
+        self.assertAlmostEqual((unembedded[:, 0] == 1).mean(), .75, delta=.05)
+
+        np.testing.assert_array_equal(
+            unembedded,
+            dwave.embedding.weighted_random(samples, chains, seed=42)[0])
+        np.testing.assert_array_equal(
+            unembedded,
+            dwave.embedding.weighted_random(samples, chains,
+                                            seed=np.random.SeedSequence(42))[0])
+
+        # generators are drawn from
+        self.assertFalse(np.array_equal(
+            dwave.embedding.weighted_random(samples, chains, seed=np.random.default_rng(42))[0],
+            dwave.embedding.weighted_random(samples, chains, seed=np.random.default_rng(43))[0]))
+        np.testing.assert_array_equal(
+            dwave.embedding.weighted_random(samples, chains, seed=np.random.default_rng(42))[0],
+            dwave.embedding.weighted_random(samples, chains, seed=np.random.default_rng(42))[0])
+
+    def test_seed_chunksize(self):
+        bqm = dimod.BQM({'a': 0, 'b': 0}, {}, 0, dimod.SPIN)
+        embedding = {'a': (0, 1, 2), 'b': (3, 4)}
+        # more samples than in a block of random choices
+        samples = np.tile([[-1, +1, +1, -1, +1]], (2500, 1))
+        target = dimod.SampleSet.from_samples(samples, dimod.SPIN, 0)
+
+        method = functools.partial(dwave.embedding.weighted_random, seed=7)
+        expected = dwave.embedding.unembed_sampleset(target, embedding, bqm,
+                                                     chain_break_method=method)
+
+        # the broken chains are not all resolved alike
+        self.assertTrue((expected.record.sample == 1).any(axis=0).all())
+        self.assertTrue((expected.record.sample == -1).any(axis=0).all())
+
+        for kwargs in [dict(chunksize=2), dict(chunksize=1000), dict(num_threads=3)]:
+            with self.subTest(**kwargs):
+                sampleset = dwave.embedding.unembed_sampleset(
+                    target, embedding, bqm, chain_break_method=method, **kwargs)
+                np.testing.assert_array_equal(sampleset.record.sample,
+                                              expected.record.sample)
+
+
+class TestUnembedSamples(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        labels = list('abcdefghij')
+        array = rng.choice([-1, 1], size=(30, 10)).astype(np.int8)
+        self.samples = (array, labels)
+        self.chains = [['a', 'c'], ['b'], [], ['d', 'e', 'f', 'g'], ['j', 'h']]
+
+    def test_chain_break_methods(self):
+        samples, chains = self.samples, self.chains
+
+        for method in [dwave.embedding.majority_vote,
+                       dwave.embedding.discard,
+                       dwave.embedding.weighted_random]:
+            with self.subTest(method=method.__name__):
+                if method is dwave.embedding.discard:
+                    chains = [chain for chain in self.chains if chain]
+
+                unembedded, idxs, num_broken, fraction, broken = \
+                    dwave.embedding.unembed_samples(samples, chains, method,
+                                                    return_broken=True)
+
+                expected = dwave.embedding.broken_chains(samples, chains)[idxs]
+                np.testing.assert_array_equal(broken, expected)
+                np.testing.assert_array_equal(num_broken, expected.sum(axis=1))
+                np.testing.assert_array_equal(fraction, expected.mean(axis=1))
+
+                if method is dwave.embedding.weighted_random:
+                    self.assertEqual(unembedded.shape, (len(idxs), len(chains)))
+                else:
+                    ref, ref_idxs = method(samples, chains)
+                    np.testing.assert_array_equal(unembedded, ref)
+                    np.testing.assert_array_equal(idxs, ref_idxs)
+
+    def test_binary(self):
+        array, labels = self.samples
+        samples = ((array + 1) // 2, labels)
+
+        unembedded, idxs, num_broken, fraction = \
+            dwave.embedding.unembed_samples(samples, self.chains)
+
+        ref, _ = dwave.embedding.majority_vote(samples, self.chains)
+        np.testing.assert_array_equal(unembedded, ref)
+        np.testing.assert_array_equal(
+            num_broken,
+            dwave.embedding.broken_chains(samples, self.chains).sum(axis=1))
+
+    def test_no_chains(self):
+        unembedded, idxs, num_broken, fraction = \
+            dwave.embedding.unembed_samples(self.samples, [])
+
+        self.assertEqual(unembedded.shape, (30, 0))
+        np.testing.assert_array_equal(num_broken, np.zeros(30))
+        np.testing.assert_array_equal(fraction, np.zeros(30))
+
+
+class TestPackedSamples(unittest.TestCase):
+    def test_roundtrip(self):
+        samples = np.array([[-1, +1, -1, +1, +1, -1, -1, -1, +1, +1]], dtype=np.int8)
+
+        packed = dwave.embedding.PackedSamples.from_samples((samples, 'abcdefghij'))
+
+        self.assertIs(packed.vartype, dimod.SPIN)
+        self.assertEqual(len(packed), 1)
+        self.assertEqual(packed.packed.shape, (1, 2))
+
+        unpacked, labels = packed.unpack()
+        np.testing.assert_array_equal(unpacked, samples)
+        self.assertEqual(labels, list('abcdefghij'))
+
+        with self.assertRaises(ValueError):
+            dwave.embedding.PackedSamples(packed.packed, 'abcdefghijklmnopq', dimod.SPIN)
+
+    def test_chain_breaks(self):
+        rng = np.random.default_rng(42)
+        labels = ['q{}'.format(v) for v in range(50)]
+
+        perm = [labels[v] for v in rng.permutation(50)]
+        scattered = [perm[:1], perm[1:5], [], perm[5:20], perm[20:50]]
+        # chains sharing bytes are counted from the packed bytes
+        contiguous = [labels[:1], labels[1:5], [], labels[5:20], labels[20:50]]
+
+        for vartype in [dimod.SPIN, dimod.BINARY]:
+            samples = (rng.choice(list(vartype.value), size=(40, 50)).astype(np.int8), labels)
+            packed = dwave.embedding.PackedSamples.from_samples(samples)
+            self.assertIs(packed.vartype, vartype)
+
+            for chains in [scattered, contiguous]:
+                with self.subTest(vartype=vartype.name, contiguous=chains is contiguous):
+                    np.testing.assert_array_equal(
+                        dwave.embedding.broken_chains(packed, chains),
+                        dwave.embedding.broken_chains(samples, chains))
+                    np.testing.assert_array_equal(
+                        dwave.embedding.broken_chains(packed, chains, chunksize=3),
+                        dwave.embedding.broken_chains(samples, chains))
+                    np.testing.assert_array_equal(
+                        dwave.embedding.majority_vote(packed, chains)[0],
+                        dwave.embedding.majority_vote(samples, chains)[0])
+
+                    embedding = dict(enumerate(chains))
+                    self.assertEqual(
+                        dwave.embedding.chain_break_frequency(packed, embedding),
+                        dwave.embedding.chain_break_frequency(samples, embedding))
+
+
+class TestChainIndex(unittest.TestCase):
+    def test_chain_break_methods(self):
+        rng = np.random.default_rng(42)
+        labels = ['q{}'.format(v) for v in range(20)]
+        perm = [labels[v] for v in rng.permutation(20)]
+        embedding = {'a': perm[:1], 'b': perm[1:5], 'c': perm[5:12], 'd': perm[12:]}
+
+        index = dwave.embedding.ChainIndex(embedding, labels)
+
+        self.assertEqual(len(index), 4)
+        self.assertEqual(index[1], tuple(perm[1:5]))
+        self.assertEqual(index.source_variables, list('abcd'))
+        np.testing.assert_array_equal(index.lengths, [1, 4, 7, 8])
+        np.testing.assert_array_equal(index.offsets, [0, 1, 5, 12, 20])
+        self.assertEqual([labels[c] for c in index.columns], perm)
+
+        chains = list(embedding.values())
+        bqm = dimod.BQM({v: rng.normal() for v in embedding},
+                        {('a', 'b'): 1, ('b', 'c'): -1, ('c', 'd'): .5}, 0, dimod.SPIN)
+
+        samples = (rng.choice([-1, 1], size=(30, 20)).astype(np.int8), labels)
+        # the samples have other variables
+        permuted = (samples[0][:, ::-1], labels[::-1])
+
+        for samples_like in [samples, permuted]:
+            with self.subTest(permuted=samples_like is permuted):
+                np.testing.assert_array_equal(
+                    dwave.embedding.broken_chains(samples_like, index),
+                    dwave.embedding.broken_chains(samples_like, chains))
+
+                for method in [dwave.embedding.discard,
+                               dwave.embedding.majority_vote,
+                               dwave.embedding.MinimizeEnergy(bqm, embedding)]:
+                    for expected, result in zip(method(samples_like, chains),
+                                                method(samples_like, index)):
+                        np.testing.assert_array_equal(result, expected)
+
+                np.testing.assert_array_equal(
+                    dwave.embedding.weighted_random(samples_like, index, seed=5)[0],
+                    dwave.embedding.weighted_random(samples_like, chains, seed=5)[0])
+
+                self.assertEqual(
+                    dwave.embedding.chain_break_frequency(samples_like, index),
+                    dwave.embedding.chain_break_frequency(samples_like, embedding))
+
+    def test_source_variables(self):
+        embedding = {'a': (0, 1), 'b': (2,), 'c': (3, 4)}
+
+        index = dwave.embedding.ChainIndex(embedding, range(5), 'ca')
+
+        self.assertEqual(list(index), [(3, 4), (0, 1)])
+        self.assertTrue(index.matches('ca', range(5)))
+        self.assertFalse(index.matches('ac', range(5)))
+        self.assertFalse(index.matches('ca', [4, 3, 2, 1, 0]))
+
+    def test_discard_empty_chain(self):
+        index = dwave.embedding.ChainIndex({'a': (0,), 'b': ()}, range(1))
+        with self.assertRaises(ValueError):
+            dwave.embedding.discard([[1]], index)
@@ -12,6 +12,7 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import functools
 import itertools
 import unittest
 import warnings
@@ -21,6 +22,7 @@ from unittest import mock
 
 import dimod
 import dwave_networkx as dnx
+import numpy as np
 from parameterized import parameterized_class
 
 import dwave.embedding
@@ -172,6 +174,76 @@ class TestEmbeddingComposite(unittest.TestCase):
 
         self.assertEqual(mock_unembed.call_count, 1)
 
+    def test_aggregate(self):
+        sampler = EmbeddingComposite(
+            dimod.StructureComposite(dimod.ExactSolver(), [0, 1, 2, 3],
+                                     [(0, 1), (1, 2), (2, 3), (3, 0)]))
+
+        bqm = dimod.BQM.from_ising({}, {'ab': 1, 'bc': 1, 'ca': 1})
+        sampleset = sampler.sample(bqm, aggregate=True)
+
+        # every source sample appears once, accounting for all 16 target samples
+        self.assertEqual(len(sampleset), 8)
+        self.assertEqual(sampleset.record.num_occurrences.sum(), 16)
+        self.assertEqual(len(np.unique(sampleset.record.sample, axis=0)), 8)
+        dimod.testing.assert_sampleset_energies(sampleset, bqm)
+
+    def test_num_threads(self):
+        sampler = EmbeddingComposite(
+            dimod.StructureComposite(dimod.ExactSolver(), [0, 1, 2, 3],
+                                     [(0, 1), (1, 2), (2, 3), (3, 0)]))
+
+        self.assertIn('num_threads', sampler.parameters)
+
+        bqm = dimod.BQM.from_ising({}, {'ab': 1, 'bc': 1, 'ca': 1})
+        sampleset = sampler.sample(bqm, num_threads=3)
+
+        self.assertEqual(len(sampleset), 16)
+        dimod.testing.assert_sampleset_energies(sampleset, bqm)
+
+        # the variables are sorted as without threads
+        bqm = dimod.BQM.from_ising({}, {'ca': 1, 'ab': 1, 'bc': 1})
+        sampleset = sampler.sample(bqm, num_threads=3)
+        self.assertEqual(sampleset.variables, ['a', 'b', 'c'])
+        self.assertEqual(sampleset.variables, sampler.sample(bqm).variables)
+
+    def test_lazy(self):
+        child = dimod.StructureComposite(dimod.ExactSolver(), [0, 1, 2, 3],
+                                         [(0, 1), (1, 2), (2, 3), (3, 0)])
+        sampler = FixedEmbeddingComposite(child, {'a': [0, 1], 'b': [2], 'c': [3]})
+
+        self.assertIn('lazy', sampler.parameters)
+
+        bqm = dimod.BQM.from_ising({}, {'ab': 1, 'bc': 1, 'ca': 1})
+        sampleset = sampler.sample(bqm, lazy=True)
+        self.assertIsInstance(sampleset, dwave.embedding.LazySampleSet)
+
+        first = sampleset.truncate(3, sorted_by=None)
+        self.assertEqual(len(first), 3)
+        dimod.testing.assert_sampleset_energies(first, bqm)
+
+        self.assertEqual(sampleset, sampler.sample(bqm))
+
+        with self.assertRaises(ValueError):
+            sampler.sample(bqm, lazy=True, aggregate=True)
+
+    def test_truncate(self):
+        sampler = EmbeddingComposite(
+            dimod.StructureComposite(dimod.ExactSolver(), [0, 1, 2, 3],
+                                     [(0, 1), (1, 2), (2, 3), (3, 0)]))
+
+        self.assertIn('truncate', sampler.parameters)
+
+        bqm = dimod.BQM.from_ising({}, {'ab': 1, 'bc': 1, 'ca': 1})
+        sampleset = sampler.sample(bqm, truncate=3)
+
+        self.assertEqual(len(sampleset), 3)
+        dimod.testing.assert_sampleset_energies(sampleset, bqm)
+        np.testing.assert_array_equal(sampleset.record.energy, [-1, -1, -1])
+
+        with self.assertRaises(ValueError):
+            sampler.sample(bqm, truncate=3, aggregate=True)
+
     def test_find_embedding_kwarg(self):
         child = dimod.StructureComposite(dimod.NullSampler(), [0, 1], [(0, 1)])
 
@@ -236,6 +308,10 @@ class TestEmbeddingComposite(unittest.TestCase):
 
         self.assertTrue(ignored == [(1, 2)] or ignored == [(2, 1)])
 
+        # the child can't change the couplers cached by the embedding
+        ignored.clear()
+        self.assertEqual(len(sampler.embedding.chain_couplers), 1)
+
     def test_return_embedding_subgraph(self):
         # problem is on a subgraph - embedding is reduced to relabeling
         nodelist = [0, 1, 2]
@@ -298,6 +374,18 @@ class TestEmbeddingComposite(unittest.TestCase):
         sampleset = sampler.sample_ising({}, {'ab': 1, 'bc': 1, 'ca': 1})
         self.assertNotIn('embedding_context', sampleset.info)
 
+    def test_return_embedding_seeded_weighted_random(self):
+        sampler = EmbeddingComposite(
+            dimod.StructureComposite(dimod.ExactSolver(), [0, 1, 2, 3],
+                                     [(0, 1), (1, 2), (2, 3), (3, 0)]))
+
+        cbm = functools.partial(chain_breaks.weighted_random, seed=42)
+        sampleset = sampler.sample_ising({}, {'ab': 1, 'bc': 1, 'ca': 1},
+                                         chain_break_method=cbm, return_embedding=True)
+
+        self.assertEqual(sampleset.info['embedding_context']['chain_break_method'],
+                         'weighted_random')
+
     def test_return_embedding_as_class_variable(self):
         nodelist = [0, 1, 2]
         edgelist = [(0, 1), (1, 2), (0, 2)]
@@ -455,6 +543,33 @@ class TestFixedEmbeddingComposite(unittest.TestCase):
 
         self.assertEqual(set(resp.variables), {'a', 'b', 'c'})
 
+    def test_embedding_plan_reuse(self):
+        sampler = FixedEmbeddingComposite(MockDWaveSampler(), {'a': [0, 4], 'b': [1, 5], 'c': [2, 6]})
+
+        sampler.sample_ising({'a': 1, 'b': 1, 'c': 0}, {('a', 'b'): -1})
+        plan = sampler.embedding._plan
+        self.assertIsNotNone(plan)
+
+        # only the biases change, so the plan is reused
+        sampleset = sampler.sample_ising({'a': -1, 'b': 0, 'c': .5}, {('a', 'b'): 2})
+        self.assertIs(sampler.embedding._plan, plan)
+        self.assertEqual(set(sampleset.variables), {'a', 'b', 'c'})
+
+    def test_chain_index_reuse(self):
+        sampler = FixedEmbeddingComposite(MockDWaveSampler(), {'a': [0, 4], 'b': [1, 5], 'c': [2, 6]})
+
+        # the unembedding is done when the sample set is resolved
+        sampler.sample_ising({'a': 1, 'b': 1, 'c': 0}, {('a', 'b'): -1}).resolve()
+        index = sampler.embedding._chain_index
+        self.assertIsNotNone(index)
+
+        # same source and target variables, so the chain index is reused
+        sampleset = sampler.sample_ising({'a': -1, 'b': 0, 'c': .5}, {('a', 'b'): 2},
+                                         chain_break_fraction=True)
+        sampleset.resolve()
+        self.assertIs(sampler.embedding._chain_index, index)
+        self.assertEqual(set(sampleset.variables), {'a', 'b', 'c'})
+
     def test_adjacency(self):
         square_adj = {1: [2, 3], 2: [1, 4], 3: [1, 4], 4: [2, 3]}
         with self.assertWarns(DeprecationWarning):
@@ -515,6 +630,21 @@ class TestFixedEmbeddingComposite(unittest.TestCase):
         cbm = chain_breaks.MinimizeEnergy(bqm, embedding)
         composite.sample(bqm, chain_break_method=cbm).resolve()
 
+    def test_steepest_descent_chain_break_method(self):
+        bqm = dimod.BinaryQuadraticModel.from_ising({}, {(0, 1): 1, (1, 2): 1, (0, 2): 1})
+
+        sampler = dimod.StructureComposite(dimod.ExactSolver(), [0, 1, 2, 3],
+                                           [(0, 1), (1, 2), (2, 3), (3, 0)])
+        embedding = {0: [0], 1: [1], 2: [2, 3]}
+        composite = FixedEmbeddingComposite(sampler, embedding)
+
+        cbm = chain_breaks.SteepestDescent(bqm, embedding)
+        sampleset = composite.sample(bqm, chain_break_method=cbm, return_embedding=True)
+
+        dimod.testing.assert_sampleset_energies(sampleset, bqm)
+        self.assertEqual(sampleset.info['embedding_context']['chain_break_method'],
+                         'SteepestDescent')
+
     def test_subgraph_relabeling(self):
         Z12 = dnx.zephyr_graph(12)
         nodelist = sorted(Z12.nodes)
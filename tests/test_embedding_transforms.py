@@ -12,7 +12,9 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import functools
 import unittest
+import unittest.mock
 import itertools
 import random
 
@@ -238,6 +240,400 @@ class TestUnembedSampleSet(unittest.TestCase):
 
         np.testing.assert_array_equal(ss.record.chain_break_method, [0, 0, 1])
 
+    def test_multi_chain_break_fraction(self):
+        samples = [{'a': -1, 'b': -1, 'c': +1, 'd': -1},
+                   {'a': -1, 'b': -1, 'c': -1, 'd': +1},
+                   {'a': +1, 'b': -1, 'c': -1, 'd': +1}]
+        embedding = {0: ['a', 'b', 'c'], 1: ['d']}
+        bqm = dimod.BinaryQuadraticModel.from_ising({}, {(0, 1): 1})
+
+        resp = dimod.SampleSet.from_samples(samples, energy=[-1, 1, 0], info={},
+                                            vartype=dimod.SPIN)
+
+        methods = [dwave.embedding.discard,
+                   dwave.embedding.majority_vote,
+                   dwave.embedding.discard]
+
+        for chunksize in [None, 1, 2]:
+            with self.subTest(chunksize=chunksize):
+                ss = dwave.embedding.unembed_sampleset(
+                    resp, embedding, bqm, chain_break_method=methods,
+                    chain_break_fraction=True, chunksize=chunksize)
+
+                np.testing.assert_array_equal(ss.record.chain_break_method,
+                                              [0, 1, 1, 1, 2])
+                np.testing.assert_array_equal(ss.record.chain_break_fraction,
+                                              [0, .5, 0, .5, 0])
+                np.testing.assert_array_equal(ss.record.sample,
+                                              [[-1, 1], [-1, -1], [-1, 1], [-1, 1], [-1, 1]])
+                np.testing.assert_array_equal(ss.record.energy, [-1, 1, -1, -1, -1])
+
+    def test_aggregate(self):
+        bqm = dimod.generators.gnp_random_bqm(6, .5, dimod.SPIN, random_state=3)
+        embedding = {v: [3*v, 3*v+1, 3*v+2] for v in bqm.variables}
+
+        rng = np.random.default_rng(3)
+        target = dimod.SampleSet.from_samples(
+            rng.choice([-1, 1], size=(300, 18)), dimod.SPIN, energy=0,
+            num_occurrences=rng.integers(1, 4, size=300))
+
+        sampleset = dwave.embedding.unembed_sampleset(
+            target, embedding, bqm, chain_break_fraction=True)
+        aggregated = dwave.embedding.unembed_sampleset(
+            target, embedding, bqm, chain_break_fraction=True, aggregate=True)
+
+        expected = sampleset.aggregate()
+        self.assertEqual(aggregated.variables, expected.variables)
+        np.testing.assert_array_equal(aggregated.record.sample, expected.record.sample)
+        np.testing.assert_array_equal(aggregated.record.energy, expected.record.energy)
+        np.testing.assert_array_equal(aggregated.record.num_occurrences,
+                                      expected.record.num_occurrences)
+
+        # the fraction of broken chains is averaged over the occurrences
+        for sample, cbf in zip(aggregated.record.sample,
+                               aggregated.record.chain_break_fraction):
+            merged = sampleset.record[(sampleset.record.sample == sample).all(axis=1)]
+            self.assertAlmostEqual(cbf, np.average(merged.chain_break_fraction,
+                                                   weights=merged.num_occurrences))
+
+    def test_aggregate_multi(self):
+        samples = [{'a': -1, 'b': -1, 'c': +1, 'd': -1},
+                   {'a': -1, 'b': -1, 'c': -1, 'd': -1},
+                   {'a': -1, 'b': -1, 'c': -1, 'd': +1}]
+        embedding = {0: ['a', 'b', 'c'], 1: ['d']}
+        bqm = dimod.BinaryQuadraticModel.from_ising({}, {(0, 1): 1})
+
+        resp = dimod.SampleSet.from_samples(samples, energy=0, vartype=dimod.SPIN)
+
+        methods = [dwave.embedding.majority_vote, dwave.embedding.discard]
+        ss = dwave.embedding.unembed_sampleset(resp, embedding, bqm,
+                                               chain_break_method=methods,
+                                               aggregate=True)
+
+        # samples are only merged within a method
+        np.testing.assert_array_equal(ss.record.chain_break_method, [0, 0, 1, 1])
+        np.testing.assert_array_equal(ss.record.sample, [[-1, -1], [-1, 1], [-1, -1], [-1, 1]])
+        np.testing.assert_array_equal(ss.record.num_occurrences, [2, 1, 1, 1])
+
+    def test_multi_unsorted_labels(self):
+        bqm = dimod.BQM({'c': 1, 'a': -.5, 'b': .25}, {'ca': 1, 'ab': -1}, 0, dimod.SPIN)
+        embedding = {'a': (0, 1), 'b': (2,), 'c': (3, 4)}
+
+        rng = np.random.default_rng(7)
+        target = dimod.SampleSet.from_samples(rng.choice([-1, 1], size=(11, 5)),
+                                              dimod.SPIN, 0)
+
+        methods = [dwave.embedding.majority_vote, dwave.embedding.discard]
+        sampleset = dwave.embedding.unembed_sampleset(target, embedding, bqm,
+                                                      chain_break_method=methods)
+
+        self.assertEqual(sampleset.variables, ['a', 'b', 'c'])
+        for midx, method in enumerate(methods):
+            expected = dwave.embedding.unembed_sampleset(target, embedding, bqm,
+                                                         chain_break_method=method)
+            self.assertEqual(expected.variables, sampleset.variables)
+            np.testing.assert_array_equal(
+                sampleset.record.sample[sampleset.record.chain_break_method == midx],
+                expected.record.sample)
+
+    def test_num_threads(self):
+        bqm = dimod.generators.ran_r(1, 8, seed=11)
+        embedding = {v: [2*v, 2*v+1] for v in bqm.variables}
+
+        rng = np.random.default_rng(11)
+        target = dimod.SampleSet.from_samples(
+            rng.choice([-1, 1], size=(45, 16)), dimod.SPIN, energy=0)
+
+        methods = [dwave.embedding.majority_vote, dwave.embedding.discard]
+        for chain_break_method in [dwave.embedding.discard, methods]:
+            expected = dwave.embedding.unembed_sampleset(
+                target, embedding, bqm, chain_break_method=chain_break_method,
+                chain_break_fraction=True)
+
+            for chunksize in [None, 4]:
+                with self.subTest(multiple=chain_break_method is methods, chunksize=chunksize):
+                    sampleset = dwave.embedding.unembed_sampleset(
+                        target, embedding, bqm, chain_break_method=chain_break_method,
+                        chain_break_fraction=True, chunksize=chunksize, num_threads=3)
+
+                    np.testing.assert_array_equal(sampleset.record, expected.record)
+
+    def test_num_threads_unsorted_labels(self):
+        bqm = dimod.BQM({'c': 1, 'a': -.5, 'b': .25}, {'ca': 1, 'ab': -1}, 0, dimod.SPIN)
+        embedding = {'a': (0, 1), 'b': (2,), 'c': (3, 4)}
+
+        rng = np.random.default_rng(8)
+        target = dimod.SampleSet.from_samples(rng.choice([-1, 1], size=(11, 5)),
+                                              dimod.SPIN, 0)
+
+        expected = dwave.embedding.unembed_sampleset(target, embedding, bqm)
+        sampleset = dwave.embedding.unembed_sampleset(target, embedding, bqm,
+                                                      num_threads=3)
+
+        self.assertEqual(sampleset.variables, ['a', 'b', 'c'])
+        self.assertEqual(sampleset.variables, expected.variables)
+        np.testing.assert_array_equal(sampleset.record, expected.record)
+
+    def test_target_bqm(self):
+        bqm = dimod.generators.gnp_random_bqm(8, .5, dimod.SPIN, random_state=7)
+        bqm.offset = 1.5
+        embedding = {v: [3*v, 3*v+1, 3*v+2] for v in bqm.variables}
+        target = nx.complete_graph(24)
+
+        rng = np.random.default_rng(7)
+        samples = np.repeat(rng.choice([-1, 1], size=(40, 8)), 3, axis=1)
+        samples[rng.random(samples.shape) < .05] *= -1
+
+        for smear_vartype in [None, dimod.BINARY]:
+            target_bqm = dwave.embedding.embed_bqm(
+                bqm, embedding, target, chain_strength={v: 1 + v for v in bqm.variables},
+                smear_vartype=smear_vartype)
+            target_sampleset = dimod.SampleSet.from_samples_bqm(samples, target_bqm)
+
+            for chunksize in [None, 7]:
+                with self.subTest(smear_vartype=smear_vartype, chunksize=chunksize):
+                    expected = dwave.embedding.unembed_sampleset(
+                        target_sampleset, embedding, bqm, chunksize=chunksize)
+                    sampleset = dwave.embedding.unembed_sampleset(
+                        target_sampleset, embedding, bqm, chunksize=chunksize,
+                        target_bqm=target_bqm)
+
+                    np.testing.assert_array_equal(sampleset.record.sample,
+                                                  expected.record.sample)
+                    np.testing.assert_array_almost_equal(sampleset.record.energy,
+                                                         expected.record.energy)
+
+        # the target bqm must only contain the chains
+        target_bqm.add_variable(100, 1)
+        with self.assertRaises(ValueError):
+            dwave.embedding.unembed_sampleset(target_sampleset, embedding, bqm,
+                                              target_bqm=target_bqm)
+
+    def test_truncate(self):
+        bqm = dimod.generators.gnp_random_bqm(6, .5, dimod.SPIN, random_state=3)
+        embedding = {v: [2*v, 2*v+1] for v in bqm.variables}
+        target = nx.complete_graph(12)
+        target_bqm = dwave.embedding.embed_bqm(bqm, embedding, target, chain_strength=10)
+
+        rng = np.random.default_rng(3)
+        samples = np.repeat(rng.choice([-1, 1], size=(50, 6)), 2, axis=1)
+        samples[:25:2, 0] *= -1  # broken chains
+        target_sampleset = dimod.SampleSet.from_samples_bqm(samples, target_bqm)
+
+        full = dwave.embedding.unembed_sampleset(target_sampleset, embedding, bqm,
+                                                 chain_break_fraction=True)
+
+        for truncate in [0, 1, 5, 50, 100]:
+            with self.subTest(truncate=truncate):
+                sampleset = dwave.embedding.unembed_sampleset(
+                    target_sampleset, embedding, bqm, chain_break_fraction=True,
+                    truncate=truncate)
+
+                self.assertEqual(len(sampleset), min(truncate, 50))
+                dimod.testing.assert_sampleset_energies(sampleset, bqm)
+                # the broken chains cost more than any source energy, so the
+                # candidates contain the lowest energy samples
+                np.testing.assert_array_equal(
+                    sampleset.record.energy,
+                    full.truncate(truncate).record.energy)
+
+        # only samples without broken chains are kept by discard
+        sampleset = dwave.embedding.unembed_sampleset(
+            target_sampleset, embedding, bqm, chain_break_method=dwave.embedding.discard,
+            chain_break_fraction=True, truncate=40)
+        self.assertEqual(len(sampleset), 37)
+        self.assertFalse(sampleset.record.chain_break_fraction.any())
+
+        with self.assertRaises(ValueError):
+            dwave.embedding.unembed_sampleset(target_sampleset, embedding, bqm,
+                                              truncate=-1)
+
+        with self.assertRaises(ValueError):
+            dwave.embedding.unembed_sampleset(target_sampleset, embedding, bqm,
+                                              truncate=5, aggregate=True)
+
+    def test_lazy(self):
+        bqm = dimod.generators.ran_r(1, 6, seed=8)
+        embedding = {v: ['t{}'.format(2*v), 't{}'.format(2*v+1)] for v in bqm.variables}
+        labels = ['t{}'.format(t) for t in reversed(range(12))]
+
+        rng = np.random.default_rng(8)
+        samples = np.repeat(rng.choice([-1, 1], size=(100, 6)), 2, axis=1)
+        samples[::3, 0] *= -1  # broken chains
+        target = dimod.SampleSet.from_samples((samples, labels), dimod.SPIN,
+                                              energy=rng.random(100))
+
+        methods = [dwave.embedding.majority_vote, dwave.embedding.discard,
+                   functools.partial(dwave.embedding.weighted_random, seed=8),
+                   dwave.embedding.MinimizeEnergy(bqm, embedding)]
+        for method in methods:
+            with self.subTest(method=method):
+                expected = dwave.embedding.unembed_sampleset(
+                    target, embedding, bqm, chain_break_method=method,
+                    chain_break_fraction=True, return_embedding=True)
+
+                sampleset = dwave.embedding.unembed_sampleset(
+                    target, embedding, bqm, chain_break_method=method,
+                    chain_break_fraction=True, return_embedding=True, lazy=True)
+                self.assertIsInstance(sampleset, dwave.embedding.LazySampleSet)
+
+                # known without unembedding
+                self.assertEqual(sampleset.variables, expected.variables)
+                self.assertEqual(sampleset.info, expected.info)
+                self.assertEqual(sampleset._num_unembedded, 0)
+
+                # only the target samples needed are unembedded
+                first = sampleset.truncate(5, sorted_by=None)
+                np.testing.assert_array_equal(first.record, expected.record[:5])
+                self.assertLessEqual(sampleset._num_unembedded, 10)
+
+                self.assertEqual(list(sampleset.samples(7, sorted_by=None)),
+                                 list(expected.samples(7, sorted_by=None)))
+
+                data = sampleset.data(['energy'], sorted_by=None)
+                self.assertEqual(next(data).energy, expected.record.energy[0])
+                self.assertLessEqual(sampleset._num_unembedded, 20)
+                self.assertEqual([datum.energy for datum in data],
+                                 list(expected.record.energy[1:]))
+
+                # anything else unembeds all of the samples
+                self.assertEqual(len(sampleset), len(expected))
+                self.assertEqual(sampleset, expected)
+                self.assertEqual(sampleset.record.dtype, expected.record.dtype)
+                self.assertEqual(sampleset.first, expected.first)
+
+        with self.assertRaises(ValueError):
+            dwave.embedding.unembed_sampleset(target, embedding, bqm,
+                                              lazy=True, truncate=5)
+        with self.assertRaises(ValueError):
+            dwave.embedding.unembed_sampleset(target, embedding, bqm,
+                                              lazy=True, aggregate=True)
+        with self.assertRaises(ValueError):
+            dwave.embedding.unembed_sampleset(
+                target, embedding, bqm, lazy=True,
+                chain_break_method=[dwave.embedding.majority_vote, dwave.embedding.discard])
+
+    def test_truncate_broken_chains(self):
+        # with a weak chain strength the target energy says little about the
+        # source energy of samples with broken chains
+        bqm = dimod.generators.gnp_random_bqm(6, .5, dimod.SPIN, random_state=7)
+        embedding = {v: ['t{}'.format(2*v), 't{}'.format(2*v+1)] for v in bqm.variables}
+        labels = ['t{}'.format(t) for t in reversed(range(12))]
+        target = nx.complete_graph(labels)
+        target_bqm = dwave.embedding.embed_bqm(bqm, embedding, target, chain_strength=.1)
+
+        rng = np.random.default_rng(7)
+        samples = rng.choice([-1, 1], size=(60, 12))
+        samples[::3, 1::2] = samples[::3, ::2]  # some samples without broken chains
+        target_sampleset = dimod.SampleSet.from_samples_bqm((samples, labels), target_bqm)
+
+        broken = dwave.embedding.broken_chains(
+            target_sampleset, [embedding[v] for v in bqm.variables])
+        self.assertTrue(broken.any())
+        self.assertFalse(broken.any(axis=1).all())
+
+        for method in [dwave.embedding.majority_vote, dwave.embedding.discard]:
+            for truncate in [1, 5, 20]:
+                with self.subTest(method=method.__name__, truncate=truncate):
+                    sampleset = dwave.embedding.unembed_sampleset(
+                        target_sampleset, embedding, bqm, chain_break_method=method,
+                        chain_break_fraction=True, truncate=truncate)
+
+                    # the candidates are the best target samples, ranked by
+                    # energy then by the number of broken chains
+                    rows = np.lexsort((broken.sum(axis=1), target_sampleset.record.energy))
+                    if method is dwave.embedding.discard:
+                        rows = rows[~broken[rows].any(axis=1)]
+                    candidates = target_sampleset.record[np.sort(rows[:2*truncate])]
+                    expected = dwave.embedding.unembed_sampleset(
+                        dimod.SampleSet(candidates, target_sampleset.variables, {},
+                                        target_sampleset.vartype),
+                        embedding, bqm, chain_break_method=method,
+                        chain_break_fraction=True).truncate(truncate)
+
+                    self.assertEqual(sampleset.variables, expected.variables)
+                    np.testing.assert_array_equal(sampleset.record, expected.record)
+                    dimod.testing.assert_sampleset_energies(sampleset, bqm)
+
+                    # no better than the samples of the full unembedding
+                    full = dwave.embedding.unembed_sampleset(
+                        target_sampleset, embedding, bqm, chain_break_method=method)
+                    self.assertTrue((sampleset.record.energy >=
+                                     full.truncate(truncate).record.energy).all())
+
+    def test_chunksize(self):
+        bqm = dimod.generators.ran_r(1, 8, seed=5)
+        embedding = {v: ['t{}'.format(2*v), 't{}'.format(2*v+1)] for v in bqm.variables}
+
+        rng = np.random.default_rng(5)
+        labels = ['t{}'.format(t) for t in reversed(range(16))]
+        target = dimod.SampleSet.from_samples(
+            (rng.choice([-1, 1], size=(37, 16)), labels), dimod.SPIN,
+            energy=np.arange(37.), extra=np.arange(37))
+
+        for method in [dwave.embedding.majority_vote, dwave.embedding.discard]:
+            with self.subTest(method=method.__name__):
+                expected = dwave.embedding.unembed_sampleset(
+                    target, embedding, bqm, chain_break_method=method,
+                    chain_break_fraction=True)
+
+                for chunksize in [1, 5, 37, 100]:
+                    sampleset = dwave.embedding.unembed_sampleset(
+                        target, embedding, bqm, chain_break_method=method,
+                        chain_break_fraction=True, chunksize=chunksize)
+
+                    self.assertEqual(sampleset.variables, expected.variables)
+                    self.assertEqual(sampleset.vartype, expected.vartype)
+                    np.testing.assert_array_equal(sampleset.record, expected.record)
+
+        with self.assertRaises(ValueError):
+            dwave.embedding.unembed_sampleset(target, embedding, bqm, chunksize=0)
+
+    def test_chunksize_dtypes(self):
+        bqm = dimod.BQM(dimod.generators.ran_r(1, 4, seed=6), dtype=np.float32)
+        embedding = {v: [2*v, 2*v+1] for v in bqm.variables}
+        target_bqm = dwave.embedding.embed_bqm(bqm, embedding, nx.complete_graph(8),
+                                               chain_strength=2)
+
+        rng = np.random.default_rng(6)
+        target = dimod.SampleSet.from_samples(
+            rng.choice([-1, 1], size=(10, 8)).astype(np.int64), dimod.SPIN, energy=0)
+
+        methods = [dwave.embedding.majority_vote, dwave.embedding.discard,
+                   functools.partial(dwave.embedding.weighted_random, seed=6),
+                   dwave.embedding.MinimizeEnergy(bqm, embedding)]
+        for method, tbqm in itertools.product(methods, [None, target_bqm]):
+            with self.subTest(method=method, target_bqm=tbqm is not None):
+                expected = dwave.embedding.unembed_sampleset(
+                    target, embedding, bqm, chain_break_method=method,
+                    chain_break_fraction=True, target_bqm=tbqm)
+
+                for kwargs in [dict(chunksize=3), dict(num_threads=2)]:
+                    sampleset = dwave.embedding.unembed_sampleset(
+                        target, embedding, bqm, chain_break_method=method,
+                        chain_break_fraction=True, target_bqm=tbqm, **kwargs)
+
+                    self.assertEqual(sampleset.record.dtype, expected.record.dtype)
+                    np.testing.assert_array_equal(sampleset.record, expected.record)
+
+    def test_chunksize_unsorted_labels(self):
+        bqm = dimod.BQM({'c': 1, 'a': -.5, 'b': .25}, {'ca': 1, 'ab': -1}, 0, dimod.SPIN)
+        embedding = {'a': (0, 1), 'b': (2,), 'c': (3, 4)}
+
+        rng = np.random.default_rng(6)
+        target = dimod.SampleSet.from_samples(rng.choice([-1, 1], size=(11, 5)),
+                                              dimod.SPIN, 0)
+
+        expected = dwave.embedding.unembed_sampleset(target, embedding, bqm,
+                                                     chain_break_fraction=True)
+        self.assertEqual(expected.variables, ['a', 'b', 'c'])
+
+        sampleset = dwave.embedding.unembed_sampleset(target, embedding, bqm,
+                                                      chain_break_fraction=True,
+                                                      chunksize=4)
+        self.assertEqual(sampleset.variables, expected.variables)
+        np.testing.assert_array_equal(sampleset.record, expected.record)
+
 
 class TestEmbedBQM(unittest.TestCase):
     def test_embed_bqm_empty(self):
@@ -631,3 +1027,434 @@ class TestEmbeddedStructure(unittest.TestCase):
         memo = {}
         self.assertIs(copy.deepcopy(embedded_structure, memo),
                       copy.deepcopy(embedded_structure, memo))
+
+    def test_pickle(self):
+        import pickle
+
+        g = [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5), (5, 0)]
+        emb = {'a': (1, 2), 'b': (3, 4), 'c': (5, 0)}
+        a = dwave.embedding.EmbeddedStructure(g, emb)
+
+        b = pickle.loads(pickle.dumps(a))
+
+        self.assertIsInstance(b, dwave.embedding.EmbeddedStructure)
+        self.assertEqual(a, b)
+        for u, v in itertools.product(a, a):
+            if u == v:
+                self.assertEqual(list(a.chain_edges(u)), list(b.chain_edges(u)))
+            else:
+                self.assertEqual(list(a.interaction_edges(u, v)),
+                                 list(b.interaction_edges(u, v)))
+        self.assertEqual(a.max_chain_length, b.max_chain_length)
+
+    def test_array_target_edges(self):
+        target = nx.grid_2d_graph(4, 4)
+        target = nx.convert_node_labels_to_integers(target)
+        edges = [(v, u) if i % 2 else (u, v) for i, (u, v) in enumerate(target.edges)]
+        emb = {'a': (0, 1, 2, 3), 'b': (4, 5, 6, 7), 'c': (8, 9), 'd': (10, 11, 15)}
+
+        a = dwave.embedding.EmbeddedStructure(edges, emb)
+        b = dwave.embedding.EmbeddedStructure(np.array(edges, dtype=np.int32), emb)
+
+        self.assertEqual(a, b)
+        for u, v in itertools.product(a, a):
+            if u == v:
+                self.assertEqual(list(a.chain_edges(u)), list(b.chain_edges(u)))
+            else:
+                self.assertEqual(list(a.interaction_edges(u, v)),
+                                 list(b.interaction_edges(u, v)))
+
+        with self.assertRaises(dwave.embedding.exceptions.DisconnectedChainError):
+            dwave.embedding.EmbeddedStructure(np.array(edges), {'a': (0, 1), 'b': (2, 8)})
+
+        empty = dwave.embedding.EmbeddedStructure(np.empty((0, 2), dtype=int), {'a': (0,)})
+        self.assertEqual(list(empty.chain_edges('a')), [])
+
+    def test_list_target_edges(self):
+        # a list of target edges is not converted to an array, which would
+        # cost more than the construction for small embeddings
+        target = nx.convert_node_labels_to_integers(nx.grid_2d_graph(20, 20))
+        edges = list(target.edges)
+        emb = {'a': (0, 1, 2), 'b': (20, 21)}
+
+        with unittest.mock.patch('dwave.embedding.transforms._edge_array',
+                                 wraps=dwave.embedding.transforms._edge_array) as edge_array:
+            a = dwave.embedding.EmbeddedStructure(edges, emb)
+        edge_array.assert_not_called()
+
+        b = dwave.embedding.EmbeddedStructure(np.array(edges), emb)
+        self.assertEqual(a, b)
+        self.assertEqual(list(a.interaction_edges('a', 'b')),
+                         list(b.interaction_edges('a', 'b')))
+        self.assertEqual(list(a.chain_edges('a')), list(b.chain_edges('a')))
+
+    def test_chain_couplers(self):
+        target = nx.grid_2d_graph(3, 3)
+        emb = {'a': [(0, 0), (0, 1), (1, 1)], 'b': [(1, 0)], 'c': [(2, 0), (2, 1)]}
+        es = dwave.embedding.EmbeddedStructure(target.edges, emb)
+
+        expected = [edge for chain in emb.values()
+                    for edge in dwave.embedding.chain_to_quadratic(chain, target, 0)]
+        self.assertEqual(set(map(frozenset, es.chain_couplers)),
+                         set(map(frozenset, expected)))
+        self.assertEqual(len(es.chain_couplers), len(expected))
+        self.assertIs(es.chain_couplers, es.chain_couplers)  # cached
+        self.assertIsInstance(es.chain_couplers, tuple)  # so it can't be changed
+
+    def test_source_adjacency(self):
+        target = nx.grid_2d_graph(3, 3)
+        emb = {'a': [(0, 0), (0, 1)], 'b': [(1, 0), (1, 1)], 'c': [(2, 0), (2, 1)],
+               'd': [(0, 2)], 'e': [(2, 2)]}
+        es = dwave.embedding.EmbeddedStructure(target.edges, emb)
+
+        self.assertEqual(es.source_adjacency,
+                         dwave.embedding.target_to_source(target, emb))
+        self.assertEqual(set(map(frozenset, es.source_edges)),
+                         {frozenset(('a', 'b')), frozenset(('b', 'c')),
+                          frozenset(('a', 'd')), frozenset(('c', 'e'))})
+        self.assertIs(es.source_edges, es.source_edges)  # cached
+
+        # modifying the returned adjacency does not affect the structure
+        adj = es.source_adjacency
+        adj['a'].clear()
+        adj['z'] = set()
+        self.assertEqual(es.source_adjacency,
+                         dwave.embedding.target_to_source(target, emb))
+
+    def test_without(self):
+        target = nx.grid_2d_graph(3, 3)
+        emb = {'a': [(0, 0), (0, 1)], 'b': [(1, 0), (1, 1)], 'c': [(2, 0), (2, 1), (2, 2)]}
+        es = dwave.embedding.EmbeddedStructure(target.edges, emb)
+
+        derived = es.without(['b'])
+        expected = dwave.embedding.EmbeddedStructure(
+            target.edges, {'a': emb['a'], 'c': emb['c']})
+
+        self.assertEqual(derived, expected)
+        for u, v in itertools.product(expected, expected):
+            if u == v:
+                self.assertEqual(list(derived.chain_edges(u)), list(expected.chain_edges(u)))
+            else:
+                self.assertEqual(list(derived.interaction_edges(u, v)),
+                                 list(expected.interaction_edges(u, v)))
+
+        with self.assertRaises(KeyError):
+            es.without(['x'])
+
+    def test_with_chains(self):
+        target = nx.grid_2d_graph(3, 3)
+        emb = {'a': [(0, 0), (0, 1)], 'b': [(1, 0), (1, 1)], 'c': [(2, 0), (2, 1)]}
+        es = dwave.embedding.EmbeddedStructure(target.edges, emb)
+
+        chains = {'b': [(1, 1), (1, 2)], 'd': [(0, 2)], 'e': [(2, 2)]}
+        derived = es.with_chains(chains)
+        expected = dwave.embedding.EmbeddedStructure(target.edges, dict(emb, **chains))
+
+        self.assertEqual(derived, expected)
+        self.assertEqual(list(derived), ['a', 'c', 'b', 'd', 'e'])
+        for u, v in itertools.product(expected, expected):
+            if u == v:
+                self.assertEqual(set(map(frozenset, derived.chain_edges(u))),
+                                 set(map(frozenset, expected.chain_edges(u))))
+            else:
+                self.assertEqual(set(derived.interaction_edges(u, v)),
+                                 set(expected.interaction_edges(u, v)))
+
+        bqm = dimod.BQM({v: 1 for v in expected},
+                        {('a', 'b'): 1, ('b', 'd'): -1, ('c', 'e'): .5}, 0, 'SPIN')
+        dimod.testing.assert_bqm_almost_equal(derived.embed_bqm(bqm, chain_strength=2),
+                                              expected.embed_bqm(bqm, chain_strength=2))
+
+    def test_with_chains_invalid(self):
+        es = dwave.embedding.EmbeddedStructure([(0, 1), (1, 2), (2, 3), (3, 4)],
+                                               {'a': (0,), 'b': (1, 2)})
+
+        with self.assertRaises(dwave.embedding.exceptions.ChainOverlapError):
+            es.with_chains({'c': (2, 3)})
+        with self.assertRaises(dwave.embedding.exceptions.DisconnectedChainError):
+            es.with_chains({'a': (3,), 'c': (0, 4)})  # 0 is freed by replacing 'a'
+        with self.assertRaises(dwave.embedding.exceptions.MissingChainError):
+            es.with_chains({'c': ()})
+
+        # replacing a chain frees its target nodes
+        self.assertEqual(es.with_chains({'a': (3,), 'c': (0,)}),
+                         {'a': (3,), 'b': (1, 2), 'c': (0,)})
+
+    def test_save_load(self):
+        import os
+        import tempfile
+
+        g = [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5), (5, 0)]
+        emb = {'a': (1, 2), 'b': (3, 4), 'c': (5, 0)}
+        a = dwave.embedding.EmbeddedStructure(g, emb)
+
+        bqm = dimod.BQM({'a': 1, 'b': -1}, {('a', 'b'): 1, ('b', 'c'): -.5}, 0, 'SPIN')
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'embedding.bin')
+            a.save(path)
+
+            for mmap in [True, False]:
+                with self.subTest(mmap=mmap):
+                    b = dwave.embedding.EmbeddedStructure.load(path, mmap=mmap)
+
+                    self.assertEqual(a, b)
+                    self.assertEqual(list(a), list(b))
+                    self.assertEqual(b.target_fingerprint, a.target_fingerprint)
+                    self.assertIsInstance(b._chain_ptr, np.memmap if mmap else np.ndarray)
+                    for u, v in itertools.product(a, a):
+                        self.assertEqual(list(a.interaction_edges(u, v)),
+                                         list(b.interaction_edges(u, v)))
+                    self.assertEqual(a.embed_bqm(bqm), b.embed_bqm(bqm))
+                    del b  # release the mapped file
+
+    def test_save_load_labels(self):
+        import io
+
+        g = nx.grid_2d_graph(3, 3)
+        emb = {'a': [(0, 0), (0, 1)], 'b': [(1, 1), (1, 2)], ('c', 1): [(2, 2)]}
+        a = dwave.embedding.EmbeddedStructure(g.edges, emb)
+
+        f = io.BytesIO()
+        a.save(f)
+        f.seek(0)
+        b = dwave.embedding.EmbeddedStructure.load(f, mmap=False)
+
+        self.assertEqual(a, b)
+        self.assertEqual(list(a), list(b))
+        for u, v in itertools.product(a, a):
+            self.assertEqual(list(a.interaction_edges(u, v)),
+                             list(b.interaction_edges(u, v)))
+
+    def test_load_target(self):
+        import io
+
+        g = [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5), (5, 0)]
+        emb = {'a': (1, 2), 'b': (3, 4), 'c': (5, 0)}
+        a = dwave.embedding.EmbeddedStructure(g, emb)
+
+        f = io.BytesIO()
+        a.save(f)
+
+        # order of edges and of nodes within edges does not matter
+        f.seek(0)
+        b = dwave.embedding.EmbeddedStructure.load(
+            f, target_edges=[(v, u) for u, v in reversed(g)], mmap=False)
+        self.assertEqual(a, b)
+
+        f.seek(0)
+        fingerprint = dwave.embedding.EmbeddedStructure.fingerprint(g)
+        b = dwave.embedding.EmbeddedStructure.load(
+            f, target_fingerprint=fingerprint, mmap=False)
+        self.assertEqual(a, b)
+
+        f.seek(0)
+        with self.assertRaises(ValueError):
+            dwave.embedding.EmbeddedStructure.load(f, target_edges=g[1:], mmap=False)
+
+        with self.assertRaises(ValueError):
+            dwave.embedding.EmbeddedStructure.load(io.BytesIO(b'not an embedding'))
+
+    def test_array_layout(self):
+        g = [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5), (5, 0)]
+        emb = {0: (1, 2), 1: (3, 4), 2: (5, 0)}
+        a = dwave.embedding.EmbeddedStructure(g, emb)
+
+        npt.assert_array_equal(a._qubits, [1, 2, 3, 4, 5, 0])
+        npt.assert_array_equal(a._chain_ptr, [0, 2, 4, 6])
+        npt.assert_array_equal(a._chain_edge_ptr, [0, 1, 2, 3])
+        self.assertEqual(len(a._pairs), 3)
+        self.assertEqual(a._pair_ptr[-1], len(a._pair_edge_idx))
+        self.assertFalse(a._qubits.flags.writeable)
+
+    def test_string_target_labels(self):
+        g = nx.cycle_graph('abcd')
+        emb = {0: ('a', 'b'), 1: ('c',), 2: ('d',)}
+        a = dwave.embedding.EmbeddedStructure(g.edges, emb)
+
+        self.assertEqual(a[0], ('a', 'b'))
+        self.assertEqual(list(a.chain_edges(0)), [('a', 'b')])
+        self.assertEqual(list(a.interaction_edges(0, 2)), [('a', 'd')])
+        self.assertEqual(list(a.interaction_edges(2, 0)), [('d', 'a')])
+        self.assertEqual(list(a.interaction_edges(0, 1)), [('b', 'c')])
+
+    @parameterized.expand(
+        [('_'.join(vt.name for vt in vartypes), *vartypes) for vartypes
+         in itertools.product([dimod.BINARY, dimod.SPIN], repeat=2)])
+    def test_embed_bqm_energy_preserved(self, name, vartype, smear_vartype):
+        # K5 onto a 4x4 grid, with chains of different lengths
+        target = nx.grid_2d_graph(4, 4)
+        embedding = {'a': [(0, 0), (0, 1), (0, 2), (0, 3)],
+                     'b': [(1, 0), (1, 1), (1, 2), (1, 3)],
+                     'c': [(2, 0), (2, 1), (2, 2), (2, 3)],
+                     'd': [(3, 0), (3, 1)],
+                     'e': [(3, 2), (3, 3)]}
+        emb_s = dwave.embedding.EmbeddedStructure(target.edges, embedding)
+
+        bqm = dimod.BQM({v: .1 * i for i, v in enumerate('abcd')},
+                        {('a', 'b'): 1.5, ('b', 'c'): -.5, ('c', 'd'): 2,
+                         ('c', 'e'): -1, ('d', 'e'): 0},
+                        1.5, vartype)
+
+        target_bqm = emb_s.embed_bqm(bqm, chain_strength={v: 2 for v in 'abcde'},
+                                     smear_vartype=smear_vartype)
+
+        self.assertIs(target_bqm.vartype, vartype)
+        self.assertEqual(set(target_bqm.variables),
+                         {q for v in bqm.variables for q in embedding[v]})
+
+        for config in itertools.product(vartype.value, repeat=bqm.num_variables):
+            sample = dict(zip(bqm.variables, config))
+            target_sample = {q: sample[v] for v in bqm.variables for q in embedding[v]}
+            self.assertAlmostEqual(bqm.energy(sample), target_bqm.energy(target_sample))
+
+    @parameterized.expand([(dimod.SPIN, dimod.BINARY), (dimod.BINARY, dimod.SPIN)])
+    def test_embed_bqm_smear_no_copy(self, vartype, smear_vartype):
+        target = nx.cycle_graph(6)
+        embedding = {'a': (0, 1), 'b': (2, 3), 'c': (4, 5)}
+        emb_s = dwave.embedding.EmbeddedStructure(target.edges, embedding)
+
+        bqm = dimod.BQM({'a': .5, 'b': -1, 'c': 2},
+                        {('a', 'b'): 1.5, ('b', 'c'): -.5, ('a', 'c'): 3},
+                        1.5, vartype)
+
+        # the smearing is done on the bias vectors, the source BQM is not
+        # converted
+        cls = type(bqm)
+        with unittest.mock.patch.object(cls, 'spin', new_callable=unittest.mock.PropertyMock) as spin, \
+                unittest.mock.patch.object(cls, 'binary', new_callable=unittest.mock.PropertyMock) as binary:
+            target_bqm = emb_s.embed_bqm(bqm, smear_vartype=smear_vartype)
+            spin.assert_not_called()
+            binary.assert_not_called()
+        chain_strength = emb_s.chain_strength
+
+        # same as converting, smearing and converting back
+        converted = bqm.spin if smear_vartype is dimod.SPIN else bqm.binary
+        expected = emb_s.embed_bqm(converted, chain_strength=chain_strength)
+        expected.change_vartype(vartype, inplace=True)
+
+        dimod.testing.assert_bqm_almost_equal(target_bqm, expected)
+        self.assertAlmostEqual(chain_strength,
+                               dwave.embedding.chain_strength.uniform_torque_compensation(converted))
+
+    def test_embed_bqm_missing(self):
+        g = [(0, 1), (1, 2)]
+        emb = {'a': (0,), 'b': (1, 2), 'c': (3,)}
+        emb_s = dwave.embedding.EmbeddedStructure(g, emb)
+
+        with self.assertRaises(dwave.embedding.exceptions.MissingChainError):
+            emb_s.embed_bqm(dimod.BQM({'x': 1}, {}, 0, 'SPIN'))
+
+        with self.assertRaises(dwave.embedding.exceptions.MissingEdgeError):
+            emb_s.embed_bqm(dimod.BQM({}, {('a', 'c'): 1}, 0, 'SPIN'))
+
+
+    def test_chain_index(self):
+        emb_s = dwave.embedding.EmbeddedStructure([(0, 1), (1, 2), (2, 3)],
+                                                  {'a': (0, 1), 'b': (2, 3)})
+
+        index = emb_s.chain_index('ba', [3, 2, 1, 0])
+        self.assertEqual(list(index), [(2, 3), (0, 1)])
+        np.testing.assert_array_equal(index.columns, [1, 0, 3, 2])
+
+        self.assertIs(emb_s.chain_index(['b', 'a'], [3, 2, 1, 0]), index)
+        self.assertIsNot(emb_s.chain_index('ab', [3, 2, 1, 0]), index)
+
+
+class TestEmbeddingPlan(unittest.TestCase):
+    def setUp(self):
+        #octahedron
+        g = [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5), (5, 0),
+             (0, 2), (1, 3), (2, 4), (3, 5), (4, 0), (5, 1)]
+        emb = {'a': (1, 2), 'b': (3, 4), 'c': (5, 0)}
+        self.emb_s = dwave.embedding.EmbeddedStructure(g, emb)
+
+    def test_reuse(self):
+        emb_s = self.emb_s
+
+        bqm = dimod.BQM({'a': -1, 'b': -2, 'c': -3},
+                        {('a', 'b'): 1, ('a', 'c'): -1, ('b', 'c'): 2},
+                        5, dimod.SPIN)
+        plan = emb_s.embedding_plan(bqm)
+        self.assertTrue(plan.matches(bqm))
+
+        # new biases, same structure
+        bqm2 = bqm.copy()
+        bqm2.set_linear('a', 4)
+        bqm2.set_quadratic('b', 'c', -.5)
+
+        self.assertIs(emb_s.embedding_plan(bqm2), plan)
+
+        target_bqm = emb_s.embed_bqm(bqm2, chain_strength=3)
+        self.assertIs(emb_s._plan, plan)
+
+        fresh = dwave.embedding.EmbeddedStructure(
+            [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5), (5, 0),
+             (0, 2), (1, 3), (2, 4), (3, 5), (4, 0), (5, 1)],
+            dict(emb_s))
+        dimod.testing.assert_bqm_almost_equal(
+            target_bqm, fresh.embed_bqm(bqm2, chain_strength=3))
+
+    def test_structure_change(self):
+        emb_s = self.emb_s
+
+        bqm = dimod.BQM({'a': -1, 'b': -2}, {('a', 'b'): 1}, 0, dimod.SPIN)
+        plan = emb_s.embedding_plan(bqm)
+
+        bqm.add_quadratic('a', 'c', 1)
+        self.assertFalse(plan.matches(bqm))
+
+        target_bqm = emb_s.embed_bqm(bqm, chain_strength=1)
+        self.assertIsNot(emb_s._plan, plan)
+        self.assertTrue(emb_s._plan.matches(bqm))
+        self.assertEqual(target_bqm.num_variables, 6)
+
+    def test_embed_vectors(self):
+        plan = dwave.embedding.EmbeddingPlan(self.emb_s, ['a', 'b'], [0], [1])
+
+        self.assertEqual(plan.target_variables, [1, 2, 3, 4])
+
+        linear, quadratic, offset = plan.embed_vectors([2, 4], [3], 1, [10, 20], dimod.SPIN)
+        npt.assert_array_equal(linear, [1, 1, 2, 2])
+        npt.assert_array_equal(quadratic, [-10, -20, 1, 1, 1])
+        self.assertEqual(offset, 31)
+
+    def test_missing(self):
+        with self.assertRaises(dwave.embedding.exceptions.MissingChainError):
+            dwave.embedding.EmbeddingPlan(self.emb_s, ['a', 'x'], [0], [1])
+
+    @parameterized.expand([(None,), (dimod.SPIN,), (dimod.BINARY,)])
+    def test_embed_bqms(self, smear_vartype):
+        emb_s = self.emb_s
+
+        bqms = [dimod.BQM({'a': i, 'b': -2, 'c': -3},
+                          {('a', 'b'): 1, ('a', 'c'): -i, ('b', 'c'): 2},
+                          5, dimod.BINARY)
+                for i in range(5)]
+        # different structure, and a different vartype
+        bqms.append(dimod.BQM({'a': 1}, {('b', 'c'): 2}, 0, dimod.BINARY))
+        bqms.append(bqms[0].spin)
+
+        strength = {'a': 2, 'b': 3, 'c': 4}
+        target_bqms = emb_s.embed_bqms(bqms, chain_strength=strength,
+                                       smear_vartype=smear_vartype)
+
+        self.assertEqual(len(target_bqms), len(bqms))
+        for bqm, target_bqm in zip(bqms, target_bqms):
+            dimod.testing.assert_bqm_almost_equal(
+                target_bqm,
+                emb_s.embed_bqm(bqm, chain_strength=strength,
+                                smear_vartype=smear_vartype))
+
+    def test_embed_bqms_chain_strength(self):
+        emb_s = self.emb_s
+
+        bqms = [dimod.BQM({}, {('a', 'b'): j}, 0, dimod.SPIN) for j in (1, 2)]
+
+        target_bqms = emb_s.embed_bqms(bqms)
+        self.assertEqual(len(emb_s.chain_strength), 2)
+        self.assertLess(emb_s.chain_strength[0], emb_s.chain_strength[1])
+        for bqm, target_bqm, strength in zip(bqms, target_bqms, emb_s.chain_strength):
+            self.assertEqual(target_bqm, emb_s.embed_bqm(bqm, chain_strength=strength))
+
+        self.assertEqual(emb_s.embed_bqms([]), [])
@@ -234,6 +234,81 @@ class TestChainBreakFrequency(unittest.TestCase):
 
         self.assertEqual(freq, {0: 3./5, 1: 0})
 
+    def test_empty(self):
+        sampleset = dimod.SampleSet.from_samples((np.empty((0, 3)), 'abc'),
+                                                 energy=[], vartype=dimod.SPIN)
+
+        freq = dwave.embedding.chain_break_frequency(sampleset, {0: 'ab', 1: 'c'})
+
+        self.assertEqual(freq, {0: 0, 1: 0})
+
+
+class TestChainBreakStats(unittest.TestCase):
+    def test_update(self):
+        rng = np.random.default_rng(4)
+        embedding = {'a': 'tu', 'b': 'v', 'c': 'wxyz'}
+
+        stats = dwave.embedding.ChainBreakStats(embedding)
+        self.assertEqual(stats.rates(), {'a': 0, 'b': 0, 'c': 0})
+
+        batches = []
+        for labels in ['tuvwxyz', 'zyxwvut', 'tuvwxyz']:
+            samples = rng.choice([-1, 1], size=(20, 3)).repeat([2, 1, 4], axis=1)
+            sampleset = dimod.SampleSet.from_samples((samples, labels), dimod.SPIN, 0)
+            stats.update(sampleset.aggregate())  # weighted by num_occurrences
+            batches.append(sampleset)
+
+        stats.update(dwave.embedding.PackedSamples.from_samples(batches[0]))
+
+        combined = dimod.concatenate(batches + batches[:1])
+        self.assertEqual(stats.num_samples, 80)
+        self.assertEqual(stats.rates(), dwave.embedding.chain_break_frequency(combined, embedding))
+
+        index = dwave.embedding.ChainIndex(embedding, 'zyxwvut')
+        indexed = dwave.embedding.ChainBreakStats(index)
+        indexed.update(combined)
+        self.assertEqual(indexed.rates(), stats.rates())
+
+    def test_merge(self):
+        embedding = {0: (0, 1), 1: (2, 3)}
+        samples = np.array([[-1, +1, +1, +1], [+1, +1, +1, +1], [-1, -1, -1, +1]])
+
+        first = dwave.embedding.ChainBreakStats(embedding)
+        first.update(samples[:1])
+        second = dwave.embedding.ChainBreakStats(embedding)
+        second.update(samples[1:])
+
+        self.assertIs(first.merge(second), first)
+        np.testing.assert_array_equal(first.num_broken, [1, 1])
+        self.assertEqual(first.num_samples, 3)
+
+        with self.assertRaises(ValueError):
+            first.merge(dwave.embedding.ChainBreakStats({1: (2, 3), 0: (0, 1)}))
+
+    def test_confidence(self):
+        stats = dwave.embedding.ChainBreakStats({'a': (0, 1), 'b': (2, 3)})
+        self.assertEqual(stats.confidence(), {'a': (0, 1), 'b': (0, 1)})
+
+        samples = np.ones((100, 4))
+        samples[:10, 0] = -1
+        stats.update(samples)
+
+        confidence = stats.confidence()
+        low, high = confidence['a']
+        self.assertLess(low, .1)
+        self.assertGreater(high, .1)
+        # never broken, but not certainly so
+        self.assertEqual(confidence['b'][0], 0)
+        self.assertGreater(confidence['b'][1], 0)
+
+        narrow = stats.confidence(.5)['a']
+        self.assertLess(high - low, 1)
+        self.assertLess(narrow[1] - narrow[0], high - low)
+
+        with self.assertRaises(ValueError):
+            stats.confidence(1)
+
+
 class TestIntLabelDisjointSets(unittest.TestCase):
     def test(self):
         components = map(list, [range(1), range(1, 3), range(3, 6), range(6, 12)])
@@ -21,6 +21,8 @@ import networkx as nx
 import dimod
 import dwave_networkx as dnx
 
+import dwave.embedding
+
 from dwave.system.testing import MockDWaveSampler
 from dwave.system.composites import TilingComposite, ParallelEmbeddingComposite
 from dwave.preprocessing import SpinReversalTransformComposite
@@ -112,6 +114,83 @@ class TestParallelEmbeddings(unittest.TestCase):
             self.assertTrue(np.all(ss.record.energy == -1.75))
             self.assertTrue(np.all(ss.record.sample == -1))
 
+    def test_num_threads(self):
+        mock_sampler = MockDWaveSampler()
+        embeddings = [{"a": (n,)} for n in mock_sampler.nodelist]
+        sampler = ParallelEmbeddingComposite(mock_sampler, embeddings=embeddings)
+
+        self.assertIn('num_threads', sampler.parameters)
+
+        ss = sampler.sample_ising({"a": -2}, {}, num_reads=3, num_threads=4)
+        self.assertEqual(3 * len(embeddings), sum(ss.record.num_occurrences))
+        self.assertTrue(np.all(ss.record.energy == -2))
+        self.assertTrue(np.all(ss.record.sample == 1))
+
+    def test_reassigned_embeddings(self):
+        mock_sampler = MockDWaveSampler()
+        embeddings = [{"a": (n,)} for n in mock_sampler.nodelist]
+        sampler = ParallelEmbeddingComposite(
+            mock_sampler, embeddings=embeddings, source=nx.empty_graph(["a"]))
+
+        ss = sampler.sample_ising({"a": -2}, {}, num_reads=1)
+        self.assertEqual(len(embeddings), sum(ss.record.num_occurrences))
+
+        sampler.embeddings = embeddings[:2]
+        ss = sampler.sample_ising({"a": -2}, {}, num_reads=1)
+        self.assertEqual(2, sum(ss.record.num_occurrences))
+
+        sampler.embeddings[1] = {"a": (mock_sampler.nodelist[-1],)}
+        ss = sampler.sample_ising({"a": -2}, {}, num_reads=1)
+        self.assertEqual(2, sum(ss.record.num_occurrences))
+        self.assertEqual(set(ss.variables), {"a"})
+
+        # chains modified in place are used too
+        target = mock_sampler.to_networkx_graph()
+        u = mock_sampler.nodelist[0]
+        v = next(v for v in target if v != u and v not in target[u])
+        sampler.embeddings[0]["a"] = (u, v)  # disconnected chain
+        with self.assertRaises(dwave.embedding.exceptions.DisconnectedChainError):
+            sampler.sample_ising({"a": -2}, {}, num_reads=1)
+
+    def test_invalid_embeddings(self):
+        mock_sampler = MockDWaveSampler()
+        target = mock_sampler.to_networkx_graph()
+        u = mock_sampler.nodelist[0]
+        v = next(v for v in target if v != u and v not in target[u])
+        embeddings = [{"a": (u, v)}]  # disconnected chain
+
+        # the source graph is inferred from the embeddings
+        with self.assertRaises(dwave.embedding.exceptions.DisconnectedChainError):
+            ParallelEmbeddingComposite(mock_sampler, embeddings=embeddings)
+
+        sampler = ParallelEmbeddingComposite(
+            mock_sampler, embeddings=embeddings, source=nx.empty_graph(["a"]))
+        with self.assertRaises(dwave.embedding.exceptions.DisconnectedChainError):
+            sampler.sample_ising({"a": -1}, {})
+
+    def test_inferred_edgelist(self):
+        mock_sampler = MockDWaveSampler()
+        target = mock_sampler.to_networkx_graph()
+
+        # paths of three nodes, all embeddings support 0-1 and 1-2 but only
+        # some support 0-2
+        embeddings = []
+        used_nodes = set()
+        for u in target:
+            for v in target[u]:
+                for w in target[v]:
+                    if len({u, v, w} | used_nodes) == len(used_nodes) + 3:
+                        used_nodes.update((u, v, w))
+                        embeddings.append({0: (u,), 1: (v,), 2: (w,)})
+        self.assertGreater(len(embeddings), 1)
+
+        sampler = ParallelEmbeddingComposite(mock_sampler, embeddings=embeddings)
+
+        expected = {frozenset((0, 1)), frozenset((1, 2))}
+        if all(emb[2][0] in target[emb[0][0]] for emb in embeddings):
+            expected.add(frozenset((0, 2)))
+        self.assertEqual(set(map(frozenset, sampler.edgelist)), expected)
+
     def test_composite_propagation(self):
         # Propagation fails for TilingComposite but succeeds here.
         # When using find_sublattice_embedding it is necessayr to specify